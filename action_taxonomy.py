@@ -0,0 +1,111 @@
+"""
+Action Taxonomy
+Maps raw Graph API action_type values (actions / conversion_values rows) to the canonical
+metric buckets used by the dashboard aggregators. Each action type is classified once and
+memoized, so aggregating a row is a dict lookup per action instead of a chain of
+substring tests.
+"""
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+POST_ENGAGEMENT = 'post_engagement'
+PHOTO_VIEW = 'photo_view'
+LINK_CLICK = 'link_click'
+# Messaging contacts (conversations started, first replies, new connections)
+MESSAGING = 'messaging'
+# Subset of MESSAGING that starts a new conversation
+MESSAGING_NEW = 'messaging_new'
+PURCHASE = 'purchase'
+
+BUCKETS = (POST_ENGAGEMENT, PHOTO_VIEW, LINK_CLICK, MESSAGING, MESSAGING_NEW, PURCHASE)
+
+_EXACT_TYPES = {
+    'post_engagement': frozenset({POST_ENGAGEMENT}),
+    'photo_view': frozenset({PHOTO_VIEW}),
+    'link_click': frozenset({LINK_CLICK}),
+    'landing_page_view': frozenset({LINK_CLICK}),
+}
+
+_MESSAGING_TYPES = {
+    'messaging_starts',
+    'messaging_conversation_started',
+    'messaging_first_reply',
+    'new_messaging_connection',
+    'onsite_conversion.messaging_conversation_started',
+    'onsite_conversion.messaging_first_reply',
+}
+
+# Facebook reports one purchase under several overlapping types (omni_purchase, purchase,
+# offsite_conversion.fb_pixel_purchase, onsite_web_purchase, ...). Only one is counted per
+# actions list: the first of these that is present; the other purchase types are ignored.
+_PURCHASE_TYPES = ('omni_purchase', 'purchase')
+
+_NO_BUCKETS: FrozenSet[str] = frozenset()
+
+
+def _is_messaging(action_type: str) -> bool:
+    if action_type in _MESSAGING_TYPES or action_type.startswith('onsite_conversion.messaging'):
+        return True
+    return 'messaging' in action_type and any(
+        part in action_type for part in ('conversation', 'first_reply', 'conversion', 'new_messaging_connection')
+    )
+
+
+@lru_cache(maxsize=None)
+def classify_action(action_type: Optional[str]) -> FrozenSet[str]:
+    """Get the buckets an action type counts towards (empty when it is not tracked)"""
+    action_type = (action_type or '').lower()
+    if action_type in _EXACT_TYPES:
+        return _EXACT_TYPES[action_type]
+    if _is_messaging(action_type):
+        if 'conversation' in action_type or action_type == 'new_messaging_connection':
+            return frozenset({MESSAGING, MESSAGING_NEW})
+        return frozenset({MESSAGING})
+    if action_type in _PURCHASE_TYPES:
+        return frozenset({PURCHASE})
+    return _NO_BUCKETS
+
+
+def tracked_actions(actions: Optional[Iterable[Dict[str, Any]]]) -> Iterator[Tuple[Dict[str, Any], FrozenSet[str]]]:
+    """Yield (action, buckets) for the tracked actions of one actions/conversion_values list.
+
+    Of the purchase types only the canonical one for the list counts (omni_purchase when
+    present, else purchase), so a purchase is not counted once per reporting surface.
+    """
+    actions: List[Dict[str, Any]] = list(actions or ())
+    present = {(a.get('action_type') or '').lower() for a in actions}
+    purchase_type = next((t for t in _PURCHASE_TYPES if t in present), None)
+    for action in actions:
+        buckets = classify_action(action.get('action_type'))
+        if PURCHASE in buckets and (action.get('action_type') or '').lower() != purchase_type:
+            continue
+        if buckets:
+            yield action, buckets
+
+
+def _int_value(value: Any) -> int:
+    try:
+        return int(float(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _float_value(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def sum_actions(actions: Optional[Iterable[Dict[str, Any]]], as_float: bool = False) -> Dict[str, Any]:
+    """Sum an actions (or conversion_values) list per bucket.
+
+    Values are truncated to int per action unless as_float is set (monetary values).
+    """
+    parse = _float_value if as_float else _int_value
+    totals = dict.fromkeys(BUCKETS, 0.0 if as_float else 0)
+    for action, buckets in tracked_actions(actions):
+        value = parse(action.get('value'))
+        for bucket in buckets:
+            totals[bucket] += value
+    return totals
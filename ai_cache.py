@@ -0,0 +1,192 @@
+"""
+AI Cache
+Persistent cache of OpenAI analysis results shared by all gunicorn workers and kept across
+restarts. Entries live in SQLite keyed by (kind, input digest, model, prompt version), so a
+new model or prompt never serves stale answers. The least recently used entries are pruned
+when the cache grows past its size limit, and hit/miss counters are kept per kind.
+
+Reads only run a SELECT: hit/miss counts and last-used times are collected in memory and
+written in one transaction on the next set() or at most every FLUSH_INTERVAL seconds.
+stats() is read-only and adds the counts not yet written from memory.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_TTL = 2 * 3600  # 2 hours
+MAX_BYTES = int(os.getenv('AI_CACHE_MAX_MB', '50')) * 1024 * 1024
+FLUSH_INTERVAL = 30  # seconds between writes of buffered counters/last-used times
+
+
+class AICache:
+    def __init__(self, cache_file: str = "ai_cache.db", max_bytes: int = MAX_BYTES):
+        self.cache_file = cache_file
+        self.max_bytes = max_bytes
+        self._initialized = False
+        self._lock = threading.Lock()
+        self._counters: Dict[str, List[int]] = {}  # kind -> [hits, misses] not yet written
+        self._touched: Dict[Tuple[str, str, str, str], float] = {}  # key -> last used, not yet written
+        self._last_flush = time.time()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection, creating the schema on first use"""
+        conn = sqlite3.connect(self.cache_file, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS ai_results (
+                    kind TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (kind, digest, model, prompt_version)
+                );
+                CREATE INDEX IF NOT EXISTS ai_results_last_used ON ai_results (last_used);
+                CREATE TABLE IF NOT EXISTS ai_cache_stats (
+                    kind TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0
+                );
+            """)
+            self._initialized = True
+        return conn
+
+    def get(self, kind: str, digest: str, model: str, prompt_version: str,
+            ttl: float = DEFAULT_TTL) -> Optional[Any]:
+        """Get a cached result younger than ttl seconds (None on a miss)"""
+        key = (kind, digest, model, prompt_version)
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT value FROM ai_results WHERE kind = ? AND digest = ? AND model = ? AND prompt_version = ? "
+                    "AND created_at >= ?",
+                    (*key, time.time() - ttl)
+                ).fetchone()
+                now = time.time()
+                with self._lock:
+                    self._counters.setdefault(kind, [0, 0])[0 if row else 1] += 1
+                    if row:
+                        self._touched[key] = now
+                    due = now - self._last_flush >= FLUSH_INTERVAL
+                if due:
+                    with self._flush(conn):
+                        pass
+                return json.loads(row[0]) if row else None
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Error loading AI cache: {e}")
+            return None
+
+    @contextmanager
+    def _flush(self, conn: sqlite3.Connection) -> Iterator[None]:
+        """Transaction that starts by writing the buffered hit/miss counters and last-used times.
+
+        If the transaction fails the buffers are merged back, to be written next time.
+        """
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            touched, self._touched = self._touched, {}
+            self._last_flush = time.time()
+        try:
+            with conn:
+                conn.executemany(
+                    "UPDATE ai_results SET last_used = MAX(last_used, ?) WHERE kind = ? AND digest = ? AND model = ? AND prompt_version = ?",
+                    [(used, *key) for key, used in touched.items()]
+                )
+                conn.executemany(
+                    "INSERT INTO ai_cache_stats (kind, hits, misses) VALUES (?, ?, ?) "
+                    "ON CONFLICT(kind) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses",
+                    [(kind, hits, misses) for kind, (hits, misses) in counters.items()]
+                )
+                yield
+        except Exception:
+            with self._lock:
+                for kind, (hits, misses) in counters.items():
+                    pending = self._counters.setdefault(kind, [0, 0])
+                    pending[0] += hits
+                    pending[1] += misses
+                for key, used in touched.items():
+                    self._touched[key] = max(used, self._touched.get(key, 0))
+            raise
+
+    def set(self, kind: str, digest: str, model: str, prompt_version: str, value: Any) -> bool:
+        """Cache a result, then prune least recently used entries beyond max_bytes"""
+        payload = json.dumps(value, ensure_ascii=False)
+        size = len(payload.encode('utf-8'))
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                # Pending last-used times go in first so pruning sees recent reads
+                with self._flush(conn):
+                    conn.execute(
+                        "INSERT OR REPLACE INTO ai_results (kind, digest, model, prompt_version, value, size, created_at, last_used) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (kind, digest, model, prompt_version, payload, size, now, now)
+                    )
+                    self._prune(conn)
+                return True
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Error saving AI cache: {e}")
+            return False
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ai_results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evict = []
+        for rowid, size in conn.execute("SELECT rowid, size FROM ai_results ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            evict.append((rowid,))
+            total -= size
+        conn.executemany("DELETE FROM ai_results WHERE rowid = ?", evict)
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count, size and hit/miss counters per kind (written plus still buffered)"""
+        try:
+            conn = self._connect()
+            try:
+                entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ai_results").fetchone()
+                kinds = {kind: {'hits': hits, 'misses': misses}
+                         for kind, hits, misses in conn.execute("SELECT kind, hits, misses FROM ai_cache_stats")}
+                with self._lock:
+                    for kind, (hits, misses) in self._counters.items():
+                        counts = kinds.setdefault(kind, {'hits': 0, 'misses': 0})
+                        counts['hits'] += hits
+                        counts['misses'] += misses
+                return {'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes, 'kinds': kinds}
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Error loading AI cache stats: {e}")
+            return {}
+
+    def clear_cache(self) -> bool:
+        """Clear the cache (counters are kept)"""
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM ai_results")
+                return True
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Error clearing AI cache: {e}")
+            return False
+
+# Global cache instance
+ai_cache = AICache()
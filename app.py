@@ -5,14 +5,29 @@ import json
 import logging
 import hashlib
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
-from flask import Flask, request, jsonify, render_template
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 
 from dotenv import load_dotenv
 import requests
+from http_client import http_session
 from facebook_ads_extractor import FacebookAdsExtractor
-from budget_cache import budget_cache
+from budget_cache import BUDGET_FIELDS, budget_cache
+from ai_cache import ai_cache
+from graph_client import (
+    GRAPH_BASE_URL, batch_get, fetch_insights_batch, get_objects, get_throttle, iter_edge, iter_objects
+)
+from insights_store import insights_store
+from jobs import job_manager
+from response_cache import cached_response, response_cache
+from campaign_classifier import classify_brand, classify_campaigns, classify_content_format
+from insight_frame import DERIVED_METRICS, ROW_DIMS, SUM_METRICS, InsightFrame
+from action_taxonomy import (
+    LINK_CLICK, MESSAGING, MESSAGING_NEW, PHOTO_VIEW, POST_ENGAGEMENT, PURCHASE, sum_actions
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -33,12 +48,17 @@ def get_access_token() -> str:
     return token or ''
 
 class OpenAIChatbot:
+    # Bump a version when its prompt changes so cached answers of the old prompt are not reused
+    CAMPAIGN_PROMPT_VERSION = 'campaign-v1'
+    POSTS_PROMPT_VERSION = 'posts-v1'
+    ASK_PROMPT_VERSION = 'ask-v1'
     
     def __init__(self):
         self.api_key = os.getenv('OPENAI_API_KEY')
         self.api_url = "https://api.openai.com/v1/chat/completions"
-        self.cache = {}
         self.cache_ttl = timedelta(hours=2)
+        self.analysis_model = 'gpt-3.5-turbo'
+        self.content_model = os.getenv('OPENAI_CHAT_MODEL', 'gpt-4o-mini')
         
         if not self.api_key:
             logger.warning("OPENAI_API_KEY không được cấu hình")
@@ -53,9 +73,15 @@ class OpenAIChatbot:
         }
         return hashlib.md5(json.dumps(cache_data, sort_keys=True).encode()).hexdigest()
     
-    def _is_cache_valid(self, cache_entry: Dict[str, Any]) -> bool:
-        cache_time = datetime.fromisoformat(cache_entry['timestamp'])
-        return datetime.now() - cache_time < self.cache_ttl
+    @staticmethod
+    def _digest(data: Any) -> str:
+        return hashlib.md5(json.dumps(data, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+    
+    def _headers(self) -> Dict[str, str]:
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
     
     def analyze_campaign_performance(self, campaign_data: Dict[str, Any]) -> Dict[str, str]:
         if not self.api_key:
@@ -66,99 +92,20 @@ class OpenAIChatbot:
             }
         
         cache_key = self._get_cache_key(campaign_data)
-        if cache_key in self.cache:
-            cache_entry = self.cache[cache_key]
-            if self._is_cache_valid(cache_entry):
-                logger.info(f"Sử dụng cache cho campaign analysis: {cache_key[:8]}...")
-                return {
-                    'insights': cache_entry['insights'],
-                    'recommendations': cache_entry['recommendations'],
-                    'cached': True
-                }
-            else:
-                del self.cache[cache_key]
+        cache_args = self._campaign_cache_args(campaign_data)
+        cache_entry = ai_cache.get(*cache_args, ttl=self.cache_ttl.total_seconds())
+        if cache_entry:
+            logger.info(f"Sử dụng cache cho campaign analysis: {cache_key[:8]}...")
+            return {
+                'insights': cache_entry['insights'],
+                'recommendations': cache_entry['recommendations'],
+                'cached': True
+            }
         
         try:
-            optimized_data = self._optimize_data_for_ai(campaign_data)
+            data = self._campaign_payload(campaign_data)
             
-            system_prompt = (
-                "Bạn là một Chuyên gia Phân tích Dữ liệu Quảng cáo và Chuyên gia Tối ưu hóa Hiệu suất có 10 năm kinh nghiệm. Bạn có kiến thức chuyên sâu về nền tảng Meta Ads, các chỉ số cốt lõi, và các framework chẩn đoán vấn đề hiệu quả. Nhiệm vụ của bạn là biến dữ liệu thô của một chiến dịch quảng cáo thành các phát hiện quan trọng và các đề xuất hành động cụ thể.\n\n"
-                
-                "Phân tích toàn diện dữ liệu của một chiến dịch quảng cáo Meta Ads đã hoàn thành hoặc đang chạy, với các mục tiêu sau:\n"
-                "1. Chẩn đoán vấn đề: Xác định các vấn đề hiệu suất chính dựa trên các chỉ số cốt lõi.\n"
-                "2. Tìm kiếm phát hiện: Khám phá các xu hướng và mối quan hệ nhân quả trong dữ liệu.\n"
-                "3. Đề xuất hành động: Cung cấp các kế hoạch hành động cụ thể, có thể thực thi ngay lập tức để tối ưu hóa hiệu suất chiến dịch trong tương lai.\n\n"
-                
-                "Dữ liệu sẽ được cung cấp dưới dạng bảng, bao gồm các cột chỉ số và kích thước sau:\n"
-                "- Kích thước: Campaign Name, Ad Set Name, Ad Name.\n"
-                "- Chỉ số: Amount Spent, Impressions, Reach, Frequency, Link Clicks, Outbound Clicks, CTR (Link Click-Through Rate), CPC (Cost per Link Click), CPM, Conversions, Cost Per Conversion (CPA), Total Conversion Value, ROAS (Return on Ad Spend).\n"
-                "Ngoài ra, tôi sẽ cung cấp bối cảnh chiến dịch, bao gồm:\n"
-                "- Mục tiêu chính của chiến dịch: [Điền mục tiêu]\n"
-                "- Ngân sách chiến dịch: [Điền ngân sách]\n"
-                "- Đối tượng mục tiêu: [Điền mô tả đối tượng]\n"
-                "- Khoảng thời gian chạy: [Điền thời gian]\n\n"
-                
-                "Sử dụng các bước sau để phân tích:\n"
-                "1. **Phân tích Cấp Chiến dịch (Campaign Level):** Đánh giá hiệu suất tổng thể của chiến dịch dựa trên CPA và ROAS. So sánh các chỉ số này với mục tiêu ban đầu của chiến dịch.\n"
-                "2. **Phân tích Cấp Nhóm quảng cáo (Ad Set Level):** Chẩn đoán các vấn đề liên quan đến đối tượng và ngân sách. So sánh các chỉ số CPA và ROAS giữa các nhóm quảng cáo khác nhau. Xác định nhóm quảng cáo hoạt động tốt nhất và kém nhất. Phân tích chỉ số Frequency của từng nhóm quảng cáo.\n"
-                "3. **Phân tích Cấp Quảng cáo (Ad Level):** Đánh giá hiệu suất của nội dung quảng cáo (Creative). So sánh các chỉ số CTR và CPC giữa các quảng cáo trong cùng một nhóm quảng cáo. Xác định các quảng cáo hiệu quả nhất và kém hiệu quả nhất.\n"
-                "4. **Chẩn đoán Mối Quan Hệ:** Thiết lập mối quan hệ nhân quả giữa các chỉ số. Ví dụ:\n"
-                "    - Nếu CPA cao và CTR thấp, vấn đề nằm ở nội dung quảng cáo hoặc đối tượng mục tiêu.\n"
-                "    - Nếu CPA cao nhưng CTR cao, vấn đề có thể nằm ở trang đích hoặc tỷ lệ chuyển đổi.\n"
-                "    - Nếu ROAS thấp, phân tích xem đó là do CPA cao hay giá trị đơn hàng trung bình thấp.\n\n"
-                
-                "- **Vấn đề `CTR` thấp:** Khi chỉ số này thấp hơn mức trung bình của ngành hoặc thấp hơn kỳ vọng của bạn, đó là dấu hiệu của nội dung không hấp dẫn hoặc nhắm sai đối tượng.\n"
-                "- **Vấn đề `CPA` cao:** Khi chi phí để có một kết quả quá cao, đó là dấu hiệu của hiệu quả chuyển đổi kém hoặc chi phí đấu thầu cao.\n"
-                "- **Vấn đề `ROAS` thấp:** Khi lợi nhuận trên chi tiêu quảng cáo không đạt mục tiêu, đó là dấu hiệu của hiệu suất tài chính kém.\n\n"
-                
-                "Trình bày kết quả phân tích trong một báo cáo có cấu trúc rõ ràng, sử dụng các tiêu đề phụ và gạch đầu dòng.\n"
-                "**Phần 1: Tóm Tắt Phân Tích**\n"
-                "- Tóm tắt tổng thể về hiệu suất chiến dịch (tốt, trung bình, kém).\n"
-                "- Các chỉ số hiệu suất chính (CPA, ROAS, CTR) so với mục tiêu.\n\n"
-                
-                "**Phần 2: Phân Tích Chẩn Đoán Chi Tiết**\n"
-                "- Bảng Phân tích theo Cấp Nhóm quảng cáo:\n"
-                "    - Liệt kê các chỉ số chính (Amount Spent, Link Clicks, CTR, CPC, CPA, ROAS, Conversions) cho từng nhóm quảng cáo.\n"
-                "    - So sánh và xếp hạng các nhóm quảng cáo dựa trên ROAS và CPA.\n"
-                "- Bảng Phân tích theo Cấp Quảng cáo:\n"
-                "    - Liệt kê các chỉ số chính (CTR, CPC) cho từng quảng cáo.\n"
-                "    - Xác định quảng cáo chiến thắng (`winner`) và quảng cáo hoạt động kém (`loser`).\n\n"
-                
-                "**Phần 3: Các Phát Hiện và Đề Xuất Hành Động**\n"
-                "- **Đề xuất Hành động cho Nhóm quảng cáo:** Dựa trên các phát hiện ở cấp độ này, đưa ra các đề xuất cụ thể (ví dụ: tắt các nhóm quảng cáo hoạt động kém, tinh chỉnh đối tượng mục tiêu, thử nghiệm các nhóm đối tượng mới).\n"
-                "- **Đề xuất Hành động cho Quảng cáo:** Dựa trên các phát hiện ở cấp độ này, đưa ra các đề xuất cụ thể (ví dụ: tắt các quảng cáo hoạt động kém, A/B testing các biến thể creative mới, làm mới nội dung để chống `ad fatigue`).\n\n"
-                
-                "Tạo một kế hoạch hành động cụ thể, có thể thực thi. Ví dụ:\n"
-                "- `Creative Optimization`: Đề xuất A/B testing các yếu tố nào (tiêu đề, hình ảnh, video).\n"
-                "- `Audience Optimization`: Đề xuất thử nghiệm các tệp đối tượng mới (ví dụ: `lookalike audience` dựa trên khách hàng giá trị cao).\n"
-                "- `Bidding & Budget Strategy`: Đề xuất các thay đổi về chiến lược đấu thầu (`cost cap`, `ROAS goal`) hoặc phân bổ ngân sách.\n"
-            )
-            
-            user_prompt = (
-                f"Dữ liệu campaign (tối ưu):\n{json.dumps(optimized_data, ensure_ascii=False, indent=2)}\n\n"
-                "Hãy phân tích và trả lời theo format JSON:\n"
-                "{\n"
-                '  "insights": "3-4 insights chính về hiệu suất campaign (CTR, CPM, trends, outliers)",\n'
-                '  "recommendations": "3-4 hành động cụ thể để tối ưu hiệu suất"\n'
-                "}"
-            )
-            
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            data = {
-                'model': 'gpt-3.5-turbo',
-                'messages': [
-                    {'role': 'system', 'content': system_prompt},
-                    {'role': 'user', 'content': user_prompt}
-                ],
-                'max_tokens': 600,  # Giảm từ 800 xuống 600
-                'temperature': 0.3
-            }
-            
-            response = requests.post(self.api_url, headers=headers, json=data, timeout=30)
+            response = http_session.post(self.api_url, headers=self._headers(), json=data, timeout=30)
             response.raise_for_status()
             
             result = response.json()
@@ -167,43 +114,10 @@ class OpenAIChatbot:
             logger.info(f"OpenAI raw response length: {len(answer)} chars")
             logger.debug(f"OpenAI raw response: {answer[:500]}...")
             
-            try:
-                ai_response = json.loads(answer)
-                insights = ai_response.get('insights', 'Không có insights')
-                recommendations = ai_response.get('recommendations', 'Không có đề xuất')
-                
-                insights_str = str(insights) if insights else 'Không có insights'
-                recommendations_str = str(recommendations) if recommendations else 'Không có đề xuất'
-                
-                self.cache[cache_key] = {
-                    'insights': insights_str,
-                    'recommendations': recommendations_str,
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-                logger.info(f"AI analysis hoàn thành và cached: {cache_key[:8]}...")
-                
-                return {
-                    'insights': insights_str,
-                    'recommendations': recommendations_str,
-                    'cached': False
-                }
-                
-            except json.JSONDecodeError:
-                logger.warning(f"Không thể parse JSON response từ OpenAI: {answer[:200]}...")
-                fallback_response = {
-                    'insights': str(answer) if answer else 'Không thể phân tích dữ liệu',
-                    'recommendations': 'Vui lòng xem insights để biết thêm chi tiết.',
-                    'cached': False
-                }
-                
-                self.cache[cache_key] = {
-                    'insights': fallback_response['insights'],
-                    'recommendations': fallback_response['recommendations'],
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-                return fallback_response
+            analysis = self._parse_campaign_answer(answer)
+            ai_cache.set(*cache_args, analysis)
+            logger.info(f"AI analysis hoàn thành và cached: {cache_key[:8]}...")
+            return {**analysis, 'cached': False}
             
         except requests.exceptions.Timeout:
             logger.error("OpenAI API timeout")
@@ -227,6 +141,103 @@ class OpenAIChatbot:
                 'cached': False
             }
     
+    def _campaign_cache_args(self, campaign_data: Dict[str, Any]) -> tuple:
+        return ('campaign', self._get_cache_key(campaign_data), self.analysis_model, self.CAMPAIGN_PROMPT_VERSION)
+    
+    def _parse_campaign_answer(self, answer: str) -> Dict[str, str]:
+        """Split the model's JSON answer into insights/recommendations (raw text when it is not JSON)"""
+        try:
+            ai_response = json.loads(answer)
+            insights = ai_response.get('insights', 'Không có insights')
+            recommendations = ai_response.get('recommendations', 'Không có đề xuất')
+            return {
+                'insights': str(insights) if insights else 'Không có insights',
+                'recommendations': str(recommendations) if recommendations else 'Không có đề xuất'
+            }
+        except (json.JSONDecodeError, AttributeError):
+            logger.warning(f"Không thể parse JSON response từ OpenAI: {answer[:200]}...")
+            return {
+                'insights': str(answer) if answer else 'Không thể phân tích dữ liệu',
+                'recommendations': 'Vui lòng xem insights để biết thêm chi tiết.'
+            }
+    
+    def _campaign_payload(self, campaign_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Chat completions payload of a campaign analysis (shared by the blocking and streaming calls)"""
+        optimized_data = self._optimize_data_for_ai(campaign_data)
+        
+        system_prompt = (
+            "Bạn là một Chuyên gia Phân tích Dữ liệu Quảng cáo và Chuyên gia Tối ưu hóa Hiệu suất có 10 năm kinh nghiệm. Bạn có kiến thức chuyên sâu về nền tảng Meta Ads, các chỉ số cốt lõi, và các framework chẩn đoán vấn đề hiệu quả. Nhiệm vụ của bạn là biến dữ liệu thô của một chiến dịch quảng cáo thành các phát hiện quan trọng và các đề xuất hành động cụ thể.\n\n"
+            
+            "Phân tích toàn diện dữ liệu của một chiến dịch quảng cáo Meta Ads đã hoàn thành hoặc đang chạy, với các mục tiêu sau:\n"
+            "1. Chẩn đoán vấn đề: Xác định các vấn đề hiệu suất chính dựa trên các chỉ số cốt lõi.\n"
+            "2. Tìm kiếm phát hiện: Khám phá các xu hướng và mối quan hệ nhân quả trong dữ liệu.\n"
+            "3. Đề xuất hành động: Cung cấp các kế hoạch hành động cụ thể, có thể thực thi ngay lập tức để tối ưu hóa hiệu suất chiến dịch trong tương lai.\n\n"
+            
+            "Dữ liệu sẽ được cung cấp dưới dạng bảng, bao gồm các cột chỉ số và kích thước sau:\n"
+            "- Kích thước: Campaign Name, Ad Set Name, Ad Name.\n"
+            "- Chỉ số: Amount Spent, Impressions, Reach, Frequency, Link Clicks, Outbound Clicks, CTR (Link Click-Through Rate), CPC (Cost per Link Click), CPM, Conversions, Cost Per Conversion (CPA), Total Conversion Value, ROAS (Return on Ad Spend).\n"
+            "Ngoài ra, tôi sẽ cung cấp bối cảnh chiến dịch, bao gồm:\n"
+            "- Mục tiêu chính của chiến dịch: [Điền mục tiêu]\n"
+            "- Ngân sách chiến dịch: [Điền ngân sách]\n"
+            "- Đối tượng mục tiêu: [Điền mô tả đối tượng]\n"
+            "- Khoảng thời gian chạy: [Điền thời gian]\n\n"
+            
+            "Sử dụng các bước sau để phân tích:\n"
+            "1. **Phân tích Cấp Chiến dịch (Campaign Level):** Đánh giá hiệu suất tổng thể của chiến dịch dựa trên CPA và ROAS. So sánh các chỉ số này với mục tiêu ban đầu của chiến dịch.\n"
+            "2. **Phân tích Cấp Nhóm quảng cáo (Ad Set Level):** Chẩn đoán các vấn đề liên quan đến đối tượng và ngân sách. So sánh các chỉ số CPA và ROAS giữa các nhóm quảng cáo khác nhau. Xác định nhóm quảng cáo hoạt động tốt nhất và kém nhất. Phân tích chỉ số Frequency của từng nhóm quảng cáo.\n"
+            "3. **Phân tích Cấp Quảng cáo (Ad Level):** Đánh giá hiệu suất của nội dung quảng cáo (Creative). So sánh các chỉ số CTR và CPC giữa các quảng cáo trong cùng một nhóm quảng cáo. Xác định các quảng cáo hiệu quả nhất và kém hiệu quả nhất.\n"
+            "4. **Chẩn đoán Mối Quan Hệ:** Thiết lập mối quan hệ nhân quả giữa các chỉ số. Ví dụ:\n"
+            "    - Nếu CPA cao và CTR thấp, vấn đề nằm ở nội dung quảng cáo hoặc đối tượng mục tiêu.\n"
+            "    - Nếu CPA cao nhưng CTR cao, vấn đề có thể nằm ở trang đích hoặc tỷ lệ chuyển đổi.\n"
+            "    - Nếu ROAS thấp, phân tích xem đó là do CPA cao hay giá trị đơn hàng trung bình thấp.\n\n"
+            
+            "- **Vấn đề `CTR` thấp:** Khi chỉ số này thấp hơn mức trung bình của ngành hoặc thấp hơn kỳ vọng của bạn, đó là dấu hiệu của nội dung không hấp dẫn hoặc nhắm sai đối tượng.\n"
+            "- **Vấn đề `CPA` cao:** Khi chi phí để có một kết quả quá cao, đó là dấu hiệu của hiệu quả chuyển đổi kém hoặc chi phí đấu thầu cao.\n"
+            "- **Vấn đề `ROAS` thấp:** Khi lợi nhuận trên chi tiêu quảng cáo không đạt mục tiêu, đó là dấu hiệu của hiệu suất tài chính kém.\n\n"
+            
+            "Trình bày kết quả phân tích trong một báo cáo có cấu trúc rõ ràng, sử dụng các tiêu đề phụ và gạch đầu dòng.\n"
+            "**Phần 1: Tóm Tắt Phân Tích**\n"
+            "- Tóm tắt tổng thể về hiệu suất chiến dịch (tốt, trung bình, kém).\n"
+            "- Các chỉ số hiệu suất chính (CPA, ROAS, CTR) so với mục tiêu.\n\n"
+            
+            "**Phần 2: Phân Tích Chẩn Đoán Chi Tiết**\n"
+            "- Bảng Phân tích theo Cấp Nhóm quảng cáo:\n"
+            "    - Liệt kê các chỉ số chính (Amount Spent, Link Clicks, CTR, CPC, CPA, ROAS, Conversions) cho từng nhóm quảng cáo.\n"
+            "    - So sánh và xếp hạng các nhóm quảng cáo dựa trên ROAS và CPA.\n"
+            "- Bảng Phân tích theo Cấp Quảng cáo:\n"
+            "    - Liệt kê các chỉ số chính (CTR, CPC) cho từng quảng cáo.\n"
+            "    - Xác định quảng cáo chiến thắng (`winner`) và quảng cáo hoạt động kém (`loser`).\n\n"
+            
+            "**Phần 3: Các Phát Hiện và Đề Xuất Hành Động**\n"
+            "- **Đề xuất Hành động cho Nhóm quảng cáo:** Dựa trên các phát hiện ở cấp độ này, đưa ra các đề xuất cụ thể (ví dụ: tắt các nhóm quảng cáo hoạt động kém, tinh chỉnh đối tượng mục tiêu, thử nghiệm các nhóm đối tượng mới).\n"
+            "- **Đề xuất Hành động cho Quảng cáo:** Dựa trên các phát hiện ở cấp độ này, đưa ra các đề xuất cụ thể (ví dụ: tắt các quảng cáo hoạt động kém, A/B testing các biến thể creative mới, làm mới nội dung để chống `ad fatigue`).\n\n"
+            
+            "Tạo một kế hoạch hành động cụ thể, có thể thực thi. Ví dụ:\n"
+            "- `Creative Optimization`: Đề xuất A/B testing các yếu tố nào (tiêu đề, hình ảnh, video).\n"
+            "- `Audience Optimization`: Đề xuất thử nghiệm các tệp đối tượng mới (ví dụ: `lookalike audience` dựa trên khách hàng giá trị cao).\n"
+            "- `Bidding & Budget Strategy`: Đề xuất các thay đổi về chiến lược đấu thầu (`cost cap`, `ROAS goal`) hoặc phân bổ ngân sách.\n"
+        )
+        
+        user_prompt = (
+            f"Dữ liệu campaign (tối ưu):\n{json.dumps(optimized_data, ensure_ascii=False, indent=2)}\n\n"
+            "Hãy phân tích và trả lời theo format JSON:\n"
+            "{\n"
+            '  "insights": "3-4 insights chính về hiệu suất campaign (CTR, CPM, trends, outliers)",\n'
+            '  "recommendations": "3-4 hành động cụ thể để tối ưu hiệu suất"\n'
+            "}"
+        )
+        
+        return {
+            'model': self.analysis_model,
+            'messages': [
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': user_prompt}
+            ],
+            'max_tokens': 600,  # Giảm từ 800 xuống 600
+            'temperature': 0.3
+        }
+        
+    
     def analyze_posts_content(self, posts: list) -> Dict[str, Any]:
         """Phân tích danh sách bài viết Facebook để rút ra insights và đề xuất angles tháng tới."""
         if not self.api_key:
@@ -236,6 +247,29 @@ class OpenAIChatbot:
                 'angles': []
             }
 
+        compact_posts = self._compact_posts(posts)
+        cache_args = self._posts_cache_args(compact_posts)
+        cached = ai_cache.get(*cache_args, ttl=self.cache_ttl.total_seconds())
+        if cached:
+            logger.info("Sử dụng cache cho content insights")
+            return cached
+
+        try:
+            res = http_session.post(self.api_url, headers=self._headers(), json=self._posts_payload(compact_posts), timeout=60)
+            res.raise_for_status()
+            data = res.json()
+            content = data['choices'][0]['message']['content'] if data.get('choices') else ''
+            logger.info("OpenAI content insights generated")
+            result = { 'insights': content, 'angles': [] }
+            if content:
+                ai_cache.set(*cache_args, result)
+            return result
+        except Exception as e:
+            logger.error(f"Lỗi AI phân tích bài viết: {e}")
+            return { 'insights': f'Lỗi AI: {str(e)}', 'angles': [] }
+    
+    @staticmethod
+    def _compact_posts(posts: list) -> List[Dict[str, Any]]:
         compact_posts = []
         for p in posts[:30]:  # giới hạn ngữ cảnh cho ổn định
             compact_posts.append({
@@ -244,7 +278,12 @@ class OpenAIChatbot:
                 'message': (p.get('message') or '')[:2000],
                 'permalink_url': p.get('permalink_url')
             })
-
+        return compact_posts
+    
+    def _posts_cache_args(self, compact_posts: List[Dict[str, Any]]) -> tuple:
+        return ('posts', self._digest(compact_posts), self.content_model, self.POSTS_PROMPT_VERSION)
+    
+    def _posts_payload(self, compact_posts: List[Dict[str, Any]]) -> Dict[str, Any]:
         system_prompt = (
             "Bạn là chuyên gia nội dung Facebook. Phân tích danh sách bài viết (message + thời gian) để rút ra: \n"
             "1) Chủ đề/insight khách hàng đang quan tâm; 2) Top dạng nội dung/giọng điệu hiệu quả; \n"
@@ -252,35 +291,18 @@ class OpenAIChatbot:
             "5) Gợi ý 5-8 angles cho tháng tới (tiêu đề + mô tả ngắn + CTA). \n"
             "Trình bày ngắn gọn, có bullet rõ ràng, tập trung actionable."
         )
-
         user_prompt = (
             "Dưới đây là danh sách bài viết gần đây (rút gọn). Hãy phân tích và đưa ra đề xuất như yêu cầu ở trên.\n\n"
             f"Posts JSON (rút gọn):\n{json.dumps(compact_posts, ensure_ascii=False, indent=2)}\n"
         )
-
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
-        payload = {
-            'model': os.getenv('OPENAI_CHAT_MODEL', 'gpt-4o-mini'),
+        return {
+            'model': self.content_model,
             'messages': [
                 { 'role': 'system', 'content': system_prompt },
                 { 'role': 'user', 'content': user_prompt }
             ],
             'temperature': 0.2
         }
-
-        try:
-            res = requests.post(self.api_url, headers=headers, json=payload, timeout=60)
-            res.raise_for_status()
-            data = res.json()
-            content = data['choices'][0]['message']['content'] if data.get('choices') else ''
-            logger.info("OpenAI content insights generated")
-            return { 'insights': content, 'angles': [] }
-        except Exception as e:
-            logger.error(f"Lỗi AI phân tích bài viết: {e}")
-            return { 'insights': f'Lỗi AI: {str(e)}', 'angles': [] }
     
     def _optimize_data_for_ai(self, campaign_data: Dict[str, Any]) -> Dict[str, Any]:
         summary = campaign_data.get('summary_metrics', {})
@@ -312,38 +334,22 @@ class OpenAIChatbot:
             return "Xin lỗi, API key chưa được cấu hình. Vui lòng kiểm tra cài đặt."
         
         try:
-            system_prompt = (
-                "Bạn là chuyên gia phân tích Facebook Ads. Chỉ trả lời dựa trên dữ liệu được cung cấp, "
-                "không suy diễn hoặc bịa thêm. Nếu dữ liệu không đủ, hãy nói 'chưa đủ dữ liệu'."
-            )
-            user_prompt = (
-                "Ngữ cảnh dashboard (JSON):\n" + json.dumps(context or {}, ensure_ascii=False, indent=2) +
-                "\n\nCâu hỏi: " + question +
-                "\n\nYêu cầu: trả lời ngắn gọn, gạch đầu dòng rõ ràng, đề xuất hành động nếu phù hợp."
-            )
-            
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            data = {
-                'model': 'gpt-3.5-turbo',
-                'messages': [
-                    {'role': 'system', 'content': system_prompt},
-                    {'role': 'user', 'content': user_prompt}
-                ],
-                'max_tokens': 500,
-                'temperature': 0.7
-            }
+            data = self._ask_payload(question, context)
+            cache_args = self._ask_cache_args(data)
+            cached = ai_cache.get(*cache_args, ttl=self.cache_ttl.total_seconds())
+            if cached:
+                logger.info("Sử dụng cache cho câu hỏi chatbot")
+                return cached
             
-            response = requests.post(self.api_url, headers=headers, json=data, timeout=30)
+            response = http_session.post(self.api_url, headers=self._headers(), json=data, timeout=30)
             response.raise_for_status()
             
             result = response.json()
             answer = result['choices'][0]['message']['content']
             
             logger.info(f"OpenAI API response: {answer}")
+            if answer:
+                ai_cache.set(*cache_args, answer)
             return answer
             
         except requests.exceptions.RequestException as e:
@@ -352,15 +358,195 @@ class OpenAIChatbot:
         except Exception as e:
             logger.error(f"Lỗi không mong muốn: {e}")
             return "Xin lỗi, có lỗi xảy ra khi xử lý yêu cầu."
+    
+    def _ask_payload(self, question: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        system_prompt = (
+            "Bạn là chuyên gia phân tích Facebook Ads. Chỉ trả lời dựa trên dữ liệu được cung cấp, "
+            "không suy diễn hoặc bịa thêm. Nếu dữ liệu không đủ, hãy nói 'chưa đủ dữ liệu'."
+        )
+        user_prompt = (
+            "Ngữ cảnh dashboard (JSON):\n" + json.dumps(context or {}, ensure_ascii=False, indent=2) +
+            "\n\nCâu hỏi: " + question +
+            "\n\nYêu cầu: trả lời ngắn gọn, gạch đầu dòng rõ ràng, đề xuất hành động nếu phù hợp."
+        )
+        return {
+            'model': self.analysis_model,
+            'messages': [
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': user_prompt}
+            ],
+            'max_tokens': 500,
+            'temperature': 0.7
+        }
+    
+    def _ask_cache_args(self, payload: Dict[str, Any]) -> tuple:
+        user_prompt = payload['messages'][-1]['content']
+        return ('ask', self._digest(user_prompt), self.analysis_model, self.ASK_PROMPT_VERSION)
+    
+    def stream_chat(self, payload: Dict[str, Any], timeout: float = 30) -> Iterator[str]:
+        """Yield the content deltas of a chat completion as the stream API sends them.
+
+        timeout bounds the wait for each chunk rather than the whole answer. Raises
+        requests.exceptions.ConnectionError when the stream ends before its [DONE] marker.
+        """
+        # identity encoding: a gzip decoder would hold tokens back until it has a full block
+        headers = {**self._headers(), 'Accept': 'text/event-stream', 'Accept-Encoding': 'identity'}
+        started = time.perf_counter()
+        response = http_session.post(self.api_url, headers=headers, json={**payload, 'stream': True},
+                                     timeout=(10, timeout), stream=True)
+        try:
+            response.raise_for_status()
+            first_token = None
+            for line in response.iter_lines():
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip()
+                if data == b'[DONE]':
+                    logger.info(f"OpenAI stream xong sau {time.perf_counter() - started:.2f}s "
+                                f"(token đầu tiên sau {first_token or 0:.2f}s)")
+                    return
+                choices = json.loads(data).get('choices') or []
+                delta = (choices[0].get('delta') or {}).get('content') if choices else None
+                if delta:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    yield delta
+            raise requests.exceptions.ConnectionError('OpenAI stream kết thúc trước [DONE]')
+        finally:
+            response.close()
+    
+    def _stream_completion(self, cache_args: tuple, payload: Dict[str, Any], timeout: float,
+                           to_value: Callable[[str], Any], to_result: Callable[[Any, bool], Dict[str, Any]]
+                           ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield ('token', {'text': delta}) events as the answer streams in, then ('done', result).
+
+        to_value turns the full answer into the value the blocking method caches, so both paths
+        share AI cache entries; to_result turns a (value, cached) pair into the done payload.
+        A cache hit yields the done event right away. Interrupted streams are not cached.
+        """
+        cached = ai_cache.get(*cache_args, ttl=self.cache_ttl.total_seconds())
+        if cached:
+            logger.info(f"Sử dụng cache cho stream {cache_args[0]}")
+            yield 'done', to_result(cached, True)
+            return
+        parts = []
+        for delta in self.stream_chat(payload, timeout):
+            parts.append(delta)
+            yield 'token', {'text': delta}
+        answer = ''.join(parts)
+        value = to_value(answer)
+        if answer:
+            ai_cache.set(*cache_args, value)
+        yield 'done', to_result(value, False)
+    
+    def stream_campaign_analysis(self, campaign_data: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Streaming analyze_campaign_performance; the tokens are the raw JSON answer"""
+        if not self.api_key:
+            yield 'done', self.analyze_campaign_performance(campaign_data)
+            return
+        yield from self._stream_completion(
+            self._campaign_cache_args(campaign_data), self._campaign_payload(campaign_data), 30,
+            self._parse_campaign_answer, lambda value, cached: {**value, 'cached': cached})
+    
+    def stream_posts_content(self, posts: list) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Streaming analyze_posts_content"""
+        if not self.api_key:
+            yield 'done', self.analyze_posts_content(posts)
+            return
+        compact_posts = self._compact_posts(posts)
+        yield from self._stream_completion(
+            self._posts_cache_args(compact_posts), self._posts_payload(compact_posts), 60,
+            lambda answer: {'insights': answer, 'angles': []}, lambda value, cached: {**value, 'cached': cached})
+    
+    def stream_question(self, question: str, context: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Streaming ask_question"""
+        if not self.api_key:
+            yield 'done', {'answer': self.ask_question(question, context), 'cached': False}
+            return
+        payload = self._ask_payload(question, context)
+        yield from self._stream_completion(
+            self._ask_cache_args(payload), payload, 30,
+            lambda answer: answer, lambda value, cached: {'answer': value, 'cached': cached})
+
+ADS_DATA_FILE = 'ads_data.json'
+
+# Process-level snapshot of ads_data.json, reloaded only when the file's mtime or size changes
+_ads_data_cache: Dict[str, Any] = {'signature': None, 'data': None, 'index': None}
+_ads_data_lock = threading.Lock()
+
+def _ads_data_signature() -> Optional[tuple]:
+    try:
+        stat = os.stat(ADS_DATA_FILE)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+def build_campaign_index(campaigns: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Index campaigns by id, brand, status and account for O(1) filter lookups"""
+    index = {'campaigns': campaigns, 'by_id': {}, 'by_brand': {}, 'by_status': {}, 'by_account': {}}
+    for campaign in campaigns:
+        if campaign.get('campaign_id'):
+            index['by_id'][campaign['campaign_id']] = campaign
+        index['by_brand'].setdefault(campaign['brand'], []).append(campaign)
+        index['by_status'].setdefault(campaign.get('status', ''), []).append(campaign)
+        index['by_account'].setdefault(campaign.get('account_id', ''), []).append(campaign)
+    return index
 
 def load_ads_data() -> Dict[str, Any]:
-    import time
+    """Get ads data from the cached snapshot, re-reading the file only when it changed.
+
+    The returned dict is shared by all requests and must be treated as read-only.
+    """
+    signature = _ads_data_signature()
+    if signature and _ads_data_cache['signature'] == signature:
+        return _ads_data_cache['data']
+    
+    with _ads_data_lock:
+        # Another request may have reloaded the file while we waited
+        signature = _ads_data_signature()
+        if signature and _ads_data_cache['signature'] == signature:
+            return _ads_data_cache['data']
+        
+        data = _read_ads_data_file()
+        # Brand/content format are classified once here and read from the campaign afterwards
+        classify_campaigns(data.get('campaigns') or [])
+        if signature and data.get('campaigns'):
+            _ads_data_cache['index'] = build_campaign_index(data['campaigns'])
+            _ads_data_cache['data'] = data
+            _ads_data_cache['signature'] = signature
+        return data
+
+def get_campaign_index() -> Dict[str, Any]:
+    data = load_ads_data()
+    index = _ads_data_cache['index']
+    if index is not None and index['campaigns'] is data.get('campaigns'):
+        return index
+    return build_campaign_index(data.get('campaigns', []))
+
+def filter_campaigns(brand: Optional[str] = None, campaign_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Look up campaigns matching the global brand/campaign filters ('all' or empty means no filter)"""
+    index = get_campaign_index()
+    brand = brand if brand and brand != 'all' else None
+    campaign_id = campaign_id if campaign_id and campaign_id != 'all' else None
+    
+    if campaign_id:
+        campaign = index['by_id'].get(campaign_id)
+        if not campaign:
+            return []
+        if brand and campaign['brand'] != brand:
+            return []
+        return [campaign]
+    if brand:
+        return list(index['by_brand'].get(brand, []))
+    return list(index['campaigns'])
+
+def _read_ads_data_file() -> Dict[str, Any]:
     max_retries = 3
     retry_delay = 0.1
     
     for attempt in range(max_retries):
         try:
-            with open('ads_data.json', 'r', encoding='utf-8') as f:
+            with open(ADS_DATA_FILE, 'r', encoding='utf-8') as f:
                 data = json.load(f)
             
             # Validate that we have campaigns data
@@ -420,6 +606,31 @@ def get_ads_data():
         logger.error(f"Lỗi khi lấy dữ liệu: {e}")
         return jsonify({'error': str(e)}), 500
 
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _sse_response(events: Iterator[Tuple[str, Any]]) -> Response:
+    """Stream (event, data) pairs as server-sent events; an exception ends the stream with an error event"""
+    def generate():
+        # An immediate comment line sends the headers before the first (slow) event
+        yield ': stream\n\n'
+        try:
+            for event, data in events:
+                yield _sse(event, data)
+        except Exception as e:
+            logger.error(f"Lỗi stream AI: {e}")
+            yield _sse('error', {'error': str(e)})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _ask_context(context: Any) -> Any:
+    global_data = load_ads_data()
+    if isinstance(context, dict):
+        context.setdefault('extraction_date', global_data.get('extraction_date'))
+        context.setdefault('campaigns_count', len(global_data.get('campaigns', [])))
+    return context
+
 @app.route('/api/ask', methods=['POST'])
 def ask_question():
     try:
@@ -430,14 +641,9 @@ def ask_question():
         if not question:
             return jsonify({'error': 'Câu hỏi không được để trống'}), 400
         
-        global_data = load_ads_data()
-        if isinstance(context, dict):
-            context.setdefault('extraction_date', global_data.get('extraction_date'))
-            context.setdefault('campaigns_count', len(global_data.get('campaigns', [])))
-        
         chatbot = OpenAIChatbot()
         
-        answer = chatbot.ask_question(question, context)
+        answer = chatbot.ask_question(question, _ask_context(context))
         
         return jsonify({
             'question': question,
@@ -449,110 +655,117 @@ def ask_question():
         logger.error(f"Lỗi khi xử lý câu hỏi: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ask/stream', methods=['POST'])
+def ask_question_stream():
+    """Server-sent events version of /api/ask: token events with answer deltas, then done"""
+    data = request.get_json(silent=True) or {}
+    question = (data.get('question') or '').strip()
+    if not question:
+        return jsonify({'error': 'Câu hỏi không được để trống'}), 400
+    context = data.get('context') or {}
+    
+    def events():
+        yield from OpenAIChatbot().stream_question(question, _ask_context(context))
+    
+    return _sse_response(events())
+
 @app.route('/api/health')
 def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'openai_configured': bool(os.getenv('OPENAI_API_KEY'))
+        'openai_configured': bool(os.getenv('OPENAI_API_KEY')),
+        'response_cache': response_cache.stats(),
+        'coalesced_requests': http_session.single_flight.shared,
+        'ai_cache': ai_cache.stats()
     })
 
 @app.route('/api/refresh', methods=['POST'])
 def refresh_data():
+    """Start a background extraction job and return its ID; poll /api/jobs/<job_id> for progress"""
     try:
-        start_date = request.json.get('start_date') if request.is_json else None
+        start_date = (request.json.get('start_date') if request.is_json else None) or "2023-01-01"
         extractor = FacebookAdsExtractor()
-        data = extractor.extract_all_data(start_date or "2023-01-01")
-        ok = extractor.save_to_json(data, "ads_data.json")
-        return jsonify({'ok': bool(ok), 'campaigns': len(data.get('campaigns', []))})
+        
+        def run_extraction(job):
+            # Raises on any extraction error, leaving the previous ads_data.json in place
+            count = extractor.extract_to_json(ADS_DATA_FILE, start_date, progress=job.progress)
+            return {'campaigns': count}
+        
+        job = job_manager.submit('refresh', run_extraction)
+        return jsonify({'ok': True, **job.to_dict()}), 202
     except Exception as e:
         logger.error(f"Lỗi refresh: {e}")
         return jsonify({'ok': False, 'error': str(e)}), 500
 
-@app.route('/api/refresh-budgets')
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id):
+    """Get status and progress of a background job"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/refresh-budgets', methods=['POST'])
 def api_refresh_budgets():
-    """Refresh budget cache for all campaigns"""
+    """Start a background refresh of the budget cache for all campaigns.
+
+    Budgets are read per ad account with ?ids= multi-ID requests, paced by the account's
+    usage headers. Campaigns with a still valid cache entry are skipped unless force=1.
+    Returns a job ID; poll /api/jobs/<job_id> for progress.
+    """
     try:
         token = os.getenv('FACEBOOK_ACCESS_TOKEN')
         if not token:
             return jsonify({'error': 'Facebook access token not found'}), 500
         
-        # Load campaigns data
-        ads_data = load_ads_data()
-        campaigns = ads_data.get('campaigns', [])
-        
+        campaigns = [c for c in get_campaign_index()['campaigns'] if c.get('campaign_id')]
         if not campaigns:
             return jsonify({'error': 'No campaigns found'}), 404
         
-        base_url = 'https://graph.facebook.com/v23.0'
-        updated_count = 0
-        failed_count = 0
+        force = request.args.get('force', '').lower() in ('1', 'true', 'yes')
         
-        # Process campaigns in small batches to avoid rate limiting
-        batch_size = 3
-        for i in range(0, min(len(campaigns), 10), batch_size):  # Limit to 10 campaigns
-            batch = campaigns[i:i+batch_size]
+        def run_budget_refresh(job):
+            campaign_ids = [c['campaign_id'] for c in campaigns]
+            cached = {} if force else budget_cache.get_campaign_budgets(campaign_ids)
+            by_account: Dict[str, List[str]] = {}
+            for campaign in campaigns:
+                if campaign['campaign_id'] not in cached:
+                    by_account.setdefault(campaign.get('account_id') or '', []).append(campaign['campaign_id'])
             
-            for campaign in batch:
-                campaign_id = campaign.get('campaign_id')
-                if not campaign_id:
-                    continue
-                
-                try:
-                    # Check if we already have valid cache
-                    cached_budget = budget_cache.get_campaign_budget(campaign_id)
-                    if cached_budget:
-                        continue  # Skip if already cached
-                    
-                    # Fetch budget from Facebook API
-                    url = f"{base_url}/{campaign_id}"
-                    params = {
-                        'access_token': token,
-                        'fields': 'daily_budget,lifetime_budget,budget_remaining'
+            total = sum(len(ids) for ids in by_account.values())
+            job.progress(0, total)
+            updated_count = 0
+            failed_count = 0
+            for account_id, ids in by_account.items():
+                throttle = get_throttle(account_id or 'token')
+                for chunk, nodes in iter_objects(ids, token, ','.join(BUDGET_FIELDS), throttle):
+                    budgets = {
+                        cid: {field: float(node.get(field, 0) or 0) for field in BUDGET_FIELDS}
+                        for cid, node in nodes.items()
                     }
-                    
-                    response = requests.get(url, params=params, timeout=10)
-                    if response.status_code == 200:
-                        budget_info = response.json()
-                        budget_data = {
-                            'daily_budget': float(budget_info.get('daily_budget', 0) or 0),
-                            'lifetime_budget': float(budget_info.get('lifetime_budget', 0) or 0),
-                            'budget_remaining': float(budget_info.get('budget_remaining', 0) or 0)
-                        }
-                        
-                        # Cache the budget data
-                        budget_cache.set_campaign_budget(campaign_id, budget_data)
-                        updated_count += 1
-                        
-                        logger.info(f"Updated budget cache for campaign {campaign_id}")
-                    else:
-                        logger.warning(f"Failed to get budget for campaign {campaign_id}: {response.status_code}")
-                        failed_count += 1
-                    
-                    # Small delay to avoid rate limiting
-                    time.sleep(1)
-                    
-                except Exception as e:
-                    logger.error(f"Error fetching budget for campaign {campaign_id}: {e}")
-                    failed_count += 1
+                    budget_cache.set_campaign_budgets(budgets)
+                    updated_count += len(budgets)
+                    failed_count += len(chunk) - len(budgets)
+                    job.progress(updated_count + failed_count, total)
             
-            # Longer delay between batches
-            if i + batch_size < len(campaigns):
-                time.sleep(3)
+            logger.info(f"Budget refresh: {updated_count} updated, {failed_count} failed, {len(cached)} cached")
+            return {
+                'updated_count': updated_count,
+                'failed_count': failed_count,
+                'skipped_count': len(cached),
+                'cache_valid': budget_cache.is_cache_available()
+            }
         
-        return jsonify({
-            'success': True,
-            'updated_count': updated_count,
-            'failed_count': failed_count,
-            'cache_valid': budget_cache.is_cache_available(),
-            'message': f'Updated budget cache for {updated_count} campaigns'
-        })
+        job = job_manager.submit('refresh-budgets', run_budget_refresh)
+        return jsonify({'success': True, **job.to_dict()}), 202
         
     except Exception as e:
         logger.error(f"Error in /api/refresh-budgets: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/campaign-insights')
+@cached_response('last_30d', version=_ads_data_signature)
 def api_campaign_insights():
     try:
         campaign_id = request.args.get('campaign_id', '').strip()
@@ -569,7 +782,7 @@ def api_campaign_insights():
         base_url = 'https://graph.facebook.com/v23.0'
         url = f"{base_url}/{campaign_id}/insights"
         def fetch(params):
-            r = requests.get(url, params=params, timeout=30)
+            r = http_session.get(url, params=params, timeout=30)
             return r.status_code, r.json()
 
         initial_preset = 'last_7d' if campaign_status == 'ACTIVE' else 'last_30d'
@@ -672,52 +885,21 @@ def api_campaign_insights():
             totals['inline_link_clicks'] += int(float(r.get('inline_link_clicks', 0) or 0))
             totals['unique_inline_link_clicks'] += int(float(r.get('unique_inline_link_clicks', 0) or 0))
 
-            for a in (r.get('actions') or []):
-                at = (a.get('action_type') or '').lower()
-                try:
-                    val = int(float(a.get('value', 0) or 0))
-                except Exception:
-                    val = 0
-                if at == 'post_engagement':
-                    totals['post_engagement'] += val
-                elif at == 'photo_view':
-                    totals['photo_view'] += val
-                elif at in ('link_click', 'landing_page_view'):
-                    totals['inline_link_clicks'] += val
-                # Messaging conversations/new connections
-                elif ('messaging' in at and ('conversation' in at or 'new_messaging_connection' in at or 'first_reply' in at)) or \
-                     at.startswith('onsite_conversion.messaging') or \
-                     at in ['messaging_conversation_started', 'messaging_first_reply', 'onsite_conversion.messaging_conversation_started', 'onsite_conversion.messaging_first_reply']:
-                    # Count total contacts
-                    totals['messaging_contacts'] += val
-                    # Count new contacts for start-type events
-                    if ('conversation' in at or 'new_messaging_connection' in at) or \
-                       at in ['messaging_conversation_started', 'onsite_conversion.messaging_conversation_started']:
-                        totals['messaging_new_contacts'] += val
-                    # Backward compatible counter
-                    totals['messaging_starts'] += val
-                # Purchases (cover multiple action type variants)
-                elif at == 'purchase' or 'purchase' in at:
-                    totals['purchases'] += val
+            counts = sum_actions(r.get('actions'))
+            totals['post_engagement'] += counts[POST_ENGAGEMENT]
+            totals['photo_view'] += counts[PHOTO_VIEW]
+            totals['inline_link_clicks'] += counts[LINK_CLICK]
+            # Messaging conversations/new connections (messaging_starts is the backward compatible counter)
+            totals['messaging_contacts'] += counts[MESSAGING]
+            totals['messaging_new_contacts'] += counts[MESSAGING_NEW]
+            totals['messaging_starts'] += counts[MESSAGING]
+            totals['purchases'] += counts[PURCHASE]
 
             # Process conversion_values for messaging conversions
-            for cv in (r.get('conversion_values') or []):
-                cv_type = (cv.get('action_type') or '').lower()
-                try:
-                    cv_val = float(cv.get('value', 0) or 0)
-                except Exception:
-                    cv_val = 0
-                # Handle messaging conversion values
-                if (cv_type.startswith('onsite_conversion.messaging') or 
-                    cv_type in ['messaging_conversation_started', 'messaging_first_reply', 'onsite_conversion.messaging_conversation_started', 'onsite_conversion.messaging_first_reply'] or
-                    ('messaging' in cv_type and 'conversion' in cv_type)):
-                    # Count total contacts
-                    totals['messaging_contacts'] += int(cv_val)
-                    # Count new contacts for start-type events
-                    if ('conversation' in cv_type) or \
-                       cv_type in ['messaging_conversation_started', 'onsite_conversion.messaging_conversation_started']:
-                        totals['messaging_new_contacts'] += int(cv_val)
-                    totals['messaging_starts'] += int(cv_val)
+            cv_counts = sum_actions(r.get('conversion_values'))
+            totals['messaging_contacts'] += cv_counts[MESSAGING]
+            totals['messaging_new_contacts'] += cv_counts[MESSAGING_NEW]
+            totals['messaging_starts'] += cv_counts[MESSAGING]
 
             totals['video_views'] += sum_video_actions(r.get('video_play_actions'))
             totals['video_views'] += sum_video_actions(r.get('video_3_sec_watched_actions'))
@@ -732,6 +914,7 @@ def api_campaign_insights():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/campaign-breakdown')
+@cached_response('last_30d', version=_ads_data_signature)
 def api_campaign_breakdown():
     try:
         campaign_id = request.args.get('campaign_id', '').strip()
@@ -758,7 +941,7 @@ def api_campaign_breakdown():
             params['date_preset'] = 'custom'
             params['since'] = since
             params['until'] = until
-        res = requests.get(f"{base_url}/{campaign_id}/insights", params=params, timeout=30)
+        res = http_session.get(f"{base_url}/{campaign_id}/insights", params=params, timeout=30)
         data = res.json()
         rows = []
         if res.status_code == 200:
@@ -768,7 +951,7 @@ def api_campaign_breakdown():
                 p2 = params.copy()
                 p2.pop('since', None); p2.pop('until', None)
                 p2['date_preset'] = 'last_30d'
-                res_try = requests.get(f"{base_url}/{campaign_id}/insights", params=p2, timeout=30)
+                res_try = http_session.get(f"{base_url}/{campaign_id}/insights", params=p2, timeout=30)
                 if res_try.status_code == 200:
                     rows = res_try.json().get('data', [])
                     data = res_try.json()
@@ -776,7 +959,7 @@ def api_campaign_breakdown():
             if not rows and kind == 'placement':
                 fb_params = (p2 if (since and until) else params).copy()
                 fb_params['breakdowns'] = 'publisher_platform,platform_position'
-                res2 = requests.get(f"{base_url}/{campaign_id}/insights", params=fb_params, timeout=30)
+                res2 = http_session.get(f"{base_url}/{campaign_id}/insights", params=fb_params, timeout=30)
                 if res2.status_code == 200:
                     rows_raw = res2.json().get('data', [])
                     for r in rows_raw:
@@ -798,6 +981,7 @@ def api_campaign_breakdown():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/daily-breakdowns')
+@cached_response('last_30d', version=_ads_data_signature)
 def api_daily_breakdowns():
     try:
         date_preset = request.args.get('date_preset', 'last_30d').strip()
@@ -816,7 +1000,6 @@ def api_daily_breakdowns():
         ads_data = load_ads_data()
         if ads_data.get('error'):
             return jsonify({'error': ads_data['error']}), 500
-        campaigns = ads_data.get('campaigns', [])
         base_url = 'https://graph.facebook.com/v23.0'
 
         agg = { 'gender': {}, 'age': {}, 'country': {} }
@@ -825,23 +1008,11 @@ def api_daily_breakdowns():
             g = agg[bucket].setdefault(key or 'unknown', {'impressions':0,'clicks':0,'ctr':0.0,'new_messages':0})
             g['impressions'] += int(float(row.get('impressions',0) or 0))
             g['clicks'] += int(float(row.get('clicks',0) or 0))
-            newm = 0
-            for a in (row.get('actions') or []):
-                at=(a.get('action_type') or '').lower()
-                try:
-                    val=int(float(a.get('value',0) or 0))
-                except Exception:
-                    val=0
-                if (at in ['messaging_conversation_started','onsite_conversion.messaging_conversation_started','new_messaging_connection'] or 'conversation' in at):
-                    newm += val
+            newm = sum_actions(row.get('actions'))[MESSAGING_NEW]
             g['new_messages'] += newm
 
         # Prefer querying at Ad Account level for reliable breakdowns
-        account_id = None
-        for c in campaigns:
-            if c.get('account_id'):
-                account_id = c['account_id']
-                break
+        account_id = next((a for a in get_campaign_index()['by_account'] if a), None)
         # Fallback: try from env if not found
         if not account_id:
             account_id = os.getenv('FB_AD_ACCOUNT_ID')
@@ -856,11 +1027,11 @@ def api_daily_breakdowns():
                 'breakdowns': breakdowns,
                 'date_preset': date_preset
             }
-            res = requests.get(f"{base_url}/{account_id}/insights", params=params, timeout=25)
+            res = http_session.get(f"{base_url}/{account_id}/insights", params=params, timeout=25)
             if res.status_code!=200:
                 for fb in ['last_30d','last_90d','lifetime']:
                     params_fb=params.copy(); params_fb['date_preset']=fb
-                    res = requests.get(f"{base_url}/{account_id}/insights", params=params_fb, timeout=25)
+                    res = http_session.get(f"{base_url}/{account_id}/insights", params=params_fb, timeout=25)
                     if res.status_code==200:
                         break
             if res.status_code!=200:
@@ -883,7 +1054,34 @@ def api_daily_breakdowns():
         logger.error(f"Lỗi /api/daily-breakdowns: {e}")
         return jsonify({'error': str(e)}), 500
 
+AD_INSIGHT_FIELDS = 'impressions,clicks,spend,ctr,cpc,cpm,reach'
+
+def _ad_insights_by_id(parent_id: str, ad_ids: List[str], token: str, date_preset: str) -> Dict[str, Dict[str, Any]]:
+    """Insights of the given ads from one level=ad request on their campaign/ad set, keyed by ad id.
+
+    Falls back to batched per-ad requests when the level=ad request fails.
+    """
+    if not ad_ids:
+        return {}
+    params = {
+        'level': 'ad',
+        'fields': f'ad_id,{AD_INSIGHT_FIELDS}',
+        'date_preset': date_preset,
+        'filtering': json.dumps([{'field': 'ad.id', 'operator': 'IN', 'value': ad_ids}]),
+        'limit': 500
+    }
+    try:
+        rows = {}
+        for row in iter_edge(f"{parent_id}/insights", token, params):
+            rows.setdefault(row.pop('ad_id', None), row)
+        return rows
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning(f"Insights level=ad của {parent_id} lỗi ({e}), lấy theo từng ad bằng batch")
+    rows_by_id = fetch_insights_batch(ad_ids, token, {'fields': AD_INSIGHT_FIELDS, 'date_preset': date_preset})
+    return {ad_id: rows[0] for ad_id, rows in rows_by_id.items() if rows}
+
 @app.route('/api/campaign-ads')
+@cached_response('last_30d')
 def api_campaign_ads():
     try:
         campaign_id = request.args.get('campaign_id', '').strip()
@@ -893,7 +1091,7 @@ def api_campaign_ads():
         token = get_access_token()
         base_url = 'https://graph.facebook.com/v23.0'
 
-        ads_res = requests.get(f"{base_url}/{campaign_id}/ads", params={'access_token': token, 'fields': 'id,name,adset_id,status,created_time', 'limit': 50}, timeout=30)
+        ads_res = http_session.get(f"{base_url}/{campaign_id}/ads", params={'access_token': token, 'fields': 'id,name,adset_id,status,created_time', 'limit': 50}, timeout=30)
         ads_data = ads_res.json()
         if ads_res.status_code != 200:
             err = ads_data.get('error', {})
@@ -902,16 +1100,9 @@ def api_campaign_ads():
             return jsonify({'error': err or {'message': 'Unknown error'}, 'items': []})
         ads = ads_data.get('data', [])
 
-        result = []
-        for ad in ads[:20]:
-            ins_params = {
-                'access_token': token,
-                'fields': 'impressions,clicks,spend,ctr,cpc,cpm,reach',
-                'date_preset': date_preset
-            }
-            ins_res = requests.get(f"{base_url}/{ad['id']}/insights", params=ins_params, timeout=30)
-            ins = ins_res.json().get('data', []) if ins_res.status_code == 200 else []
-            result.append({'ad': ad, 'insights': ins[0] if ins else {}})
+        ads = ads[:20]
+        insights = _ad_insights_by_id(campaign_id, [ad['id'] for ad in ads], token, date_preset)
+        result = [{'ad': ad, 'insights': insights.get(ad['id'], {})} for ad in ads]
 
         return jsonify({'items': result})
     except Exception as e:
@@ -926,7 +1117,7 @@ def api_campaign_adsets():
             return jsonify({'error': 'campaign_id is required', 'items': []}), 400
         token = get_access_token()
         base_url = 'https://graph.facebook.com/v23.0'
-        res = requests.get(f"{base_url}/{campaign_id}/adsets", params={'access_token': token, 'fields': 'id,name,status,campaign_id', 'limit': 100}, timeout=30)
+        res = http_session.get(f"{base_url}/{campaign_id}/adsets", params={'access_token': token, 'fields': 'id,name,status,campaign_id', 'limit': 100}, timeout=30)
         data = res.json()
         if res.status_code != 200:
             err = data.get('error', {})
@@ -939,6 +1130,7 @@ def api_campaign_adsets():
         return jsonify({'error': str(e), 'items': []}), 500
 
 @app.route('/api/adset-ads')
+@cached_response('last_30d')
 def api_adset_ads():
     try:
         adset_id = request.args.get('adset_id', '').strip()
@@ -947,7 +1139,7 @@ def api_adset_ads():
             return jsonify({'error': 'adset_id is required', 'items': []}), 400
         token = get_access_token()
         base_url = 'https://graph.facebook.com/v23.0'
-        ads_res = requests.get(f"{base_url}/{adset_id}/ads", params={'access_token': token, 'fields': 'id,name,status,created_time', 'limit': 100}, timeout=30)
+        ads_res = http_session.get(f"{base_url}/{adset_id}/ads", params={'access_token': token, 'fields': 'id,name,status,created_time', 'limit': 100}, timeout=30)
         ads_data = ads_res.json()
         if ads_res.status_code != 200:
             err = ads_data.get('error', {})
@@ -955,12 +1147,9 @@ def api_adset_ads():
                 return jsonify({'error': err, 'token_expired': True, 'items': []})
             return jsonify({'error': err or {'message': 'Unknown error'}, 'items': []})
         ads = ads_data.get('data', [])
-        result = []
-        for ad in ads[:50]:
-            ins_params = {'access_token': token, 'fields': 'impressions,clicks,spend,ctr,cpc,cpm,reach', 'date_preset': date_preset}
-            ins_res = requests.get(f"{base_url}/{ad['id']}/insights", params=ins_params, timeout=30)
-            ins = ins_res.json().get('data', []) if ins_res.status_code == 200 else []
-            result.append({'ad': ad, 'insights': ins[0] if ins else {}})
+        ads = ads[:50]
+        insights = _ad_insights_by_id(adset_id, [ad['id'] for ad in ads], token, date_preset)
+        result = [{'ad': ad, 'insights': insights.get(ad['id'], {})} for ad in ads]
         return jsonify({'items': result})
     except Exception as e:
         logger.error(f"Lỗi /api/adset-ads: {e}")
@@ -989,259 +1178,88 @@ def api_daily_tracking():
             return jsonify({'error': 'No campaigns found', 'daily': [], 'totals': {}})
         
         # Apply brand and campaign filters if provided
-        def _extract_brand(name: str) -> str:
-            try:
-                return extract_brand_from_campaign_name(name or '')
-            except Exception:
-                return 'Unknown'
-        
-        filtered_campaigns = campaigns
-        if filter_brand and filter_brand != 'all':
-            filtered_campaigns = [c for c in filtered_campaigns if _extract_brand(c.get('campaign_name', '')) == filter_brand]
-        if filter_campaign_id and filter_campaign_id != 'all':
-            filtered_campaigns = [c for c in filtered_campaigns if c.get('campaign_id') == filter_campaign_id]
-        
-        # Fallback if filters remove all
-        if not filtered_campaigns:
-            filtered_campaigns = []
-        
-        base_url = 'https://graph.facebook.com/v23.0'
-        all_daily_data = []
+        filtered_campaigns = filter_campaigns(filter_brand, filter_campaign_id)
         
-        # Aggregate data from all campaigns (limit to avoid timeout)
         successful_campaigns = 0
         failed_campaigns = 0
-        max_campaigns = 20  # Increase limit to include more campaigns
         
         # Sort campaigns: ACTIVE first, then PAUSED, to prioritize active campaigns
-        sorted_campaigns = sorted(filtered_campaigns, key=lambda x: (x.get('status', '') != 'ACTIVE', x.get('campaign_id', '')))
+        sorted_campaigns = sorted(
+            [c for c in filtered_campaigns if c.get('campaign_id')],
+            key=lambda x: (x.get('status', '') != 'ACTIVE', x.get('campaign_id', ''))
+        )
         
-        for campaign in sorted_campaigns[:max_campaigns]:
-            campaign_id = campaign.get('campaign_id')
-            if not campaign_id:
-                continue
-                
-            try:
-                # Get budget data from cache
-                cached_budget = budget_cache.get_campaign_budget(campaign_id)
-                if cached_budget:
-                    budget_data = cached_budget
-                    logger.debug(f"Using cached budget for campaign {campaign_id}")
-                else:
-                    # Fallback to 0 if no cache available
-                    budget_data = {
-                        'daily_budget': 0.0,
-                        'lifetime_budget': 0.0,
-                        'budget_remaining': 0.0
-                    }
-                    logger.debug(f"No budget cache for campaign {campaign_id}")
-                
-                # Get insights data
-                url = f"{base_url}/{campaign_id}/insights"
-                campaign_status = campaign.get('status', 'UNKNOWN')
-                
-                # Request fields including actions for messaging, conversions, and ROAS
-                params = {
-                    'access_token': token,
-                    'fields': 'campaign_name,impressions,clicks,spend,ctr,cpc,cpm,reach,frequency,actions,conversion_values,inline_link_clicks,inline_link_click_ctr,unique_inline_link_clicks',
-                    'date_preset': date_preset,
-                    'time_increment': 1
-                }
-                # Override with custom range if provided
-                if since and until:
-                    params['date_preset'] = 'custom'
-                    params['since'] = since
-                    params['until'] = until
-                
-                # For PAUSED campaigns, try with longer date range if initial request fails
-                fallback_presets = ['last_90d', 'lifetime'] if campaign_status == 'PAUSED' else []
-                
-                response = requests.get(url, params=params, timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    daily_rows = data.get('data', [])
-                    if daily_rows:
-                        # Add budget data to each daily row
-                        for row in daily_rows:
-                            row.update(budget_data)
-                        all_daily_data.extend(daily_rows)
-                        successful_campaigns += 1
-                        
-                        # Log successful campaign processing
-                        if successful_campaigns == 1:
-                            logger.info(f"Successfully processed first campaign {campaign_id} (status: {campaign_status})")
-                    else:
-                        # Try with fallback presets for campaigns with no data
-                        found_data = False
-                        for fallback_preset in fallback_presets:
-                            params_fallback = params.copy()
-                            params_fallback['date_preset'] = fallback_preset
-                            response_fallback = requests.get(url, params=params_fallback, timeout=30)
-                            if response_fallback.status_code == 200:
-                                fallback_data = response_fallback.json()
-                                fallback_rows = fallback_data.get('data', [])
-                                if fallback_rows:
-                                    # Add budget data to each daily row
-                                    for row in fallback_rows:
-                                        row.update(budget_data)
-                                    all_daily_data.extend(fallback_rows)
-                                    successful_campaigns += 1
-                                    found_data = True
-                                    logger.info(f"Got data for PAUSED campaign {campaign_id} with preset {fallback_preset}")
-                                    break
-                        
-                        if not found_data:
-                            failed_campaigns += 1
-                else:
-                    # Try with fallback presets for failed requests
-                    found_data = False
-                    for fallback_preset in fallback_presets:
-                        params_fallback = params.copy()
-                        params_fallback['date_preset'] = fallback_preset
-                        response_fallback = requests.get(url, params=params_fallback, timeout=30)
-                        if response_fallback.status_code == 200:
-                            fallback_data = response_fallback.json()
-                            fallback_rows = fallback_data.get('data', [])
-                            if fallback_rows:
-                                # Add budget data to each daily row
-                                for row in fallback_rows:
-                                    row.update(budget_data)
-                                all_daily_data.extend(fallback_rows)
-                                successful_campaigns += 1
-                                found_data = True
-                                logger.info(f"Got fallback data for campaign {campaign_id} (status: {campaign_status}) with preset {fallback_preset}")
-                                break
-                    
-                    if not found_data:
-                        failed_campaigns += 1
-                        logger.warning(f"Failed to get insights for campaign {campaign_id} (status: {campaign_status}): {response.status_code}")
-                    
-            except Exception as e:
+        # Request fields including actions for messaging, conversions, and ROAS
+        params = {
+            'fields': 'campaign_name,impressions,clicks,spend,ctr,cpc,cpm,reach,frequency,actions,conversion_values,inline_link_clicks,inline_link_click_ctr,unique_inline_link_clicks',
+            'date_preset': date_preset,
+            'time_increment': 1
+        }
+        # Override with custom range if provided
+        if since and until:
+            params['date_preset'] = 'custom'
+            params['since'] = since
+            params['until'] = until
+        
+        # For PAUSED campaigns, try with longer date range if initial request fails
+        fallback_presets = {
+            c['campaign_id']: ['last_90d', 'lifetime']
+            for c in sorted_campaigns if c.get('status') == 'PAUSED'
+        }
+        
+        # Closed days come from the local insights store, the rest from account-level Graph insights
+        rows_by_campaign = insights_store.load_campaign_insights(
+            sorted_campaigns, token, params, date_preset, since, until, fallback_presets
+        )
+        
+        # Get budget data for all campaigns from cache in one lookup
+        cached_budgets = budget_cache.get_campaign_budgets(c['campaign_id'] for c in sorted_campaigns)
+        
+        budgets_by_campaign = {}
+        for campaign in sorted_campaigns:
+            campaign_id = campaign['campaign_id']
+            if not rows_by_campaign.get(campaign_id):
                 failed_campaigns += 1
-                logger.warning(f"Error fetching insights for campaign {campaign_id}: {e}")
+                logger.warning(f"Failed to get insights for campaign {campaign_id} (status: {campaign.get('status', 'UNKNOWN')})")
                 continue
+            # Fallback to 0 if no cache available; budgets are repeated on each daily row of the campaign
+            budgets_by_campaign[campaign_id] = cached_budgets.get(campaign_id) or {
+                'daily_budget': 0.0,
+                'lifetime_budget': 0.0,
+                'budget_remaining': 0.0
+            }
+            successful_campaigns += 1
         
-        logger.info(f"Daily tracking: {successful_campaigns} successful, {failed_campaigns} failed campaigns (processed {min(len(campaigns), max_campaigns)} out of {len(campaigns)} total)")
+        logger.info(f"Daily tracking: {successful_campaigns} successful, {failed_campaigns} failed campaigns (processed {len(sorted_campaigns)} out of {len(campaigns)} total)")
         
-        # Group by date and aggregate
+        # Group by date: every row is parsed once into columns, then summed per date
+        frame = InsightFrame.from_campaign_rows(
+            {cid: rows_by_campaign[cid] for cid in budgets_by_campaign}, campaign_values=budgets_by_campaign
+        )
         date_groups = {}
-        for row in all_daily_data:
-            date_key = row.get('date_start') or row.get('date') or row.get('date_stop') or 'unknown'
-            if date_key not in date_groups:
-                date_groups[date_key] = {
-                    'date_start': date_key,
-                    'impressions': 0,
-                    'clicks': 0,
-                    'spend': 0.0,
-                    'reach': 0,
-                    'inline_link_clicks': 0,
-                    'post_engagement': 0,
-                    'photo_view': 0,
-                    'video_views': 0,
-                    'video_2_sec_watched_actions': 0,
-                    'messaging_starts': 0,
-                    'purchases': 0,
-                    'purchase_value': 0.0,
-                    'campaign_count': 0,
-                    'budget_remaining': 0.0,
-                    'daily_budget': 0.0,
-                    'lifetime_budget': 0.0
-                }
-            
-            # Sum numeric fields
-            group = date_groups[date_key]
-            group['impressions'] += int(float(row.get('impressions', 0) or 0))
-            group['clicks'] += int(float(row.get('clicks', 0) or 0))
-            group['spend'] += float(row.get('spend', 0) or 0)
-            group['reach'] += int(float(row.get('reach', 0) or 0))
-            group['inline_link_clicks'] += int(float(row.get('inline_link_clicks', 0) or 0))
-            group['post_engagement'] += int(float(row.get('post_engagement', 0) or 0))
-            group['photo_view'] += int(float(row.get('photo_view', 0) or 0))
-            group['video_views'] += int(float(row.get('video_views', 0) or 0))
-            group['messaging_starts'] += int(float(row.get('messaging_starts', 0) or 0))
-            group['purchases'] += int(float(row.get('purchases', 0) or 0))
-            group['purchase_value'] += float(row.get('purchase_value', 0) or 0)
-            group['budget_remaining'] += float(row.get('budget_remaining', 0) or 0)
-            group['daily_budget'] += float(row.get('daily_budget', 0) or 0)
-            group['lifetime_budget'] += float(row.get('lifetime_budget', 0) or 0)
-            group['campaign_count'] += 1
-            
-            # Process actions array for messaging, conversions, and engagement
-            for action in (row.get('actions') or []):
-                action_type = (action.get('action_type') or '').lower()
-                try:
-                    value = int(float(action.get('value', 0) or 0))
-                except Exception:
-                    value = 0
-                
-                # Process messaging actions silently
-                    
-                # Handle different action types based on actual Facebook API response
-                # Priority: Messaging actions first, then other conversions
-                if action_type == 'post_engagement':
-                    group['post_engagement'] += value
-                elif action_type == 'photo_view':
-                    group['photo_view'] += value
-                # Messaging actions - check first to avoid conflicts with conversion actions
-                elif (action_type.startswith('onsite_conversion.messaging') or 
-                      action_type == 'messaging_starts' or 
-                      action_type == 'onsite_conversion.messaging_conversation_started' or
-                      action_type == 'onsite_conversion.messaging_first_reply' or
-                      action_type == 'messaging_conversation_started' or
-                      action_type == 'messaging_first_reply' or
-                      action_type == 'new_messaging_connection' or
-                      ('messaging' in action_type and 'conversion' in action_type)):
-                    group['messaging_starts'] += value
-                    group['messaging_contacts'] = group.get('messaging_contacts', 0) + value
-                    if (action_type in ['messaging_conversation_started', 'onsite_conversion.messaging_conversation_started', 'new_messaging_connection'] or 
-                        ('conversation' in action_type)):
-                        group['messaging_new_contacts'] = group.get('messaging_new_contacts', 0) + value
-                # Purchase/Conversion actions - only handle actual purchase actions
-                elif (action_type == 'purchase' or 
-                      action_type == 'offsite_conversion' or 
-                      action_type.startswith('offsite_conversion')):
-                    group['purchases'] += value
-                    # For purchase actions, the value might be purchase value
-                    if action_type == 'purchase':
-                        try:
-                            purchase_value = float(action.get('value', 0) or 0)
-                            group['purchase_value'] += purchase_value
-                        except Exception:
-                            pass
-                # Link clicks
-                elif action_type == 'link_click' or action_type == 'landing_page_view':
-                    group['inline_link_clicks'] += value
-            
-            # Process conversion_values for messaging conversions
-            for cv in (row.get('conversion_values') or []):
-                cv_type = (cv.get('action_type') or '').lower()
-                try:
-                    cv_val = float(cv.get('value', 0) or 0)
-                except Exception:
-                    cv_val = 0
-                # Handle messaging conversion values
-                if (cv_type.startswith('onsite_conversion.messaging') or 
-                    cv_type in ['messaging_conversation_started', 'messaging_first_reply', 'onsite_conversion.messaging_conversation_started', 'onsite_conversion.messaging_first_reply', 'new_messaging_connection'] or
-                    ('messaging' in cv_type and 'conversion' in cv_type)):
-                    group['messaging_starts'] += int(cv_val)
-                    group['messaging_contacts'] = group.get('messaging_contacts', 0) + int(cv_val)
-                    if (cv_type in ['messaging_conversation_started', 'onsite_conversion.messaging_conversation_started', 'new_messaging_connection'] or 
-                        ('conversation' in cv_type)):
-                        group['messaging_new_contacts'] = group.get('messaging_new_contacts', 0) + int(cv_val)
-            
-            # Process video actions
-            for video_action in (row.get('video_play_actions') or []):
-                try:
-                    group['video_views'] += int(float(video_action.get('value', 0) or 0))
-                except Exception:
-                    continue
-            
-            # Process video 2s+ actions
-            for video_action in (row.get('video_2_sec_watched_actions') or []):
-                try:
-                    group['video_2_sec_watched_actions'] += int(float(video_action.get('value', 0) or 0))
-                except Exception:
-                    continue
+        for date_key, sums in frame.group_sum('date'):
+            messaging = sums['messaging'] + sums['cv_messaging']
+            date_groups[date_key] = {
+                'date_start': date_key,
+                'impressions': sums['impressions'],
+                'clicks': sums['clicks'],
+                'spend': sums['spend'],
+                'reach': sums['reach'],
+                'inline_link_clicks': sums['inline_link_clicks'] + sums['link_click_actions'],
+                'post_engagement': sums['post_engagement'],
+                'photo_view': sums['photo_view'],
+                'video_views': sums['video_views'],
+                'video_2_sec_watched_actions': sums['video_2_sec_watched_actions'],
+                'messaging_starts': messaging,
+                'messaging_contacts': messaging,
+                'messaging_new_contacts': sums['messaging_new'] + sums['cv_messaging_new'],
+                'purchases': sums['purchases'],
+                'purchase_value': sums['purchase_value'],
+                'campaign_count': sums['rows'],
+                'budget_remaining': sums['budget_remaining'],
+                'daily_budget': sums['daily_budget'],
+                'lifetime_budget': sums['lifetime_budget']
+            }
         
         # Calculate derived metrics for each day
         daily_data = []
@@ -1317,14 +1335,131 @@ def api_daily_tracking():
             'successful_campaigns': successful_campaigns,
             'failed_campaigns': failed_campaigns,
             'total_campaigns': len(campaigns),
-            'processed_campaigns': min(len(campaigns), max_campaigns),
-            'note': f'Processed {min(len(campaigns), max_campaigns)} out of {len(campaigns)} campaigns to prevent timeout'
+            'processed_campaigns': len(sorted_campaigns)
         })
         
     except Exception as e:
         logger.error(f"Lỗi /api/daily-tracking: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Campaign attributes usable as rollup dimensions, resolved once per campaign
+ROLLUP_CAMPAIGN_DIMS = {
+    'brand': lambda c: c['brand'],
+    'content_format': lambda c: c['content_format'],
+    'account_id': lambda c: c.get('account_id') or 'Unknown',
+    'status': lambda c: c.get('status') or 'Unknown',
+    'campaign_name': lambda c: c.get('campaign_name') or 'Unknown',
+}
+
+@app.route('/api/rollup')
+def api_rollup():
+    """
+    Generic group-by over daily insight rows
+    Example: /api/rollup?dims=month,brand&metrics=spend,ctr,cpm&date_preset=last_90d
+    """
+    try:
+        dims = [d.strip() for d in (request.args.get('dims') or 'month').split(',') if d.strip()]
+        metrics = [m.strip() for m in (request.args.get('metrics') or 'spend,impressions,clicks,ctr').split(',') if m.strip()]
+        date_preset = request.args.get('date_preset', 'last_30d').strip()
+        since = (request.args.get('since') or '').strip()
+        until = (request.args.get('until') or '').strip()
+        filter_brand = (request.args.get('brand') or '').strip()
+        filter_campaign_id = (request.args.get('campaign_id') or '').strip()
+        
+        allowed_dims = set(ROW_DIMS) | set(ROLLUP_CAMPAIGN_DIMS)
+        unknown_dims = [d for d in dims if d not in allowed_dims]
+        unknown_metrics = [m for m in metrics if m not in SUM_METRICS and m not in DERIVED_METRICS]
+        if unknown_dims or unknown_metrics:
+            return jsonify({
+                'error': f'Unknown dims {unknown_dims} or metrics {unknown_metrics}',
+                'allowed_dims': sorted(allowed_dims),
+                'allowed_metrics': sorted(SUM_METRICS) + sorted(DERIVED_METRICS)
+            }), 400
+        
+        token = get_access_token()
+        if not token:
+            return jsonify({'error': 'Missing access token'}), 500
+        
+        campaigns = [c for c in filter_campaigns(filter_brand, filter_campaign_id) if c.get('campaign_id')]
+        params = {
+            'fields': 'impressions,clicks,spend,reach,actions,conversion_values,inline_link_clicks,video_play_actions',
+            'date_preset': date_preset,
+            'time_increment': 1
+        }
+        if since and until:
+            params['date_preset'] = 'custom'
+            params['since'] = since
+            params['until'] = until
+        rows_by_campaign = insights_store.load_campaign_insights(campaigns, token, params, date_preset, since, until)
+        
+        campaign_dims = {
+            c['campaign_id']: {d: ROLLUP_CAMPAIGN_DIMS[d](c) for d in dims if d in ROLLUP_CAMPAIGN_DIMS}
+            for c in campaigns
+        }
+        frame = InsightFrame.from_campaign_rows(rows_by_campaign, campaign_dims=campaign_dims)
+        rows = frame.rollup(dims, metrics)
+        totals = frame.rollup((), metrics)
+        
+        return jsonify({
+            'dims': dims,
+            'metrics': metrics,
+            'rows': rows,
+            'totals': totals[0] if totals else {m: 0 for m in metrics},
+            'row_count': frame.size,
+            'date_preset': date_preset,
+            'extraction_date': datetime.now().isoformat()
+        })
+    except Exception as e:
+        logger.error(f"Lỗi /api/rollup: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def _campaign_analysis_data(campaign_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Insights totals, recent daily rows and top placements of a campaign for the AI analysis (data, error)"""
+    from flask import current_app
+    try:
+        with current_app.test_request_context(f'/api/campaign-insights?campaign_id={campaign_id}&status=ACTIVE'):
+            insights_response_data = api_campaign_insights()
+            if isinstance(insights_response_data, tuple):
+                insights_data = insights_response_data[0].get_json()
+            else:
+                insights_data = insights_response_data.get_json()
+                
+            if insights_data.get('error'):
+                return None, 'Không thể lấy dữ liệu insights: ' + str(insights_data.get('error'))
+                
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy insights data: {e}")
+        return None, 'Không thể lấy dữ liệu insights'
+    
+    try:
+        with current_app.test_request_context(f'/api/campaign-breakdown?campaign_id={campaign_id}&kind=placement&date_preset=last_30d'):
+            breakdown_response_data = api_campaign_breakdown()
+            if isinstance(breakdown_response_data, tuple):
+                breakdown_data = breakdown_response_data[0].get_json()
+            else:
+                breakdown_data = breakdown_response_data.get_json()
+                
+            if breakdown_data.get('error'):
+                breakdown_data = {'rows': []}
+                
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy breakdown data: {e}")
+        breakdown_data = {'rows': []}
+    
+    return {
+        'campaign_id': campaign_id,
+        'summary_metrics': {
+            'total_impressions': insights_data.get('totals', {}).get('impressions', 0),
+            'total_clicks': insights_data.get('totals', {}).get('clicks', 0),
+            'total_spend': insights_data.get('totals', {}).get('spend', 0),
+            'total_reach': insights_data.get('totals', {}).get('reach', 0),
+            'avg_ctr': (insights_data.get('totals', {}).get('clicks', 0) / max(insights_data.get('totals', {}).get('impressions', 1), 1)) * 100,
+            'avg_cpc': insights_data.get('totals', {}).get('spend', 0) / max(insights_data.get('totals', {}).get('clicks', 1), 1)
+        },
+        'daily_trends': insights_data.get('daily', [])[-7:],
+        'placement_breakdown': breakdown_data.get('rows', [])[:10]
+    }, None
+
 @app.route('/api/campaign-ai-insights', methods=['POST'])
 def api_campaign_ai_insights():
     try:
@@ -1334,50 +1469,9 @@ def api_campaign_ai_insights():
         if not campaign_id:
             return jsonify({'error': 'campaign_id is required'}), 400
         
-        try:
-            from flask import current_app
-            with current_app.test_request_context(f'/api/campaign-insights?campaign_id={campaign_id}&status=ACTIVE'):
-                insights_response_data = api_campaign_insights()
-                if isinstance(insights_response_data, tuple):
-                    insights_data = insights_response_data[0].get_json()
-                else:
-                    insights_data = insights_response_data.get_json()
-                    
-                if insights_data.get('error'):
-                    return jsonify({'error': 'Không thể lấy dữ liệu insights: ' + str(insights_data.get('error'))}), 500
-                    
-        except Exception as e:
-            logger.error(f"Lỗi khi lấy insights data: {e}")
-            return jsonify({'error': 'Không thể lấy dữ liệu insights'}), 500
-        
-        try:
-            with current_app.test_request_context(f'/api/campaign-breakdown?campaign_id={campaign_id}&kind=placement&date_preset=last_30d'):
-                breakdown_response_data = api_campaign_breakdown()
-                if isinstance(breakdown_response_data, tuple):
-                    breakdown_data = breakdown_response_data[0].get_json()
-                else:
-                    breakdown_data = breakdown_response_data.get_json()
-                    
-                if breakdown_data.get('error'):
-                    breakdown_data = {'rows': []}
-                    
-        except Exception as e:
-            logger.error(f"Lỗi khi lấy breakdown data: {e}")
-            breakdown_data = {'rows': []}
-        
-        campaign_analysis_data = {
-            'campaign_id': campaign_id,
-            'summary_metrics': {
-                'total_impressions': insights_data.get('totals', {}).get('impressions', 0),
-                'total_clicks': insights_data.get('totals', {}).get('clicks', 0),
-                'total_spend': insights_data.get('totals', {}).get('spend', 0),
-                'total_reach': insights_data.get('totals', {}).get('reach', 0),
-                'avg_ctr': (insights_data.get('totals', {}).get('clicks', 0) / max(insights_data.get('totals', {}).get('impressions', 1), 1)) * 100,
-                'avg_cpc': insights_data.get('totals', {}).get('spend', 0) / max(insights_data.get('totals', {}).get('clicks', 1), 1)
-            },
-            'daily_trends': insights_data.get('daily', [])[-7:],
-            'placement_breakdown': breakdown_data.get('rows', [])[:10]
-        }
+        campaign_analysis_data, error = _campaign_analysis_data(campaign_id)
+        if error:
+            return jsonify({'error': error}), 500
         
         try:
             chatbot = OpenAIChatbot()
@@ -1403,7 +1497,39 @@ def api_campaign_ai_insights():
         logger.error(f"Lỗi /api/campaign-ai-insights: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/campaign-ai-insights/stream', methods=['POST'])
+def api_campaign_ai_insights_stream():
+    """Server-sent events version of /api/campaign-ai-insights.
+
+    Events: status while the campaign data loads, token with deltas of the model's JSON
+    answer, then done with the same payload as the JSON endpoint (or error).
+    """
+    data = request.get_json(silent=True) or {}
+    campaign_id = (data.get('campaign_id') or '').strip()
+    if not campaign_id:
+        return jsonify({'error': 'campaign_id is required'}), 400
+    
+    def events():
+        yield 'status', {'message': 'Đang tải dữ liệu campaign...'}
+        campaign_analysis_data, error = _campaign_analysis_data(campaign_id)
+        if error:
+            yield 'error', {'error': error}
+            return
+        for event, payload in OpenAIChatbot().stream_campaign_analysis(campaign_analysis_data):
+            if event == 'done':
+                logger.info(f"AI analysis stream completed for campaign {campaign_id}, cached: {payload.get('cached', False)}")
+                payload = {
+                    'success': True,
+                    **payload,
+                    'analysis_data': campaign_analysis_data,
+                    'timestamp': datetime.now().isoformat()
+                }
+            yield event, payload
+    
+    return _sse_response(events())
+
 @app.route('/api/meta-report-insights')
+@cached_response('last_30d', version=_ads_data_signature)
 def api_meta_report_insights():
     """
     Meta Report Insights API - Tracking performance monthly
@@ -1430,191 +1556,98 @@ def api_meta_report_insights():
             return jsonify({'error': 'No campaigns found', 'monthly_data': [], 'brand_analysis': {}, 'content_analysis': {}})
         
         # Apply brand and campaign filters if provided
-        def _extract_brand(name: str) -> str:
-            try:
-                return extract_brand_from_campaign_name(name or '')
-            except Exception:
-                return 'Unknown'
-        if filter_brand and filter_brand != 'all':
-            campaigns = [c for c in campaigns if _extract_brand(c.get('campaign_name', '')) == filter_brand]
-        if filter_campaign_id and filter_campaign_id != 'all':
-            campaigns = [c for c in campaigns if c.get('campaign_id') == filter_campaign_id]
-        
-        base_url = 'https://graph.facebook.com/v23.0'
-        
-        # Initialize analysis data structures
-        monthly_data = []
-        brand_analysis = {}
-        content_analysis = {}
+        campaigns = filter_campaigns(filter_brand, filter_campaign_id)
         
         # Process campaigns for monthly insights
         successful_campaigns = 0
         failed_campaigns = 0
-        max_campaigns = 15  # Limit to prevent timeout
         
-        logger.info(f"Processing {min(len(campaigns), max_campaigns)} campaigns for Meta Report Insights")
+        # Get insights data for all campaigns from the insights store and account-level insights
+        params = {
+            'fields': 'impressions,clicks,spend,ctr,cpc,cpm,reach,actions,inline_link_clicks,video_play_actions',
+            'date_preset': date_preset,
+            'time_increment': 1
+        }
+        # Custom date range support if provided
+        if since and until:
+            params['date_preset'] = 'custom'
+            params['since'] = since
+            params['until'] = until
         
-        for campaign in campaigns[:max_campaigns]:
-            campaign_id = campaign.get('campaign_id')
-            if not campaign_id:
-                continue
-                
-            try:
-                # Get insights data for the campaign
-                url = f"{base_url}/{campaign_id}/insights"
-                params = {
-                    'access_token': token,
-                    'fields': 'impressions,clicks,spend,ctr,cpc,cpm,reach,actions,inline_link_clicks,video_play_actions',
-                    'date_preset': date_preset,
-                    'time_increment': 1
-                }
-                # Custom date range support if provided
-                if since and until:
-                    params['date_preset'] = 'custom'
-                    params['since'] = since
-                    params['until'] = until
-                
-                response = requests.get(url, params=params, timeout=10)
-                logger.info(f"Campaign {campaign_id}: Status {response.status_code}")
-                if response.status_code != 200:
-                    logger.error(f"Campaign {campaign_id} error: {response.text}")
-                if response.status_code == 200:
-                    data = response.json()
-                    daily_rows = data.get('data', [])
-                    logger.info(f"Campaign {campaign_id}: Got {len(daily_rows)} daily rows")
-                    
-                    if daily_rows:
-                        # Process daily data for monthly aggregation
-                        for row in daily_rows:
-                            date_key = row.get('date_start') or row.get('date') or row.get('date_stop') or 'unknown'
-                            month_key = date_key[:7]  # YYYY-MM format
-                            
-                            # Find existing month data or create new
-                            month_data = next((m for m in monthly_data if m['month'] == month_key), None)
-                            if not month_data:
-                                month_data = {
-                                    'month': month_key,
-                                    'campaigns': set(),
-                                    'brands': set(),
-                                    'content_formats': set(),
-                                    'impressions': 0,
-                                    'clicks': 0,
-                                    'spend': 0.0,
-                                    'reach': 0,
-                                    'engagement': 0,
-                                    'video_views': 0,
-                                    'photo_views': 0,
-                                    'link_clicks': 0
-                                }
-                                monthly_data.append(month_data)
-                            if month_data:
-                                # Extract brand from campaign name (simplified)
-                                campaign_name = campaign.get('campaign_name', '')
-                                brand = extract_brand_from_campaign_name(campaign_name)
-                                content_format = extract_content_format_from_campaign_name(campaign_name)
-                                
-                                # Add to sets
-                                month_data['campaigns'].add(campaign_id)
-                                month_data['brands'].add(brand)
-                                month_data['content_formats'].add(content_format)
-                                
-                                # Aggregate metrics
-                                month_data['impressions'] += int(float(row.get('impressions', 0) or 0))
-                                month_data['clicks'] += int(float(row.get('clicks', 0) or 0))
-                                month_data['spend'] += float(row.get('spend', 0) or 0)
-                                month_data['reach'] += int(float(row.get('reach', 0) or 0))
-                                month_data['link_clicks'] += int(float(row.get('inline_link_clicks', 0) or 0))
-                                
-                                # Process actions for engagement metrics
-                                for action in (row.get('actions') or []):
-                                    action_type = (action.get('action_type') or '').lower()
-                                    try:
-                                        value = int(float(action.get('value', 0) or 0))
-                                    except Exception:
-                                        value = 0
-                                    
-                                    if action_type == 'post_engagement':
-                                        month_data['engagement'] += value
-                                    elif action_type == 'photo_view':
-                                        month_data['photo_views'] += value
-                                
-                                # Process video actions
-                                for video_action in (row.get('video_play_actions') or []):
-                                    try:
-                                        month_data['video_views'] += int(float(video_action.get('value', 0) or 0))
-                                    except Exception:
-                                        continue
-                                
-                                # Update brand analysis
-                                if brand not in brand_analysis:
-                                    brand_analysis[brand] = {
-                                        'campaigns': set(),
-                                        'total_impressions': 0,
-                                        'total_clicks': 0,
-                                        'total_spend': 0.0,
-                                        'total_engagement': 0,
-                                        'content_formats': set()
-                                    }
-                                
-                                brand_analysis[brand]['campaigns'].add(campaign_id)
-                                brand_analysis[brand]['total_impressions'] += int(float(row.get('impressions', 0) or 0))
-                                brand_analysis[brand]['total_clicks'] += int(float(row.get('clicks', 0) or 0))
-                                brand_analysis[brand]['total_spend'] += float(row.get('spend', 0) or 0)
-                                brand_analysis[brand]['content_formats'].add(content_format)
-                                
-                                # Process engagement for brand analysis
-                                for action in (row.get('actions') or []):
-                                    action_type = (action.get('action_type') or '').lower()
-                                    try:
-                                        value = int(float(action.get('value', 0) or 0))
-                                    except Exception:
-                                        value = 0
-                                    
-                                    if action_type == 'post_engagement':
-                                        brand_analysis[brand]['total_engagement'] += value
-                                
-                                # Update content format analysis
-                                if content_format not in content_analysis:
-                                    content_analysis[content_format] = {
-                                        'campaigns': set(),
-                                        'brands': set(),
-                                        'total_impressions': 0,
-                                        'total_clicks': 0,
-                                        'total_spend': 0.0,
-                                        'total_engagement': 0,
-                                        'performance_score': 0.0
-                                    }
-                                
-                                content_analysis[content_format]['campaigns'].add(campaign_id)
-                                content_analysis[content_format]['brands'].add(brand)
-                                content_analysis[content_format]['total_impressions'] += int(float(row.get('impressions', 0) or 0))
-                                content_analysis[content_format]['total_clicks'] += int(float(row.get('clicks', 0) or 0))
-                                content_analysis[content_format]['total_spend'] += float(row.get('spend', 0) or 0)
-                                
-                                # Process engagement for content analysis
-                                for action in (row.get('actions') or []):
-                                    action_type = (action.get('action_type') or '').lower()
-                                    try:
-                                        value = int(float(action.get('value', 0) or 0))
-                                    except Exception:
-                                        value = 0
-                                    
-                                    if action_type == 'post_engagement':
-                                        content_analysis[content_format]['total_engagement'] += value
-                        
-                        successful_campaigns += 1
-                    else:
-                        failed_campaigns += 1
-                else:
-                    failed_campaigns += 1
-                    logger.warning(f"Failed to get insights for campaign {campaign_id}: {response.status_code}")
-                    
-            except Exception as e:
+        campaigns_to_fetch = [c for c in campaigns if c.get('campaign_id')]
+        logger.info(f"Processing {len(campaigns_to_fetch)} campaigns for Meta Report Insights")
+        rows_by_campaign = insights_store.load_campaign_insights(campaigns_to_fetch, token, params, date_preset, since, until)
+        
+        campaign_dims = {}
+        for campaign in campaigns_to_fetch:
+            campaign_id = campaign['campaign_id']
+            daily_rows = rows_by_campaign.get(campaign_id) or []
+            logger.info(f"Campaign {campaign_id}: Got {len(daily_rows)} daily rows")
+            if not daily_rows:
                 failed_campaigns += 1
-                logger.warning(f"Error fetching insights for campaign {campaign_id}: {e}")
                 continue
+            campaign_dims[campaign_id] = {
+                'brand': campaign['brand'],
+                'content_format': campaign['content_format']
+            }
+            successful_campaigns += 1
+        
+        # Monthly, brand and content-format rollups from one columnar pass over the rows
+        frame = InsightFrame.from_campaign_rows(
+            {cid: rows_by_campaign[cid] for cid in campaign_dims}, campaign_dims=campaign_dims
+        )
+        rollups = frame.rollups('month', 'brand', 'content_format', metrics=(
+            'impressions', 'clicks', 'spend', 'reach', 'inline_link_clicks', 'post_engagement', 'photo_view', 'video_views'
+        ))
         
-        # Convert sets to counts and calculate derived metrics
+        monthly_data = []
+        month_campaigns = frame.distinct('month', 'campaign_id')
+        month_brands = frame.distinct('month', 'brand')
+        month_formats = frame.distinct('month', 'content_format')
+        for month_key, sums in rollups['month']:
+            monthly_data.append({
+                'month': month_key,
+                'campaigns': month_campaigns[month_key],
+                'brands': month_brands[month_key],
+                'content_formats': month_formats[month_key],
+                'impressions': sums['impressions'],
+                'clicks': sums['clicks'],
+                'spend': sums['spend'],
+                'reach': sums['reach'],
+                'engagement': sums['post_engagement'],
+                'video_views': sums['video_views'],
+                'photo_views': sums['photo_view'],
+                'link_clicks': sums['inline_link_clicks']
+            })
+        
+        brand_analysis = {}
+        brand_campaigns = frame.distinct('brand', 'campaign_id')
+        brand_formats = frame.distinct('brand', 'content_format')
+        for brand, sums in rollups['brand']:
+            brand_analysis[brand] = {
+                'campaigns': brand_campaigns[brand],
+                'total_impressions': sums['impressions'],
+                'total_clicks': sums['clicks'],
+                'total_spend': sums['spend'],
+                'total_engagement': sums['post_engagement'],
+                'content_formats': brand_formats[brand]
+            }
+        
+        content_analysis = {}
+        format_campaigns = frame.distinct('content_format', 'campaign_id')
+        format_brands = frame.distinct('content_format', 'brand')
+        for content_format, sums in rollups['content_format']:
+            content_analysis[content_format] = {
+                'campaigns': format_campaigns[content_format],
+                'brands': format_brands[content_format],
+                'total_impressions': sums['impressions'],
+                'total_clicks': sums['clicks'],
+                'total_spend': sums['spend'],
+                'total_engagement': sums['post_engagement'],
+                'performance_score': 0.0
+            }
+        
+        # Count distinct members and calculate derived metrics
         for month_data in monthly_data:
             month_data['campaign_count'] = len(month_data['campaigns'])
             month_data['brand_count'] = len(month_data['brands'])
@@ -1623,11 +1656,6 @@ def api_meta_report_insights():
             month_data['cpc'] = month_data['spend'] / max(month_data['clicks'], 1) if month_data['clicks'] > 0 else 0
             month_data['cpm'] = (month_data['spend'] / max(month_data['impressions'], 1)) * 1000 if month_data['impressions'] > 0 else 0
             month_data['engagement_rate'] = (month_data['engagement'] / max(month_data['impressions'], 1)) * 100 if month_data['impressions'] > 0 else 0
-            
-            # Convert sets to lists for JSON serialization
-            month_data['campaigns'] = list(month_data['campaigns'])
-            month_data['brands'] = list(month_data['brands'])
-            month_data['content_formats'] = list(month_data['content_formats'])
         
         # Process brand analysis
         for brand, data in brand_analysis.items():
@@ -1637,10 +1665,6 @@ def api_meta_report_insights():
             data['cpc'] = data['total_spend'] / max(data['total_clicks'], 1) if data['total_clicks'] > 0 else 0
             data['cpm'] = (data['total_spend'] / max(data['total_impressions'], 1)) * 1000 if data['total_impressions'] > 0 else 0
             data['engagement_rate'] = (data['total_engagement'] / max(data['total_impressions'], 1)) * 100 if data['total_impressions'] > 0 else 0
-            
-            # Convert sets to lists
-            data['campaigns'] = list(data['campaigns'])
-            data['content_formats'] = list(data['content_formats'])
         
         # Process content format analysis
         for content_format, data in content_analysis.items():
@@ -1653,10 +1677,6 @@ def api_meta_report_insights():
             
             # Calculate performance score (CTR + Engagement Rate - CPC/1000)
             data['performance_score'] = data['ctr'] + data['engagement_rate'] - (data['cpc'] / 1000)
-            
-            # Convert sets to lists
-            data['campaigns'] = list(data['campaigns'])
-            data['brands'] = list(data['brands'])
         
         # Sort monthly data by month
         monthly_data.sort(key=lambda x: x['month'])
@@ -1678,90 +1698,102 @@ def api_meta_report_insights():
             'successful_campaigns': successful_campaigns,
             'failed_campaigns': failed_campaigns,
             'total_campaigns': len(campaigns),
-            'processed_campaigns': min(len(campaigns), max_campaigns)
+            'processed_campaigns': len(campaigns_to_fetch)
         })
         
     except Exception as e:
         logger.error(f"Lỗi /api/meta-report-insights: {e}")
         return jsonify({'error': str(e)}), 500
 
+POST_BASE_FIELDS = 'id,message,created_time,permalink_url'
+POST_ENGAGEMENT_FIELDS = 'shares,comments.limit(0).summary(true),reactions.limit(0).summary(true)'
+
+def _post_engagement_counts(post: Dict[str, Any]) -> Dict[str, int]:
+    """Shares/comments/reactions counts from a post read with POST_ENGAGEMENT_FIELDS (raw fields are removed)"""
+    shares = post.pop('shares', None) or {}
+    comments = post.pop('comments', None) or {}
+    reactions = post.pop('reactions', None) or {}
+    return {
+        'shares_count': int(shares.get('count', 0) or 0),
+        'comments_count': int(comments.get('summary', {}).get('total_count', 0) or 0),
+        'reactions_count': int(reactions.get('summary', {}).get('total_count', 0) or 0)
+    }
+
+def _content_insights_posts(limit: int, since: str, until: str) -> Tuple[Optional[Dict[str, Any]], Optional[tuple]]:
+    """Fetch the configured page's posts with engagement counts for the content insights.
+
+    Returns (result, None) with page_id, posts, token and whether the counts came expanded on
+    the posts edge, or (None, (error payload, status)).
+    """
+    # Always use fixed PAGE ID from environment
+    page_id = (os.getenv('FB_PAGE_ID') or os.getenv('PAGE_ID') or '').strip()
+    if not page_id:
+        return None, ({'error': 'page_id is required', 'posts': []}, 400)
+
+    # Use tokens from .env as requested: prefer FACEBOOK_ACCESS_TOKEN, then USER_TOKEN
+    token = os.getenv('FACEBOOK_ACCESS_TOKEN') or os.getenv('USER_TOKEN') or get_access_token()
+    if not token:
+        return None, ({'error': 'Missing access token', 'posts': []}, 500)
+
+    url = f"{GRAPH_BASE_URL}/{page_id}/posts"
+    params = {
+        'access_token': token,
+        # Engagement counts are expanded on the posts edge itself (no per-post requests)
+        'fields': f"{POST_BASE_FIELDS},{POST_ENGAGEMENT_FIELDS}",
+        'limit': max(5, min(50, limit))
+    }
+    if since and until:
+        params['since'] = since
+        params['until'] = until
+
+    res = http_session.get(url, params=params, timeout=20)
+    expanded = res.status_code == 200
+    if not expanded:
+        logger.warning(f"Posts mở rộng lỗi {res.status_code}, lấy posts rồi bổ sung số liệu bằng ?ids=: {res.text[:200]}")
+        res = http_session.get(url, params=dict(params, fields=POST_BASE_FIELDS), timeout=20)
+    if res.status_code != 200:
+        try:
+            err = res.json()
+        except Exception:
+            err = {'message': res.text}
+        logger.warning(f"Fetch posts failed {res.status_code}: {err}")
+        return None, ({'error': err, 'posts': []}, 502)
+
+    posts = res.json().get('data', [])[:max(5, min(50, limit))]
+    if expanded:
+        for p in posts:
+            p.update(_post_engagement_counts(p))
+    return {'page_id': page_id, 'posts': posts, 'token': token, 'expanded': expanded}, None
+
+def _add_post_engagement_counts(posts: List[Dict[str, Any]], token: str) -> None:
+    nodes = get_objects([p['id'] for p in posts if p.get('id')], token, POST_ENGAGEMENT_FIELDS)
+    for p in posts:
+        p.update(_post_engagement_counts(nodes.get(p.get('id')) or {}))
+
 @app.route('/api/meta-report-content-insights')
 def api_meta_report_content_insights():
     """Lấy danh sách bài viết Facebook của 1 page và tạo AI insights cho Meta Report."""
     try:
-        # Always use fixed PAGE ID from environment
-        page_id = (os.getenv('FB_PAGE_ID') or os.getenv('PAGE_ID') or '').strip()
         limit = int(request.args.get('limit', '50'))
         since = request.args.get('since', '').strip()
         until = request.args.get('until', '').strip()
-        if not page_id:
-            return jsonify({'error': 'page_id is required', 'posts': []}), 400
-
-        # Use tokens from .env as requested: prefer FACEBOOK_ACCESS_TOKEN, then USER_TOKEN
-        token = os.getenv('FACEBOOK_ACCESS_TOKEN') or os.getenv('USER_TOKEN') or get_access_token()
-        if not token:
-            return jsonify({'error': 'Missing access token', 'posts': []}), 500
+        source, error = _content_insights_posts(limit, since, until)
+        if error:
+            return jsonify(error[0]), error[1]
 
-        base_url = 'https://graph.facebook.com/v23.0'
-        url = f"{base_url}/{page_id}/posts"
-        params = {
-            'access_token': token,
-            'fields': 'id,message,created_time,permalink_url',
-            'limit': max(5, min(50, limit))
-        }
-        if since and until:
-            params['since'] = since
-            params['until'] = until
-
-        res = requests.get(url, params=params, timeout=20)
-        if res.status_code != 200:
-            try:
-                err = res.json()
-            except Exception:
-                err = {'message': res.text}
-            logger.warning(f"Fetch posts failed {res.status_code}: {err}")
-            return jsonify({'error': err, 'posts': []}), 502
-
-        posts = res.json().get('data', [])
-
-        # Enrich posts with engagement metrics (shares, comments, reactions)
-        detail_fields = 'shares,comments.summary(true),reactions.summary(true)'
-        detailed_posts = []
-        for p in posts[:max(5, min(50, limit))]:
-            try:
-                pid = p.get('id')
-                if not pid:
-                    continue
-                dres = requests.get(
-                    f"{base_url}/{pid}",
-                    params={'access_token': token, 'fields': detail_fields},
-                    timeout=15
-                )
-                shares_count = 0
-                comments_count = 0
-                reactions_count = 0
-                if dres.status_code == 200:
-                    d = dres.json()
-                    shares_count = int(d.get('shares', {}).get('count', 0) or 0)
-                    comments_count = int((d.get('comments', {}) or {}).get('summary', {}).get('total_count', 0) or 0)
-                    reactions_count = int((d.get('reactions', {}) or {}).get('summary', {}).get('total_count', 0) or 0)
-                p['shares_count'] = shares_count
-                p['comments_count'] = comments_count
-                p['reactions_count'] = reactions_count
-                detailed_posts.append(p)
-            except Exception:
-                detailed_posts.append(p)
-        posts = detailed_posts
+        posts = source['posts']
         chatbot = OpenAIChatbot()
-        # Enrich AI prompt with time window context
-        if since and until:
-            for p in posts:
-                # no-op, we already filtered via API; just pass through
-                pass
-        ai = chatbot.analyze_posts_content(posts if isinstance(posts, list) else [])
+        if source['expanded']:
+            ai = chatbot.analyze_posts_content(posts)
+        else:
+            # The AI prompt only needs message text, so it runs while the counts are fetched
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                ai_future = pool.submit(chatbot.analyze_posts_content, [dict(p) for p in posts])
+                _add_post_engagement_counts(posts, source['token'])
+                ai = ai_future.result()
 
         return jsonify({
-            'page_id': page_id,
+            'page_id': source['page_id'],
             'count': len(posts),
             'since': since or None,
             'until': until or None,
@@ -1773,48 +1805,48 @@ def api_meta_report_content_insights():
         logger.error(f"Lỗi /api/meta-report-content-insights: {e}")
         return jsonify({'error': str(e), 'posts': []}), 500
 
+@app.route('/api/meta-report-content-insights/stream')
+def api_meta_report_content_insights_stream():
+    """Server-sent events version of /api/meta-report-content-insights.
+
+    Events: posts with the page's posts (same fields as the JSON endpoint, without ai),
+    token with deltas of the AI insights, then done with the ai payload (or error).
+    """
+    limit = int(request.args.get('limit', '50'))
+    since = request.args.get('since', '').strip()
+    until = request.args.get('until', '').strip()
+
+    def events():
+        yield 'status', {'message': 'Đang lấy bài viết...'}
+        source, error = _content_insights_posts(limit, since, until)
+        if error:
+            yield 'error', error[0]
+            return
+        posts = source['posts']
+        if not source['expanded']:
+            _add_post_engagement_counts(posts, source['token'])
+        yield 'posts', {
+            'page_id': source['page_id'],
+            'count': len(posts),
+            'since': since or None,
+            'until': until or None,
+            'posts': posts,
+            'extraction_date': datetime.now().isoformat()
+        }
+        yield from OpenAIChatbot().stream_posts_content(posts)
+
+    return _sse_response(events())
+
 def extract_brand_from_campaign_name(campaign_name):
-    """Extract brand name from campaign name"""
-    if not campaign_name:
-        return 'Unknown'
-    
-    # Simple brand extraction logic - can be enhanced
-    name_lower = campaign_name.lower()
-    
-    # Constrain to 3 brands only
-    if 'ls2' in name_lower:
-        return 'LS2'
-    elif 'bulldog' in name_lower:
-        return 'Bulldog'
-    elif 'ego' in name_lower:
-        return 'EGO'
-    else:
-        return 'Unknown'
+    """Extract brand name from campaign name (see campaign_classifier.BRAND_RULES)"""
+    return classify_brand(campaign_name)
 
 def extract_content_format_from_campaign_name(campaign_name):
-    """Extract content format from campaign name"""
-    if not campaign_name:
-        return 'Unknown'
-    
-    name_lower = campaign_name.lower()
-    
-    # Content format patterns
-    if 'video' in name_lower or 'reel' in name_lower:
-        return 'Video'
-    elif 'image' in name_lower or 'photo' in name_lower or 'picture' in name_lower:
-        return 'Image'
-    elif 'carousel' in name_lower:
-        return 'Carousel'
-    elif 'story' in name_lower:
-        return 'Story'
-    elif 'post' in name_lower:
-        return 'Post'
-    elif 'ad' in name_lower:
-        return 'Ad'
-    else:
-        return 'Mixed'
+    """Extract content format from campaign name (see campaign_classifier.CONTENT_FORMAT_RULES)"""
+    return classify_content_format(campaign_name)
 
 @app.route('/api/agency-report')
+@cached_response('last_90d', version=_ads_data_signature)
 def api_agency_report():
     """Agency monthly performance report for page/agent funnel with MoM change."""
     try:
@@ -1835,8 +1867,6 @@ def api_agency_report():
         if not campaigns:
             return jsonify({'error': 'No campaigns found', 'months': {}, 'funnel': {}, 'groups': {}})
 
-        base_url = 'https://graph.facebook.com/v23.0'
-
         # Aggregate by YYYY-MM across campaigns
         months = {}
 
@@ -1853,45 +1883,32 @@ def api_agency_report():
                 'purchase_value': 0.0,
             })
 
-        # Limit to avoid timeout
-        max_campaigns = 15
-        for campaign in campaigns[:max_campaigns]:
-            cid = campaign.get('campaign_id')
-            if not cid:
-                continue
+        params = {
+            'fields': 'impressions,clicks,spend,ctr,cpc,cpm,reach,actions,conversion_values,inline_link_clicks,video_play_actions,video_3_sec_watched_actions,video_10_sec_watched_actions',
+            'time_increment': 1
+        }
+        
+        # Set date range based on parameters
+        if since_date and until_date:
+            params['time_range'] = f"{{\"since\":\"{since_date}\",\"until\":\"{until_date}\"}}"
+        else:
+            params['date_preset'] = date_preset
+        
+        # Fallbacks on failure/empty: try different date presets. Only idle campaigns get them (as in
+        # daily-tracking), and lifetime is requested by month: a lifetime daily series is large and
+        # the report is monthly anyway
+        campaign_ids = [c['campaign_id'] for c in campaigns if c.get('campaign_id')]
+        fallback_presets = {
+            c['campaign_id']: ['last_180d', 'last_30d', {'date_preset': 'lifetime', 'time_increment': 'monthly'}]
+            for c in campaigns if c.get('campaign_id') and c.get('status') != 'ACTIVE'
+        }
+        rows_by_campaign = insights_store.load_campaign_insights(
+            campaigns, token, params, date_preset, since_date, until_date, fallback_presets
+        )
+        
+        for cid in campaign_ids:
             try:
-                url = f"{base_url}/{cid}/insights"
-                params = {
-                    'access_token': token,
-                    'fields': 'impressions,clicks,spend,ctr,cpc,cpm,reach,actions,conversion_values,inline_link_clicks,video_play_actions,video_3_sec_watched_actions,video_10_sec_watched_actions',
-                    'time_increment': 1
-                }
-                
-                # Set date range based on parameters
-                if since_date and until_date:
-                    params['time_range'] = f"{{\"since\":\"{since_date}\",\"until\":\"{until_date}\"}}"
-                else:
-                    params['date_preset'] = date_preset
-                res = requests.get(url, params=params, timeout=25)
-                # Fallbacks on failure/empty
-                if res.status_code != 200 or not (res.json().get('data') if res.headers.get('content-type','').startswith('application/json') else []):
-                    # Try different date presets as fallback
-                    fallback_presets = ['last_180d', 'last_30d', 'lifetime']
-                    for fb in fallback_presets:
-                        p2 = params.copy()
-                        if 'time_range' in p2:
-                            del p2['time_range']
-                        p2['date_preset'] = fb
-                        try:
-                            r2 = requests.get(url, params=p2, timeout=25)
-                            if r2.status_code == 200 and (r2.json().get('data') or []):
-                                res = r2
-                                break
-                        except Exception:
-                            continue
-                    if res.status_code != 200:
-                        continue
-                for row in res.json().get('data', []):
+                for row in rows_by_campaign.get(cid, []):
                     date_key = row.get('date_start') or row.get('date') or row.get('date_stop') or ''
                     if not date_key:
                         continue
@@ -1903,34 +1920,15 @@ def api_agency_report():
                     g['spend'] += float(row.get('spend', 0) or 0)
                     g['link_clicks'] += int(float(row.get('inline_link_clicks', 0) or 0))
 
-                    for a in (row.get('actions') or []):
-                        at = (a.get('action_type') or '').lower()
-                        try:
-                            val = int(float(a.get('value', 0) or 0))
-                        except Exception:
-                            val = 0
-                        if at == 'post_engagement':
-                            g['engagement'] += val
-                        elif at in ['link_click', 'landing_page_view']:
-                            g['link_clicks'] += val
-                        elif (at.startswith('onsite_conversion.messaging') or
-                              at in ['messaging_conversation_started', 'onsite_conversion.messaging_conversation_started', 'new_messaging_connection'] or
-                              ('messaging' in at and ('conversation' in at or 'first_reply' in at))):
-                            g['messaging_starts'] += val
-                        elif at == 'purchase' or 'purchase' in at:
-                            g['purchases'] += val
-
-                    for cv in (row.get('conversion_values') or []):
-                        cvt = (cv.get('action_type') or '').lower()
-                        try:
-                            v = float(cv.get('value', 0) or 0)
-                        except Exception:
-                            v = 0.0
-                        if cvt == 'purchase' or 'purchase' in cvt:
-                            g['purchase_value'] += v
-                        elif (cvt.startswith('onsite_conversion.messaging') or
-                              cvt in ['messaging_conversation_started', 'onsite_conversion.messaging_conversation_started']):
-                            g['messaging_starts'] += int(v)
+                    counts = sum_actions(row.get('actions'))
+                    g['engagement'] += counts[POST_ENGAGEMENT]
+                    g['link_clicks'] += counts[LINK_CLICK]
+                    g['messaging_starts'] += counts[MESSAGING]
+                    g['purchases'] += counts[PURCHASE]
+
+                    cv_values = sum_actions(row.get('conversion_values'), as_float=True)
+                    g['purchase_value'] += cv_values[PURCHASE]
+                    g['messaging_starts'] += int(cv_values[MESSAGING])
 
             except Exception:
                 continue
@@ -2072,7 +2070,7 @@ def api_filter_options():
         
         for campaign in campaigns:
             # Extract brand
-            brand = extract_brand_from_campaign_name(campaign.get('campaign_name', ''))
+            brand = campaign['brand']
             if brand and brand != 'Unknown':
                 brand_set.add(brand)
             
@@ -2131,22 +2129,8 @@ def api_filtered_data():
         
         campaigns = ads_data.get('campaigns', [])
         
-        # Apply filters
-        filtered_campaigns = campaigns.copy()
-        
-        # Filter by brand
-        if brand and brand != 'all':
-            filtered_campaigns = [
-                c for c in filtered_campaigns 
-                if extract_brand_from_campaign_name(c.get('campaign_name', '')) == brand
-            ]
-        
-        # Filter by specific campaign
-        if campaign_id and campaign_id != 'all':
-            filtered_campaigns = [
-                c for c in filtered_campaigns 
-                if c.get('campaign_id') == campaign_id
-            ]
+        # Apply brand and campaign filters
+        filtered_campaigns = filter_campaigns(brand, campaign_id)
         
         # Prepare date parameters for API calls
         date_params = {'date_preset': date_preset}
@@ -2162,40 +2146,23 @@ def api_filtered_data():
         if not token:
             return jsonify({'error': 'Missing access token'}), 500
         
-        base_url = 'https://graph.facebook.com/v23.0'
         insights_data = []
         
-        # Limit to avoid timeout
-        max_campaigns = min(len(filtered_campaigns), 10)
+        params = {
+            'fields': 'campaign_name,impressions,clicks,spend,ctr,cpc,cpm,reach,frequency,actions,conversion_values,inline_link_clicks',
+            'time_increment': 1,
+            **date_params
+        }
+        campaigns_to_fetch = [c for c in filtered_campaigns if c.get('campaign_id')]
+        rows_by_campaign = insights_store.load_campaign_insights(campaigns_to_fetch, token, params, date_preset, since, until)
         
-        for campaign in filtered_campaigns[:max_campaigns]:
-            campaign_id = campaign.get('campaign_id')
-            if not campaign_id:
-                continue
-                
-            try:
-                url = f"{base_url}/{campaign_id}/insights"
-                params = {
-                    'access_token': token,
-                    'fields': 'campaign_name,impressions,clicks,spend,ctr,cpc,cpm,reach,frequency,actions,conversion_values,inline_link_clicks',
-                    'time_increment': 1,
-                    **date_params
-                }
-                
-                response = requests.get(url, params=params, timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    daily_rows = data.get('data', [])
-                    
-                    for row in daily_rows:
-                        row['campaign_id'] = campaign_id
-                        row['campaign_name'] = campaign.get('campaign_name', '')
-                        row['brand'] = extract_brand_from_campaign_name(campaign.get('campaign_name', ''))
-                        insights_data.append(row)
-                        
-            except Exception as e:
-                logger.warning(f"Error fetching insights for campaign {campaign_id}: {e}")
-                continue
+        for campaign in campaigns_to_fetch:
+            campaign_id = campaign['campaign_id']
+            for row in rows_by_campaign.get(campaign_id, []):
+                row['campaign_id'] = campaign_id
+                row['campaign_name'] = campaign.get('campaign_name', '')
+                row['brand'] = campaign['brand']
+                insights_data.append(row)
         
         # Aggregate data
         totals = {
@@ -2237,6 +2204,81 @@ def api_filtered_data():
         logger.error(f"Lỗi /api/filtered-data: {e}")
         return jsonify({'error': str(e)}), 500
 
+PAGE_INSIGHT_METRICS = ('page_impressions', 'page_post_engagements', 'page_video_views')
+POST_INSIGHT_METRICS = 'post_impressions,post_clicks,post_reactions_by_type_total'
+POST_SUMMARY_FIELDS = 'likes.limit(0).summary(true),comments.limit(0).summary(true)'
+# Upper bound on feed posts read per request (the feed is paged 25 posts at a time)
+PAGE_FEED_MAX_POSTS = int(os.getenv('PAGE_FEED_MAX_POSTS', '100'))
+
+def _fetch_page_overview(page_id: str, token: str, since: str, until: str):
+    """Page info and its daily insights in one request (nested insights expansion).
+
+    Falls back to a plain page request plus one batch of per-metric insights requests.
+    Returns (page_data, insights, error); page_data is None when the page cannot be read.
+    """
+    page_fields = 'name,fan_count,new_like_count'
+    insights_field = f"insights.metric({','.join(PAGE_INSIGHT_METRICS)}).period(day).since({since}).until({until})"
+    response = http_session.get(f"{GRAPH_BASE_URL}/{page_id}",
+                                params={'access_token': token, 'fields': f"{page_fields},{insights_field}"}, timeout=30)
+    if response.status_code == 200:
+        page_data = response.json()
+        return page_data, (page_data.get('insights') or {}).get('data', []), ''
+    logger.warning(f"Không lấy được page insights dạng mở rộng, chuyển sang batch: {response.text[:200]}")
+
+    response = http_session.get(f"{GRAPH_BASE_URL}/{page_id}", params={'access_token': token, 'fields': page_fields}, timeout=30)
+    if response.status_code != 200:
+        return None, [], response.text
+    insights = []
+    sub_requests = [(f"{page_id}/insights", {'metric': metric, 'period': 'day', 'since': since, 'until': until})
+                    for metric in PAGE_INSIGHT_METRICS]
+    for metric, (status_code, body) in zip(PAGE_INSIGHT_METRICS, batch_get(sub_requests, token)):
+        if status_code == 200:
+            insights.extend(body.get('data', []))
+        else:
+            logger.warning(f"Không thể lấy metric {metric}: {body.get('error')}")
+    return response.json(), insights, ''
+
+def _fetch_page_posts(page_id: str, token: str, since: str, until: str) -> List[Dict[str, Any]]:
+    """Feed posts of the date range with insights, likes/comments summaries and attachments expanded.
+
+    The feed is paged; if the expanded feed fails, posts are read plainly and their
+    insights/summaries are fetched per post in batch requests.
+    """
+    try:
+        # Graph's feed `until` is exclusive
+        feed_until = (datetime.fromisoformat(until) + timedelta(days=1)).strftime('%Y-%m-%d')
+    except ValueError:
+        feed_until = until
+    feed_params = {'since': since, 'until': feed_until, 'limit': 25}
+    try:
+        return list(iter_edge(f"{page_id}/feed", token, dict(
+            feed_params, fields=f"id,message,created_time,attachments,{POST_SUMMARY_FIELDS},insights.metric({POST_INSIGHT_METRICS})"
+        ), max_items=PAGE_FEED_MAX_POSTS))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning(f"Feed mở rộng lỗi ({e}), lấy insights từng post theo batch")
+
+    try:
+        posts = list(iter_edge(f"{page_id}/feed", token, dict(feed_params, fields='id,message,created_time,attachments'),
+                               max_items=PAGE_FEED_MAX_POSTS))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning(f"Không thể lấy posts: {e}")
+        return []
+    sub_requests = []
+    for post in posts:
+        sub_requests.append((f"{post['id']}/insights", {'metric': POST_INSIGHT_METRICS}))
+        sub_requests.append((post['id'], {'fields': POST_SUMMARY_FIELDS}))
+    results = batch_get(sub_requests, token)
+    for i, post in enumerate(posts):
+        (insights_status, insights_body), (details_status, details_body) = results[2 * i], results[2 * i + 1]
+        if insights_status == 200:
+            post['insights'] = insights_body
+        else:
+            logger.warning(f"Không thể lấy insights cho post {post['id']}: {insights_body.get('error')}")
+        if details_status == 200:
+            post['likes'] = details_body.get('likes', {})
+            post['comments'] = details_body.get('comments', {})
+    return posts
+
 @app.route('/api/page-insights', methods=['GET'])
 def get_page_insights():
     """Lấy dữ liệu page insights từ Facebook Graph API với bộ lọc thời gian."""
@@ -2259,70 +2301,20 @@ def get_page_insights():
             since = start_date.strftime('%Y-%m-%d')
             until = end_date.strftime('%Y-%m-%d')
         
-        base_url = "https://graph.facebook.com/v23.0"
-        
-        # Lấy page info
-        page_url = f"{base_url}/{page_id}"
-        page_params = {
-            'access_token': access_token,
-            'fields': 'name,fan_count,new_like_count'
-        }
-        page_response = requests.get(page_url, params=page_params)
-        
-        if page_response.status_code != 200:
-            return jsonify({'error': f'Không thể lấy thông tin page: {page_response.text}'}), 400
-        
-        page_data = page_response.json()
-        
-        # Lấy page insights với metrics cơ bản và hợp lệ
-        insights_data = {'data': []}
-        
-        # Thử các metrics cơ bản trước
-        basic_metrics = ['page_impressions', 'page_post_engagements', 'page_video_views']
-        
-        for metric in basic_metrics:
-            try:
-                insights_url = f"{base_url}/{page_id}/insights"
-                insights_params = {
-                    'access_token': access_token,
-                    'metric': metric,
-                    'period': 'day',
-                    'since': since,
-                    'until': until
-                }
-                insights_response = requests.get(insights_url, params=insights_params)
-                
-                if insights_response.status_code == 200:
-                    metric_data = insights_response.json()
-                    if 'data' in metric_data and metric_data['data']:
-                        insights_data['data'].extend(metric_data['data'])
-                else:
-                    logger.warning(f"Không thể lấy metric {metric}: {insights_response.text}")
-            except Exception as e:
-                logger.warning(f"Lỗi khi lấy metric {metric}: {str(e)}")
-        
+        # Page info + page insights và feed (đã mở rộng insights/likes/comments) trong 2 request
+        page_data, page_insights, page_error = _fetch_page_overview(page_id, access_token, since, until)
+        if page_data is None:
+            return jsonify({'error': f'Không thể lấy thông tin page: {page_error}'}), 400
+        insights_data = {'data': page_insights}
         logger.info(f"Đã lấy được {len(insights_data['data'])} metrics")
         
-        # Lấy page posts với Page Access Token - sử dụng endpoint feed
-        posts_url = f"{base_url}/{page_id}/feed"
-        posts_params = {
-            'access_token': access_token,
-            'limit': 20  # Giảm số lượng posts để tránh timeout
-        }
-        posts_response = requests.get(posts_url, params=posts_params)
-        
-        # Xử lý lỗi posts một cách graceful
-        posts_data = {'data': []}
-        if posts_response.status_code == 200:
-            posts_data = posts_response.json()
-            logger.info(f"Đã lấy được {len(posts_data.get('data', []))} posts")
-        else:
-            logger.warning(f"Không thể lấy posts: {posts_response.text}")
-            # Không tạo dữ liệu mẫu, để posts_data rỗng
+        posts_data = {'data': _fetch_page_posts(page_id, access_token, since, until)}
+        logger.info(f"Đã lấy được {len(posts_data['data'])} posts")
         
         # Xử lý dữ liệu insights
         processed_insights = {}
-        daily_data = []
+        # Entry theo ngày, tra cứu theo khóa ngày (giữ thứ tự xuất hiện)
+        daily_entries = {}
         
         for insight in insights_data.get('data', []):
             metric_name = insight.get('name')
@@ -2333,15 +2325,10 @@ def get_page_insights():
             # Tạo dữ liệu theo ngày
             for value in values:
                 date_str = value.get('end_time', '').split('T')[0]
-                metric_value = value.get('value', 0)
-                
-                # Tìm hoặc tạo entry cho ngày này
-                day_entry = next((d for d in daily_data if d['date'] == date_str), None)
-                if not day_entry:
-                    day_entry = {'date': date_str}
-                    daily_data.append(day_entry)
-                
-                day_entry[metric_name] = metric_value
+                day_entry = daily_entries.setdefault(date_str, {'date': date_str})
+                day_entry[metric_name] = value.get('value', 0)
+        
+        daily_data = list(daily_entries.values())
         
         # Xử lý posts data
         processed_posts = []
@@ -2401,80 +2388,47 @@ def get_page_insights():
                 'thumbnail_url': None
             }
             
-            try:
-                # Lấy insights cho post này
-                post_insights_url = f"{base_url}/{post_id}/insights"
-                post_insights_params = {
-                    'access_token': access_token,
-                    'metric': 'post_impressions,post_clicks,post_reactions_by_type_total'
-                }
-                post_insights_response = requests.get(post_insights_url, params=post_insights_params)
+            # Insights của post (đã mở rộng sẵn trong feed)
+            for insight in (post.get('insights') or {}).get('data', []):
+                metric_name = insight.get('name')
+                metric_value = insight.get('values', [{}])[0].get('value', 0)
                 
-                if post_insights_response.status_code == 200:
-                    insights_data = post_insights_response.json()
-                    for insight in insights_data.get('data', []):
-                        metric_name = insight.get('name')
-                        metric_value = insight.get('values', [{}])[0].get('value', 0)
-                        
-                        if metric_name == 'post_reactions_by_type_total':
-                            # Tính tổng reactions
-                            if isinstance(metric_value, dict):
-                                total_reactions = sum(metric_value.values())
-                                post_metrics['post_reactions_by_type_total'] = total_reactions
-                                # Sử dụng reactions làm engagement
-                                post_metrics['post_engaged_users'] = total_reactions
-                            else:
-                                post_metrics[metric_name] = metric_value
-                        else:
-                            post_metrics[metric_name] = metric_value
+                if metric_name == 'post_reactions_by_type_total':
+                    # Tính tổng reactions
+                    if isinstance(metric_value, dict):
+                        total_reactions = sum(metric_value.values())
+                        post_metrics['post_reactions_by_type_total'] = total_reactions
+                        # Sử dụng reactions làm engagement
+                        post_metrics['post_engaged_users'] = total_reactions
+                    else:
+                        post_metrics[metric_name] = metric_value
                 else:
-                    logger.warning(f"Không thể lấy insights cho post {post_id}: {post_insights_response.text}")
-            except Exception as e:
-                logger.warning(f"Lỗi khi lấy insights cho post {post_id}: {str(e)}")
+                    post_metrics[metric_name] = metric_value
             
-            # Lấy thông tin chi tiết của post
-            try:
-                post_details_url = f"{base_url}/{post_id}"
-                post_details_params = {
-                    'access_token': access_token,
-                    'fields': 'likes.summary(true),comments,attachments'
+            # Likes/comments lấy từ summary, attachments từ feed
+            post_details['likes_count'] = (post.get('likes') or {}).get('summary', {}).get('total_count', 0)
+            comments = post.get('comments') or {}
+            post_details['comments_count'] = comments.get('summary', {}).get('total_count', len(comments.get('data', [])))
+            
+            for attachment in (post.get('attachments') or {}).get('data', []):
+                attachment_info = {
+                    'type': attachment.get('type', 'unknown'),
+                    'media_url': None
                 }
-                post_details_response = requests.get(post_details_url, params=post_details_params)
                 
-                if post_details_response.status_code == 200:
-                    details_data = post_details_response.json()
-                    
-                    # Lấy likes count
-                    post_details['likes_count'] = details_data.get('likes', {}).get('summary', {}).get('total_count', 0)
-                    
-                    # Lấy comments count
-                    comments = details_data.get('comments', {}).get('data', [])
-                    post_details['comments_count'] = len(comments)
-                    
-                    # Lấy attachments
-                    attachments = details_data.get('attachments', {}).get('data', [])
-                    for attachment in attachments:
-                        attachment_info = {
-                            'type': attachment.get('type', 'unknown'),
-                            'media_url': None
-                        }
-                        
-                        if 'media' in attachment:
-                            media = attachment['media']
-                            if 'image' in media:
-                                attachment_info['media_url'] = media['image'].get('src')
-                                if not post_details['thumbnail_url']:
-                                    post_details['thumbnail_url'] = media['image'].get('src')
-                            elif 'video' in media:
-                                attachment_info['media_url'] = media['video'].get('src')
-                                # Lấy thumbnail từ video
-                                if not post_details['thumbnail_url'] and 'picture' in media['video']:
-                                    post_details['thumbnail_url'] = media['video'].get('picture')
-                        
-                        post_details['attachments'].append(attachment_info)
-                        
-            except Exception as e:
-                logger.warning(f"Lỗi khi lấy chi tiết post {post_id}: {str(e)}")
+                if 'media' in attachment:
+                    media = attachment['media']
+                    if 'image' in media:
+                        attachment_info['media_url'] = media['image'].get('src')
+                        if not post_details['thumbnail_url']:
+                            post_details['thumbnail_url'] = media['image'].get('src')
+                    elif 'video' in media:
+                        attachment_info['media_url'] = media['video'].get('src')
+                        # Lấy thumbnail từ video
+                        if not post_details['thumbnail_url'] and 'picture' in media['video']:
+                            post_details['thumbnail_url'] = media['video'].get('picture')
+                
+                post_details['attachments'].append(attachment_info)
             
             # Tạo processed post với insights thực tế và thông tin chi tiết
             processed_post = {
@@ -2593,7 +2547,7 @@ def get_page_posts_insights():
             'until': until,
             'limit': limit
         }
-        posts_response = requests.get(posts_url, params=posts_params)
+        posts_response = http_session.get(posts_url, params=posts_params)
         
         # Xử lý lỗi posts một cách graceful
         posts_data = {'data': []}
@@ -2728,7 +2682,7 @@ def get_post_details(post_id):
             'fields': 'id,message,created_time,attachments,comments,likes.summary(true)'
         }
         
-        response = requests.get(post_url, params=post_params)
+        response = http_session.get(post_url, params=post_params)
         
         if response.status_code != 200:
             return jsonify({'error': f'Không thể lấy thông tin post: {response.text}'}), 400
@@ -2759,7 +2713,7 @@ def test_post_insights():
             'access_token': access_token,
             'limit': 1
         }
-        posts_response = requests.get(posts_url, params=posts_params)
+        posts_response = http_session.get(posts_url, params=posts_params)
         
         if posts_response.status_code != 200:
             return jsonify({'error': f'Không thể lấy posts: {posts_response.text}'}), 400
@@ -2779,7 +2733,7 @@ def test_post_insights():
             'access_token': access_token,
             'metric': 'post_impressions,post_engaged_users,post_clicks,post_reactions_by_type_total'
         }
-        insights_response = requests.get(insights_url, params=insights_params)
+        insights_response = http_session.get(insights_url, params=insights_params)
         
         if insights_response.status_code != 200:
             return jsonify({'error': f'Không thể lấy insights: {insights_response.text}'}), 400
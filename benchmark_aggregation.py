@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark tổng hợp insights theo tháng/ngày với dữ liệu giả lập.
+So sánh cách cũ (tìm bucket bằng next(...) trên list) với InsightFrame (bucket theo dict/mã)
+cho 2+ năm dữ liệu ngày của 100+ chiến dịch, ở nhiều kích thước để thấy tăng tuyến tính.
+
+Chạy: python benchmark_aggregation.py [--campaigns 120] [--days 800]
+"""
+
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from insight_frame import InsightFrame
+
+
+def make_rows(campaigns: int, days: int, seed: int = 42):
+    random.seed(seed)
+    start = date(2023, 1, 1)
+    rows_by_campaign = {}
+    for c in range(campaigns):
+        rows = []
+        for d in range(days):
+            day = (start + timedelta(days=d)).isoformat()
+            rows.append({
+                'date_start': day,
+                'date_stop': day,
+                'impressions': str(random.randint(100, 10000)),
+                'clicks': str(random.randint(1, 300)),
+                'spend': f"{random.uniform(1, 500):.2f}",
+                'reach': str(random.randint(80, 8000)),
+                'inline_link_clicks': str(random.randint(0, 200)),
+                'actions': [
+                    {'action_type': 'post_engagement', 'value': str(random.randint(0, 500))},
+                    {'action_type': 'photo_view', 'value': str(random.randint(0, 50))},
+                    {'action_type': 'onsite_conversion.messaging_conversation_started_7d', 'value': str(random.randint(0, 20))},
+                ],
+                'video_play_actions': [{'action_type': 'video_view', 'value': str(random.randint(0, 100))}],
+            })
+        rows_by_campaign[str(c)] = rows
+    return rows_by_campaign
+
+
+def monthly_with_list_scan(rows_by_campaign):
+    """Cách cũ của meta-report: tìm tháng bằng next(...) trên list, actions được duyệt 3 lần mỗi dòng"""
+    monthly_data = []
+    brand_analysis = {}
+    content_analysis = {}
+    for campaign_id, rows in rows_by_campaign.items():
+        brand = ('LS2', 'Bulldog', 'EGO')[int(campaign_id) % 3]
+        for row in rows:
+            month_key = row['date_start'][:7]
+            month_data = next((m for m in monthly_data if m['month'] == month_key), None)
+            if not month_data:
+                month_data = {'month': month_key, 'campaigns': set(), 'impressions': 0, 'clicks': 0,
+                              'spend': 0.0, 'engagement': 0, 'photo_views': 0, 'video_views': 0}
+                monthly_data.append(month_data)
+            month_data['campaigns'].add(campaign_id)
+            month_data['impressions'] += int(float(row.get('impressions', 0) or 0))
+            month_data['clicks'] += int(float(row.get('clicks', 0) or 0))
+            month_data['spend'] += float(row.get('spend', 0) or 0)
+            for action in (row.get('actions') or []):
+                action_type = (action.get('action_type') or '').lower()
+                value = int(float(action.get('value', 0) or 0))
+                if action_type == 'post_engagement':
+                    month_data['engagement'] += value
+                elif action_type == 'photo_view':
+                    month_data['photo_views'] += value
+            for video_action in (row.get('video_play_actions') or []):
+                month_data['video_views'] += int(float(video_action.get('value', 0) or 0))
+            for analysis in (brand_analysis.setdefault(brand, {'impressions': 0, 'clicks': 0, 'spend': 0.0, 'engagement': 0}),
+                             content_analysis.setdefault('Video', {'impressions': 0, 'clicks': 0, 'spend': 0.0, 'engagement': 0})):
+                analysis['impressions'] += int(float(row.get('impressions', 0) or 0))
+                analysis['clicks'] += int(float(row.get('clicks', 0) or 0))
+                analysis['spend'] += float(row.get('spend', 0) or 0)
+                for action in (row.get('actions') or []):
+                    if (action.get('action_type') or '').lower() == 'post_engagement':
+                        analysis['engagement'] += int(float(action.get('value', 0) or 0))
+    return monthly_data
+
+
+def daily_with_list_scan(rows_by_campaign):
+    """Cách cũ của page insights: mỗi giá trị tìm ngày bằng next(...) trên list"""
+    daily_data = []
+    for rows in rows_by_campaign.values():
+        for row in rows:
+            day_entry = next((d for d in daily_data if d['date'] == row['date_start']), None)
+            if not day_entry:
+                day_entry = {'date': row['date_start'], 'impressions': 0}
+                daily_data.append(day_entry)
+            day_entry['impressions'] += int(row['impressions'])
+    return daily_data
+
+
+def daily_with_dict(rows_by_campaign):
+    daily_entries = {}
+    for rows in rows_by_campaign.values():
+        for row in rows:
+            day_entry = daily_entries.setdefault(row['date_start'], {'date': row['date_start'], 'impressions': 0})
+            day_entry['impressions'] += int(row['impressions'])
+    return list(daily_entries.values())
+
+
+def rollups_with_frame(rows_by_campaign):
+    campaign_dims = {cid: {'brand': ('LS2', 'Bulldog', 'EGO')[int(cid) % 3]} for cid in rows_by_campaign}
+    frame = InsightFrame.from_campaign_rows(rows_by_campaign, campaign_dims=campaign_dims)
+    return frame.rollups('month', 'date', 'brand', metrics=(
+        'impressions', 'clicks', 'spend', 'post_engagement', 'photo_view', 'video_views'
+    ))
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark tổng hợp insights')
+    parser.add_argument('--campaigns', type=int, default=120)
+    parser.add_argument('--days', type=int, default=800)
+    args = parser.parse_args()
+
+    print(f"{'campaigns':>9} {'days':>5} {'rows':>8} | {'month scan':>10} {'frame':>8} {'us/row':>7} | {'day scan':>9} {'day dict':>9}")
+    for fraction in (0.25, 0.5, 1.0):
+        days = max(1, int(args.days * fraction))
+        rows_by_campaign = make_rows(args.campaigns, days)
+        row_count = args.campaigns * days
+        month_scan = timed(monthly_with_list_scan, rows_by_campaign)
+        frame = timed(rollups_with_frame, rows_by_campaign)
+        day_scan = timed(daily_with_list_scan, rows_by_campaign)
+        day_dict = timed(daily_with_dict, rows_by_campaign)
+        print(f"{args.campaigns:>9} {days:>5} {row_count:>8} | {month_scan:>9.2f}s {frame:>7.2f}s "
+              f"{frame / row_count * 1e6:>7.2f} | {day_scan:>8.2f}s {day_dict:>8.2f}s")
+    print("us/row của InsightFrame gần như không đổi khi số ngày tăng (tuyến tính); "
+          "cách quét list tăng theo số bucket.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark throughput của app dưới gunicorn với nhiều người dùng dashboard đồng thời.
+Graph API được giả lập trong tiến trình server (mỗi call chờ --latency giây, không cần mạng),
+client bắn request tới /api/campaign-adsets (mỗi request một call Graph, id khác nhau nên
+không bị cache/gộp). So sánh worker sync (1 request/lần) với gthread (và gevent nếu có cài).
+
+Chạy: python benchmark_server.py [--requests 200] [--concurrency 8,32,64] [--latency 0.2]
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+
+import requests
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(port: int, worker_class: str, threads: int, latency: float):
+    """Chạy app dưới gunicorn, với Graph API giả lập có độ trễ cố định"""
+    os.environ.setdefault('USER_TOKEN', 'benchmark-token')
+    from gunicorn.app.base import BaseApplication
+
+    def fake_graph(self, method, url, *args, **kwargs):
+        time.sleep(latency)
+        response = requests.models.Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = 'application/json'
+        response._content = b'{"data": [{"id": "1", "name": "Ad set", "status": "ACTIVE"}]}'
+        response.url = url
+        return response
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'127.0.0.1:{port}')
+            self.cfg.set('workers', 1)
+            self.cfg.set('worker_class', worker_class)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_connections', 1000)
+            self.cfg.set('loglevel', 'warning')
+
+        def load(self):
+            requests.Session.request = fake_graph
+            from app import app
+            return app
+
+    Server().run()
+
+
+def wait_until_up(port: int, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/health', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('Server không khởi động được')
+
+
+def run_load(port: int, total: int, concurrency: int):
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def one(i):
+        started = time.perf_counter()
+        response = session.get(f'http://127.0.0.1:{port}/api/campaign-adsets',
+                               params={'campaign_id': f'{concurrency}-{i}'}, timeout=120)
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+    return total / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark throughput server')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', default='8,32,64')
+    parser.add_argument('--latency', type=float, default=0.2, help='độ trễ giả lập mỗi call Graph (giây)')
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    modes = [('sync', 1), ('gthread', 32), ('gthread', 128)]
+    if find_spec('gevent'):
+        modes.append(('gevent', 1))
+
+    print(f"{'worker':>8} {'threads':>7} {'users':>5} | {'req/s':>7} {'p50':>7} {'p95':>7}")
+    for worker_class, threads in modes:
+        port = free_port()
+        server = multiprocessing.Process(target=serve, args=(port, worker_class, threads, args.latency), daemon=True)
+        server.start()
+        try:
+            wait_until_up(port)
+            for concurrency in levels:
+                total = args.requests if worker_class != 'sync' else min(args.requests, concurrency * 4)
+                rps, p50, p95 = run_load(port, total, concurrency)
+                print(f"{worker_class:>8} {threads:>7} {concurrency:>5} | {rps:>7.1f} {p50:>6.2f}s {p95:>6.2f}s")
+        finally:
+            server.terminate()
+            server.join()
+    print(f"Giới hạn lý thuyết của một luồng chặn: {1 / args.latency:.1f} req/s.")
+
+
+if __name__ == "__main__":
+    main()
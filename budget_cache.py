@@ -1,93 +1,156 @@
 """
 Budget Cache Manager
-Handles caching of Facebook campaign budget data to avoid rate limiting
+Handles caching of Facebook campaign budget data to avoid rate limiting.
+Entries live in a SQLite database with one timestamp per campaign, so lookups are
+indexed, writes are transactional and several gunicorn workers can share the cache.
 """
 import json
 import os
+import sqlite3
 import time
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+from datetime import datetime
+
+BUDGET_FIELDS = ('daily_budget', 'lifetime_budget', 'budget_remaining')
+
 
 class BudgetCache:
-    def __init__(self, cache_file: str = "budget_cache.json"):
+    def __init__(self, cache_file: str = "budget_cache.db", legacy_file: str = "budget_cache.json"):
         self.cache_file = cache_file
+        self.legacy_file = legacy_file
         self.cache_duration = 3600  # 1 hour cache duration
-    
-    def _load_cache(self) -> Dict[str, Any]:
-        """Load cache from file"""
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection, creating the schema (and importing the legacy JSON cache) on first use"""
+        conn = sqlite3.connect(self.cache_file, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS campaign_budgets (
+                    campaign_id TEXT PRIMARY KEY,
+                    daily_budget REAL NOT NULL DEFAULT 0,
+                    lifetime_budget REAL NOT NULL DEFAULT 0,
+                    budget_remaining REAL NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._import_legacy_cache(conn)
+            self._initialized = True
+        return conn
+
+    def _import_legacy_cache(self, conn: sqlite3.Connection) -> None:
+        """Import entries from the old budget_cache.json once, keeping its last_updated time"""
+        if not os.path.exists(self.legacy_file):
+            return
+        if conn.execute("SELECT 1 FROM campaign_budgets LIMIT 1").fetchone():
+            return
         try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+            updated_at = datetime.fromisoformat(legacy['last_updated']).timestamp() if legacy.get('last_updated') else 0
+            with conn:
+                self._upsert(conn, legacy.get('campaigns', {}), updated_at)
+        except Exception as e:
+            print(f"Error importing legacy budget cache: {e}")
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, budgets: Dict[str, Dict[str, float]], updated_at: float) -> None:
+        conn.executemany(
+            "INSERT OR REPLACE INTO campaign_budgets (campaign_id, daily_budget, lifetime_budget, budget_remaining, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(campaign_id, *(float(budget.get(field, 0) or 0) for field in BUDGET_FIELDS), updated_at)
+             for campaign_id, budget in budgets.items()]
+        )
+
+    def get_campaign_budgets(self, campaign_ids: Iterable[str]) -> Dict[str, Dict[str, float]]:
+        """Get cached, still valid budget data for many campaigns in one lookup"""
+        campaign_ids = list(campaign_ids)
+        if not campaign_ids:
+            return {}
+        try:
+            conn = self._connect()
+            try:
+                placeholders = ','.join('?' * len(campaign_ids))
+                cursor = conn.execute(
+                    f"SELECT campaign_id, daily_budget, lifetime_budget, budget_remaining FROM campaign_budgets "
+                    f"WHERE updated_at >= ? AND campaign_id IN ({placeholders})",
+                    [time.time() - self.cache_duration, *campaign_ids]
+                )
+                return {row[0]: dict(zip(BUDGET_FIELDS, row[1:])) for row in cursor}
+            finally:
+                conn.close()
         except Exception as e:
             print(f"Error loading budget cache: {e}")
-        return {"campaigns": {}, "last_updated": None}
-    
-    def _save_cache(self, cache_data: Dict[str, Any]) -> bool:
-        """Save cache to file"""
+            return {}
+
+    def get_campaign_budget(self, campaign_id: str) -> Optional[Dict[str, float]]:
+        """Get cached budget data for a campaign"""
+        return self.get_campaign_budgets([campaign_id]).get(campaign_id)
+
+    def set_campaign_budgets(self, budgets: Dict[str, Dict[str, float]]) -> bool:
+        """Cache budget data for many campaigns in a single transaction"""
         try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
-            return True
+            conn = self._connect()
+            try:
+                with conn:
+                    self._upsert(conn, budgets, time.time())
+                return True
+            finally:
+                conn.close()
         except Exception as e:
             print(f"Error saving budget cache: {e}")
             return False
-    
-    def _is_cache_valid(self, cache_data: Dict[str, Any]) -> bool:
-        """Check if cache is still valid"""
-        if not cache_data.get("last_updated"):
-            return False
-        
-        try:
-            last_updated = datetime.fromisoformat(cache_data["last_updated"])
-            return datetime.now() - last_updated < timedelta(seconds=self.cache_duration)
-        except:
-            return False
-    
-    def get_campaign_budget(self, campaign_id: str) -> Optional[Dict[str, float]]:
-        """Get cached budget data for a campaign"""
-        cache_data = self._load_cache()
-        
-        if not self._is_cache_valid(cache_data):
-            return None
-        
-        return cache_data.get("campaigns", {}).get(campaign_id)
-    
+
     def set_campaign_budget(self, campaign_id: str, budget_data: Dict[str, float]) -> bool:
         """Cache budget data for a campaign"""
-        cache_data = self._load_cache()
-        
-        if "campaigns" not in cache_data:
-            cache_data["campaigns"] = {}
-        
-        cache_data["campaigns"][campaign_id] = budget_data
-        cache_data["last_updated"] = datetime.now().isoformat()
-        
-        return self._save_cache(cache_data)
-    
+        return self.set_campaign_budgets({campaign_id: budget_data})
+
     def get_all_budgets(self) -> Dict[str, Dict[str, float]]:
-        """Get all cached budget data"""
-        cache_data = self._load_cache()
-        
-        if not self._is_cache_valid(cache_data):
+        """Get all cached, still valid budget data"""
+        try:
+            conn = self._connect()
+            try:
+                cursor = conn.execute(
+                    "SELECT campaign_id, daily_budget, lifetime_budget, budget_remaining FROM campaign_budgets WHERE updated_at >= ?",
+                    (time.time() - self.cache_duration,)
+                )
+                return {row[0]: dict(zip(BUDGET_FIELDS, row[1:])) for row in cursor}
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Error loading budget cache: {e}")
             return {}
-        
-        return cache_data.get("campaigns", {})
-    
+
     def clear_cache(self) -> bool:
         """Clear the cache"""
         try:
-            if os.path.exists(self.cache_file):
-                os.remove(self.cache_file)
-            return True
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM campaign_budgets")
+                return True
+            finally:
+                conn.close()
         except Exception as e:
             print(f"Error clearing budget cache: {e}")
             return False
-    
+
     def is_cache_available(self) -> bool:
-        """Check if cache is available and valid"""
-        cache_data = self._load_cache()
-        return self._is_cache_valid(cache_data)
+        """Check if any cached budget is still valid"""
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT 1 FROM campaign_budgets WHERE updated_at >= ? LIMIT 1",
+                    (time.time() - self.cache_duration,)
+                ).fetchone()
+                return row is not None
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Error loading budget cache: {e}")
+            return False
 
 # Global cache instance
 budget_cache = BudgetCache()
@@ -0,0 +1,108 @@
+"""
+Campaign Classifier
+Classifies campaign names into brand and content format from ordered rule tables.
+Each rule's keywords are compiled into one regex, and the rules are tried in priority
+order; the first rule with a match wins, exactly like the old chained `in` checks.
+Extra rules can be added in campaign_rules.json (CAMPAIGN_RULES_FILE) without code changes:
+
+    {"brands": {"Royal": ["royal helmet", "royal"]}, "content_formats": {"Livestream": ["live"]}}
+
+Rules from the file are appended after the built-in ones; a name that already exists
+gets the extra keywords.
+"""
+import os
+import re
+import json
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN = 'Unknown'
+
+# (label, keywords) in priority order
+BRAND_RULES: List[Tuple[str, List[str]]] = [
+    ('LS2', ['ls2']),
+    ('Bulldog', ['bulldog']),
+    ('EGO', ['ego']),
+]
+
+CONTENT_FORMAT_RULES: List[Tuple[str, List[str]]] = [
+    ('Video', ['video', 'reel']),
+    ('Image', ['image', 'photo', 'picture']),
+    ('Carousel', ['carousel']),
+    ('Story', ['story']),
+    ('Post', ['post']),
+    ('Ad', ['ad']),
+]
+
+RULES_FILE = os.getenv('CAMPAIGN_RULES_FILE', 'campaign_rules.json')
+
+
+class RuleMatcher:
+    def __init__(self, rules: Sequence[Tuple[str, Sequence[str]]], default: str):
+        self.default = default
+        # One pattern per rule, so a later rule's longer keyword ("ego pro") never shadows
+        # an earlier rule's shorter one ("ego")
+        self._patterns: List[Tuple[str, re.Pattern]] = [
+            (label, re.compile('|'.join(re.escape(k.lower()) for k in keywords)))
+            for label, keywords in rules if keywords
+        ]
+
+    def match(self, text: Optional[str]) -> str:
+        if not text:
+            return self.default
+        text = text.lower()
+        for label, pattern in self._patterns:
+            if pattern.search(text):
+                return label
+        return self.default
+
+
+def _merge_rules(rules: List[Tuple[str, List[str]]], extra: Dict[str, List[str]]) -> List[Tuple[str, List[str]]]:
+    merged = [(label, list(keywords)) for label, keywords in rules]
+    positions = {label: i for i, (label, _) in enumerate(merged)}
+    for label, keywords in (extra or {}).items():
+        if label in positions:
+            merged[positions[label]][1].extend(keywords)
+        else:
+            positions[label] = len(merged)
+            merged.append((label, list(keywords)))
+    return merged
+
+
+def _load_extra_rules() -> Dict[str, Dict[str, List[str]]]:
+    if not os.path.exists(RULES_FILE):
+        return {}
+    try:
+        with open(RULES_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Không đọc được {RULES_FILE}: {e}")
+        return {}
+
+
+_extra_rules = _load_extra_rules()
+brand_matcher = RuleMatcher(_merge_rules(BRAND_RULES, _extra_rules.get('brands')), UNKNOWN)
+content_format_matcher = RuleMatcher(_merge_rules(CONTENT_FORMAT_RULES, _extra_rules.get('content_formats')), 'Mixed')
+
+
+@lru_cache(maxsize=4096)
+def classify_brand(campaign_name: Optional[str]) -> str:
+    return brand_matcher.match(campaign_name)
+
+
+@lru_cache(maxsize=4096)
+def classify_content_format(campaign_name: Optional[str]) -> str:
+    if not campaign_name:
+        return UNKNOWN
+    return content_format_matcher.match(campaign_name)
+
+
+def classify_campaigns(campaigns: List[Dict]) -> None:
+    """Store 'brand' and 'content_format' on each campaign dict (done once when ads data loads)"""
+    for campaign in campaigns:
+        name = campaign.get('campaign_name', '')
+        campaign['brand'] = classify_brand(name)
+        campaign['content_format'] = classify_content_format(name)
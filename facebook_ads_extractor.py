@@ -3,15 +3,32 @@
 import os
 import json
 import logging
+import queue
 import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
-from typing import Dict, List, Any
+from typing import Callable, Dict, Iterator, List, Any, Optional
 import requests
 from dotenv import load_dotenv
 
+from graph_client import UsageThrottle, get_objects, get_throttle
+from http_client import http_session
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Số tài khoản quảng cáo được trích xuất song song
+MAX_PARALLEL_ACCOUNTS = int(os.getenv('EXTRACT_MAX_ACCOUNTS', '4'))
+
+CAMPAIGN_FIELDS = 'id,name,status,objective,created_time,start_time,stop_time'
+# Mở rộng lồng nhau: lấy creative của vài quảng cáo ngay trong lời gọi /campaigns để suy ra Page
+CREATIVE_EXPANSION = 'ads.limit(3){adcreatives{object_story_id}}'
+PAGE_CACHE_FILE = os.getenv('PAGE_CACHE_FILE', 'page_cache.json')
+
+INSIGHT_FIELDS = 'campaign_name,impressions,clicks,spend,ctr,cpc,cpm,reach,frequency,actions,conversion_values,inline_link_clicks,inline_link_click_ctr,unique_inline_link_clicks,video_play_actions,video_3_sec_watched_actions,video_10_sec_watched_actions,video_p25_watched_actions,video_p50_watched_actions,video_p75_watched_actions,video_p95_watched_actions,video_avg_time_watched_actions'
+
 class FacebookAdsExtractor:
     
     def __init__(self):
@@ -20,49 +37,98 @@ class FacebookAdsExtractor:
         self.skip_insights = (os.getenv('SKIP_INSIGHTS', 'true').lower() in ['1', 'true', 'yes'])
         self.account_ids = os.getenv('FACEBOOK_ACCOUNT_IDS', '').split(',')
         self.base_url = "https://graph.facebook.com/v23.0"
-        self._page_cache = {}
+        self._page_cache = self._load_page_cache()
+        self._page_cache_lock = threading.Lock()
+        self._page_cache_save_lock = threading.Lock()
+        # Số chiến dịch đã liệt kê trong lần trích xuất hiện tại (tổng tạm thời cho tiến độ)
+        self.listed_campaigns = 0
+        self._listed_lock = threading.Lock()
         
         if not self.access_token:
             raise ValueError("USER_TOKEN hoặc FACEBOOK_ACCESS_TOKEN không được cấu hình")
         if not self.account_ids or self.account_ids[0] == '':
             raise ValueError("FACEBOOK_ACCOUNT_IDS không được cấu hình")
 
-    def _infer_campaign_page(self, campaign_id: str) -> Dict[str, str]:
+    def _throttle(self, account_id: Optional[str] = None) -> UsageThrottle:
+        """Mỗi tài khoản quảng cáo có một throttle riêng, điều tốc theo header usage của Graph."""
+        return get_throttle(account_id or 'token')
+    
+    @staticmethod
+    def _load_page_cache() -> Dict[str, str]:
+        """Đọc tên Page đã biết từ các lần chạy trước."""
         try:
-            ads_res = requests.get(
-                f"{self.base_url}/{campaign_id}/ads",
-                params={
-                    'access_token': self.access_token,
-                    'fields': 'id,adcreatives{object_story_id,object_id,instagram_actor_id}',
-                    'limit': 3
-                }
-            )
-            if ads_res.status_code != 200:
-                return {}
-            ads = ads_res.json().get('data', [])
-            page_id = None
-            for ad in ads:
-                creatives = (ad.get('adcreatives') or {}).get('data') or []
-                for cr in creatives:
-                    osid = cr.get('object_story_id') or ''
-                    if '_' in osid:
-                        page_id = osid.split('_')[0]
-                        break
-                if page_id:
-                    break
-            if not page_id:
-                return {}
-            if page_id in self._page_cache:
-                return {'page_id': page_id, 'page_name': self._page_cache[page_id]}
-            page_res = requests.get(f"{self.base_url}/{page_id}", params={'access_token': self.access_token, 'fields': 'name'})
-            if page_res.status_code == 200:
-                name = page_res.json().get('name') or ''
-                self._page_cache[page_id] = name
-                return {'page_id': page_id, 'page_name': name}
-            return {'page_id': page_id, 'page_name': ''}
-        except Exception:
+            with open(PAGE_CACHE_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
             return {}
     
+    def _save_page_cache(self) -> None:
+        """Ghi cache tên Page qua file tạm riêng rồi thay thế atomic.
+        
+        Các luồng tài khoản ghi lần lượt (snapshot lấy trong lúc giữ lock ghi), nên lần ghi sau
+        luôn chứa bản mới nhất và không có hai luồng cùng ghi một file tạm.
+        """
+        with self._page_cache_save_lock:
+            with self._page_cache_lock:
+                snapshot = dict(self._page_cache)
+            temp_file = None
+            try:
+                fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(PAGE_CACHE_FILE)),
+                                                 prefix=os.path.basename(PAGE_CACHE_FILE) + '.', suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, ensure_ascii=False, indent=2)
+                os.replace(temp_file, PAGE_CACHE_FILE)
+            except OSError as e:
+                logger.warning(f"Không lưu được cache tên Page: {e}")
+                if temp_file and os.path.exists(temp_file):
+                    os.remove(temp_file)
+    
+    def _get_ids(self, ids: List[str], fields: str, account_id: Optional[str] = None) -> Dict[str, Any]:
+        """Đọc nhiều node trong một lời gọi ?ids=, chia nhóm tối đa 50 ID."""
+        return get_objects(ids, self.access_token, fields, self._throttle(account_id))
+    
+    @staticmethod
+    def _page_id_from_ads(ads_edge: Optional[Dict[str, Any]]) -> Optional[str]:
+        for ad in (ads_edge or {}).get('data') or []:
+            for cr in (ad.get('adcreatives') or {}).get('data') or []:
+                osid = cr.get('object_story_id') or ''
+                if '_' in osid:
+                    return osid.split('_')[0]
+        return None
+    
+    def _infer_campaign_pages(self, campaigns: List[Dict[str, Any]],
+                              account_id: Optional[str] = None) -> Dict[str, Dict[str, str]]:
+        """Suy ra Page của nhiều chiến dịch cùng lúc.
+        
+        Creative lấy từ trường 'ads' đã mở rộng sẵn trong campaign (nếu có), còn lại đọc gộp
+        qua ?ids=; tên các Page chưa biết được tra trong một lời gọi ?ids= duy nhất.
+        """
+        ads_by_campaign = {c['id']: c['ads'] for c in campaigns if 'ads' in c}
+        missing = [c['id'] for c in campaigns if 'ads' not in c]
+        if missing:
+            for campaign_id, node in self._get_ids(missing, CREATIVE_EXPANSION, account_id).items():
+                ads_by_campaign[campaign_id] = node.get('ads')
+        
+        page_ids = {}
+        for campaign in campaigns:
+            page_id = self._page_id_from_ads(ads_by_campaign.get(campaign['id']))
+            if page_id:
+                page_ids[campaign['id']] = page_id
+        
+        with self._page_cache_lock:
+            unknown = sorted({pid for pid in page_ids.values() if pid not in self._page_cache})
+        if unknown:
+            names = {pid: node.get('name') or '' for pid, node in self._get_ids(unknown, 'name', account_id).items()}
+            with self._page_cache_lock:
+                self._page_cache.update({pid: name for pid, name in names.items() if name})
+            self._save_page_cache()
+        
+        with self._page_cache_lock:
+            return {cid: {'page_id': pid, 'page_name': self._page_cache.get(pid, '')} for cid, pid in page_ids.items()}
+    
+    def _infer_campaign_page(self, campaign_id: str, account_id: Optional[str] = None) -> Dict[str, str]:
+        return self._infer_campaign_pages([{'id': campaign_id}], account_id).get(campaign_id, {})
+    
     def test_connection(self) -> bool:
         try:
             url = f"{self.base_url}/me/adaccounts"
@@ -70,7 +136,7 @@ class FacebookAdsExtractor:
                 'access_token': self.access_token,
                 'fields': 'id,name'
             }
-            response = requests.get(url, params=params)
+            response = http_session.get(url, params=params)
             response.raise_for_status()
             
             data = response.json()
@@ -81,46 +147,102 @@ class FacebookAdsExtractor:
             logger.error(f"Lỗi kết nối: {e}")
             return False
     
-    def get_campaigns(self, account_id: str) -> List[Dict[str, Any]]:
+    def _warn_if_missing_ads_read(self) -> None:
         try:
-            url = f"{self.base_url}/{account_id}/campaigns"
-            params = {
-                'access_token': self.access_token,
-                'fields': 'id,name,status,objective,created_time,start_time,stop_time',
-                'limit': 100
-            }
-            
-            response = requests.get(url, params=params)
-            response.raise_for_status()
+            perm_url = f"{self.base_url}/me/permissions"
+            perm_response = http_session.get(perm_url, params={'access_token': self.access_token})
+            if perm_response.status_code == 200:
+                permissions = perm_response.json().get('data', [])
+                ads_read_granted = any(p.get('permission') == 'ads_read' and p.get('status') == 'granted' for p in permissions)
+                if not ads_read_granted:
+                    logger.warning("Thiếu quyền 'ads_read'. Cần cấp quyền này để đọc dữ liệu quảng cáo.")
+        except:
+            pass
+    
+    def iter_campaign_pages(self, account_id: str, expand_creatives: bool = True) -> Iterator[List[Dict[str, Any]]]:
+        """Trả về từng trang chiến dịch của tài khoản, đi theo paging.next cho tới trang cuối.
+        
+        Lỗi Graph ở bất kỳ trang nào được raise (không kết thúc sớm như thể đã hết trang).
+        Với expand_creatives, mỗi chiến dịch kèm trường 'ads' (creative) để suy ra Page mà
+        không cần gọi thêm API; nếu Graph từ chối truy vấn lồng nhau thì lấy lại không mở rộng.
+        """
+        url = f"{self.base_url}/{account_id}/campaigns"
+        fields = f"{CAMPAIGN_FIELDS},{CREATIVE_EXPANSION}" if expand_creatives else CAMPAIGN_FIELDS
+        params = {
+            'access_token': self.access_token,
+            'fields': fields,
+            'limit': 100
+        }
+        
+        throttle = self._throttle(account_id)
+        first_page = True
+        while url:
+            try:
+                response = throttle.get(url, params=params)
+                if expand_creatives and first_page and response.status_code != 200:
+                    logger.warning("Graph từ chối mở rộng creative trong /campaigns, lấy lại không mở rộng")
+                    yield from self.iter_campaign_pages(account_id, expand_creatives=False)
+                    return
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                # Dừng giữa chừng sẽ làm danh sách chiến dịch thiếu, nên báo lỗi thay vì coi như hết trang
+                logger.error(f"Lỗi khi lấy chiến dịch: {e}")
+                raise
             
             data = response.json()
-            campaigns = data.get('data', [])
-            
             if 'error' in data:
                 logger.warning(f"Lỗi API khi lấy campaigns: {data['error']}")
-                return []
-            
-            logger.info(f"Lấy được {len(campaigns)} chiến dịch từ tài khoản {account_id}")
-            
-            if len(campaigns) == 0:
-                logger.info("Không tìm thấy chiến dịch nào. Có thể tài khoản chưa có chiến dịch hoặc thiếu quyền truy cập.")
-                
-                try:
-                    perm_url = f"{self.base_url}/me/permissions"
-                    perm_response = requests.get(perm_url, params={'access_token': self.access_token})
-                    if perm_response.status_code == 200:
-                        permissions = perm_response.json().get('data', [])
-                        ads_read_granted = any(p.get('permission') == 'ads_read' and p.get('status') == 'granted' for p in permissions)
-                        if not ads_read_granted:
-                            logger.warning("Thiếu quyền 'ads_read'. Cần cấp quyền này để đọc dữ liệu quảng cáo.")
-                except:
-                    pass
-            
-            return campaigns
+                raise RuntimeError(f"Lỗi API khi lấy campaigns: {data['error']}")
             
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Lỗi khi lấy chiến dịch: {e}")
+            yield data.get('data', [])
+            first_page = False
+            # paging.next đã bao gồm đầy đủ tham số truy vấn
+            url = (data.get('paging') or {}).get('next')
+            params = None
+    
+    def iter_campaigns(self, account_id: str) -> Iterator[Dict[str, Any]]:
+        """Trả về từng chiến dịch của tài khoản."""
+        for page in self.iter_campaign_pages(account_id, expand_creatives=False):
+            yield from page
+    
+    def get_campaigns(self, account_id: str) -> List[Dict[str, Any]]:
+        try:
+            campaigns = list(self.iter_campaigns(account_id))
+        except (requests.exceptions.RequestException, RuntimeError) as e:
+            logger.error(f"Không lấy được chiến dịch của tài khoản {account_id}: {e}")
             return []
+        logger.info(f"Lấy được {len(campaigns)} chiến dịch từ tài khoản {account_id}")
+        
+        if len(campaigns) == 0:
+            logger.info("Không tìm thấy chiến dịch nào. Có thể tài khoản chưa có chiến dịch hoặc thiếu quyền truy cập.")
+            self._warn_if_missing_ads_read()
+        
+        return campaigns
+    
+    def get_campaign_daily_insights(self, campaign_id: str, since: str, until: str,
+                                    account_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        url = f"{self.base_url}/{campaign_id}/insights"
+        params = {
+            'access_token': self.access_token,
+            'level': 'campaign',
+            'fields': INSIGHT_FIELDS,
+            'time_range': json.dumps({'since': since, 'until': until}),
+            'time_increment': 1,
+            'limit': 500
+        }
+        
+        throttle = self._throttle(account_id)
+        rows = []
+        while url:
+            response = throttle.get(url, params=params)
+            response.raise_for_status()
+            
+            data = response.json()
+            rows.extend(data.get('data', []))
+            # paging.next đã bao gồm đầy đủ tham số truy vấn
+            url = (data.get('paging') or {}).get('next')
+            params = None
+        return rows
     
     def get_campaign_insights(self, account_id: str, campaign_id: str, start_date: str = "2023-01-01") -> Dict[str, Any]:
         try:
@@ -128,14 +250,14 @@ class FacebookAdsExtractor:
             params = {
                 'access_token': self.access_token,
                 'level': 'campaign',
-                'fields': 'campaign_name,impressions,clicks,spend,ctr,cpc,cpm,reach,frequency,actions,inline_link_clicks,inline_link_click_ctr,unique_inline_link_clicks,video_play_actions,video_3_sec_watched_actions,video_10_sec_watched_actions,video_p25_watched_actions,video_p50_watched_actions,video_p75_watched_actions,video_p95_watched_actions,video_avg_time_watched_actions',
-                'date_preset': 'custom',
-                'since': start_date,
-                'until': date.today().isoformat(),
-                'time_increment': 1
+                'fields': INSIGHT_FIELDS,
+                'time_range': json.dumps({'since': start_date, 'until': date.today().isoformat()}),
+                'time_increment': 1,
+                'limit': 1
             }
             
-            response = requests.get(url, params=params)
+            # Chỉ cần dòng đầu tiên nên không theo paging.next
+            response = self._throttle(account_id).get(url, params=params)
             response.raise_for_status()
             
             insights = response.json().get('data', [])
@@ -147,45 +269,146 @@ class FacebookAdsExtractor:
             logger.error(f"Lỗi khi lấy insights: {e}")
             return {}
     
+    def _build_campaign_data(self, account_id: str, campaign: Dict[str, Any], start_date: str,
+                             page_info: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        campaign_data = {
+            'account_id': account_id,
+            'campaign_id': campaign['id'],
+            'campaign_name': campaign.get('name', 'Unknown'),
+            'status': campaign.get('status', 'Unknown'),
+            'objective': campaign.get('objective', 'Unknown'),
+            'created_time': campaign.get('created_time', ''),
+            'start_time': campaign.get('start_time', ''),
+            'stop_time': campaign.get('stop_time', ''),
+            'insights': {}
+        }
+        if page_info is None:
+            page_info = self._infer_campaign_page(campaign['id'], account_id)
+        if page_info:
+            campaign_data.update(page_info)
+        
+        if not self.skip_insights and campaign.get('status') == 'ACTIVE':
+            insights = self.get_campaign_insights(account_id, campaign['id'], start_date)
+            campaign_data['insights'] = insights
+        return campaign_data
+    
+    def _iter_account_campaign_data(self, account_id: str, start_date: str) -> Iterator[Dict[str, Any]]:
+        logger.info(f"Đang xử lý tài khoản: {account_id}")
+        
+        count = 0
+        for campaigns in self.iter_campaign_pages(account_id):
+            with self._listed_lock:
+                self.listed_campaigns += len(campaigns)
+            pages = self._infer_campaign_pages(campaigns, account_id)
+            for campaign in campaigns:
+                count += 1
+                yield self._build_campaign_data(account_id, campaign, start_date, pages.get(campaign['id'], {}))
+        
+        logger.info(f"Lấy được {count} chiến dịch từ tài khoản {account_id}")
+        if count == 0:
+            self._warn_if_missing_ads_read()
+    
+    def iter_campaign_data(self, start_date: str = "2023-01-01") -> Iterator[Dict[str, Any]]:
+        """Trả về dữ liệu từng chiến dịch ngay khi lấy xong.
+        
+        Các tài khoản được trích xuất song song (tối đa MAX_PARALLEL_ACCOUNTS), mỗi tài khoản
+        tự điều tốc theo rate limit của riêng nó. Thứ tự chiến dịch giữa các tài khoản có thể xen kẽ.
+        Nếu một tài khoản lỗi, các tài khoản còn lại được dừng và lỗi được raise.
+        """
+        account_ids = [a.strip() for a in self.account_ids if a.strip()]
+        if not account_ids:
+            return
+        self.listed_campaigns = 0
+        
+        # Hàng đợi giới hạn để bộ nhớ không tăng khi nơi ghi file chậm hơn nơi lấy dữ liệu
+        records: queue.Queue = queue.Queue(maxsize=100)
+        account_done = object()
+        stop = threading.Event()
+        failures: List[Exception] = []
+        
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    records.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def extract_account(account_id):
+            try:
+                for campaign_data in self._iter_account_campaign_data(account_id, start_date):
+                    if not put(campaign_data):
+                        return
+            except Exception as e:
+                logger.error(f"Lỗi khi trích xuất tài khoản {account_id}: {e}")
+                failures.append(RuntimeError(f"Trích xuất tài khoản {account_id} thất bại: {e}"))
+            finally:
+                put(account_done)
+        
+        pool = ThreadPoolExecutor(max_workers=max(1, min(MAX_PARALLEL_ACCOUNTS, len(account_ids))))
+        try:
+            for account_id in account_ids:
+                pool.submit(extract_account, account_id)
+            
+            remaining = len(account_ids)
+            while remaining:
+                item = records.get()
+                if item is account_done:
+                    if failures:
+                        # Dữ liệu thiếu một tài khoản không được coi là snapshot hoàn chỉnh
+                        raise failures[0]
+                    remaining -= 1
+                    continue
+                yield item
+        finally:
+            stop.set()
+            pool.shutdown(wait=True)
+    
     def extract_all_data(self, start_date: str = "2023-01-01") -> Dict[str, Any]:
-        all_data = {
+        return {
             'extraction_date': datetime.now().isoformat(),
             'start_date': start_date,
-            'campaigns': []
+            'campaigns': list(self.iter_campaign_data(start_date))
         }
+    
+    def extract_to_json(self, filename: str = "ads_data.json", start_date: str = "2023-01-01",
+                        progress: Optional[Callable[[int, int], None]] = None) -> Optional[int]:
+        """Trích xuất và ghi từng chiến dịch xuống file ngay khi có, bộ nhớ không tăng theo số chiến dịch.
         
-        for account_id in self.account_ids:
-            account_id = account_id.strip()
-            if not account_id:
-                continue
-                
-            logger.info(f"Đang xử lý tài khoản: {account_id}")
+        File có cùng định dạng với save_to_json và được thay thế atomic khi ghi xong.
+        progress(done, total) được gọi sau mỗi chiến dịch; total là số chiến dịch đã liệt kê tới lúc đó.
+        Trả về số chiến dịch đã ghi. Khi lỗi, file tạm bị xoá, file cũ giữ nguyên và lỗi được raise.
+        """
+        temp_filename = filename + '.tmp'
+        try:
+            count = 0
+            with open(temp_filename, 'w', encoding='utf-8') as f:
+                header = {'extraction_date': datetime.now().isoformat(), 'start_date': start_date}
+                f.write(json.dumps(header, ensure_ascii=False)[:-1] + ', "campaigns": [\n')
+                for campaign_data in self.iter_campaign_data(start_date):
+                    if count:
+                        f.write(',\n')
+                    f.write(json.dumps(campaign_data, ensure_ascii=False))
+                    count += 1
+                    if progress:
+                        progress(count, max(count, self.listed_campaigns))
+                f.write('\n]}\n')
             
-            campaigns = self.get_campaigns(account_id)
+            # Atomically replace the original file
+            shutil.move(temp_filename, filename)
             
-            for campaign in campaigns:
-                campaign_data = {
-                    'account_id': account_id,
-                    'campaign_id': campaign['id'],
-                    'campaign_name': campaign.get('name', 'Unknown'),
-                    'status': campaign.get('status', 'Unknown'),
-                    'objective': campaign.get('objective', 'Unknown'),
-                    'created_time': campaign.get('created_time', ''),
-                    'start_time': campaign.get('start_time', ''),
-                    'stop_time': campaign.get('stop_time', ''),
-                    'insights': {}
-                }
-                page_info = self._infer_campaign_page(campaign['id'])
-                if page_info:
-                    campaign_data.update(page_info)
-                
-                if not self.skip_insights and campaign.get('status') == 'ACTIVE':
-                    insights = self.get_campaign_insights(account_id, campaign['id'], start_date)
-                    campaign_data['insights'] = insights
-                
-                all_data['campaigns'].append(campaign_data)
-        
-        return all_data
+            logger.info(f"Đã ghi {count} chiến dịch vào {filename}")
+            return count
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi trích xuất dữ liệu vào file: {e}")
+            try:
+                if os.path.exists(temp_filename):
+                    os.remove(temp_filename)
+            except:
+                pass
+            raise
     
     def save_to_json(self, data: Dict[str, Any], filename: str = "ads_data.json") -> bool:
         import tempfile
@@ -290,9 +513,9 @@ def main():
             return
         
         logger.info("Bắt đầu trích xuất dữ liệu...")
-        data = extractor.extract_all_data("2023-01-01")
+        count = extractor.extract_to_json("ads_data.json", "2023-01-01")
         
-        if not data.get('campaigns') or len(data['campaigns']) == 0:
+        if count == 0:
             logger.warning("Không tìm thấy chiến dịch nào trong tài khoản quảng cáo.")
             logger.info("Có thể do:")
             logger.info("1. Tài khoản chưa có chiến dịch quảng cáo nào")
@@ -306,10 +529,7 @@ def main():
             else:
                 logger.error("Lỗi khi tạo dữ liệu mẫu!")
         else:
-            if extractor.save_to_json(data, "ads_data.json"):
-                logger.info("Trích xuất dữ liệu hoàn tất thành công!")
-            else:
-                logger.error("Lỗi khi lưu dữ liệu!")
+            logger.info("Trích xuất dữ liệu hoàn tất thành công!")
             
     except Exception as e:
         logger.error(f"Lỗi không mong muốn: {e}")
@@ -0,0 +1,428 @@
+"""
+Graph API Client
+Shared helpers for fetching Facebook Graph API insights from the dashboard endpoints:
+bounded concurrent fan-out, batch requests (up to 50 sub-requests per call), multi-ID
+reads, usage-header throttling and paged edge streams (account insights, page feed)
+"""
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlencode
+
+import requests
+
+from http_client import http_session
+
+logger = logging.getLogger(__name__)
+
+GRAPH_BASE_URL = 'https://graph.facebook.com/v23.0'
+
+# Maximum number of in-flight Graph requests per access token (shared by all requests of a worker)
+MAX_CONCURRENCY_PER_TOKEN = int(os.getenv('GRAPH_MAX_CONCURRENCY', '8'))
+
+# Graph API accepts at most 50 sub-requests per batch call
+MAX_BATCH_SIZE = 50
+
+# A fallback for empty insights: a date_preset name, or query overrides such as
+# {'date_preset': 'lifetime', 'time_increment': 'monthly'}
+Fallback = Union[str, Dict[str, Any]]
+
+# Graph error codes returned when an app, account or business use case is rate limited
+THROTTLE_ERROR_CODES = {4, 17, 32, 613, 80000, 80001, 80002, 80003, 80004, 80005, 80006, 80008, 80009, 80014}
+
+_token_limits: Dict[str, threading.BoundedSemaphore] = {}
+_token_limits_lock = threading.Lock()
+
+
+def _token_limit(token: str) -> threading.BoundedSemaphore:
+    """Get the concurrency limiter shared by every fetch using this token"""
+    with _token_limits_lock:
+        limit = _token_limits.get(token)
+        if limit is None:
+            limit = threading.BoundedSemaphore(max(1, MAX_CONCURRENCY_PER_TOKEN))
+            _token_limits[token] = limit
+        return limit
+
+
+def parse_usage_headers(headers) -> Tuple[float, float]:
+    """Read Graph rate-limit usage headers.
+
+    Returns (highest usage percentage, seconds until access is regained or the window resets).
+    """
+    usage_pct = 0.0
+    wait_seconds = 0.0
+
+    def load(name):
+        value = headers.get(name)
+        if not value:
+            return None
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+
+    account_usage = load('X-Ad-Account-Usage')
+    if isinstance(account_usage, dict):
+        account_pct = float(account_usage.get('acc_id_util_pct', 0) or 0)
+        usage_pct = max(usage_pct, account_pct)
+        if account_pct >= 100:
+            wait_seconds = max(wait_seconds, float(account_usage.get('reset_time_duration', 0) or 0))
+
+    business_usage = load('X-Business-Use-Case-Usage')
+    if isinstance(business_usage, dict):
+        for use_cases in business_usage.values():
+            for use_case in use_cases or []:
+                usage_pct = max(usage_pct, *(float(use_case.get(k, 0) or 0)
+                                             for k in ('call_count', 'total_cputime', 'total_time')))
+                # estimated_time_to_regain_access is given in minutes
+                wait_seconds = max(wait_seconds, float(use_case.get('estimated_time_to_regain_access', 0) or 0) * 60)
+
+    app_usage = load('X-App-Usage')
+    if isinstance(app_usage, dict):
+        usage_pct = max(usage_pct, *(float(app_usage.get(k, 0) or 0)
+                                     for k in ('call_count', 'total_cputime', 'total_time')))
+
+    return usage_pct, wait_seconds
+
+
+def is_throttle_error(body: Any) -> bool:
+    error = body.get('error') if isinstance(body, dict) else None
+    return isinstance(error, dict) and error.get('code') in THROTTLE_ERROR_CODES
+
+
+class UsageThrottle:
+    """Paces Graph calls for one rate-limit budget (e.g. an ad account) from response usage headers.
+
+    Below slow_down_pct calls go out immediately; between slow_down_pct and stop_pct a delay
+    growing up to max_delay seconds is inserted; at stop_pct, or when Graph reports a time
+    to regain access, calls wait for the window to reset.
+    """
+
+    def __init__(self, name: str = '', slow_down_pct: float = 75.0, stop_pct: float = 95.0,
+                 max_delay: float = 5.0, reset_delay: float = 60.0, max_wait: float = 600.0):
+        self.name = name
+        self.slow_down_pct = slow_down_pct
+        self.stop_pct = stop_pct
+        self.max_delay = max_delay
+        self.reset_delay = reset_delay
+        self.max_wait = max_wait
+        self.usage_pct = 0.0
+        self._next_allowed = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until the next call is allowed"""
+        with self._lock:
+            delay = self._next_allowed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _delay_for(self, delay: float) -> None:
+        with self._lock:
+            self._next_allowed = max(self._next_allowed, time.monotonic() + min(delay, self.max_wait))
+
+    def update(self, response: requests.Response) -> None:
+        """Record the usage reported by a response and schedule the next call accordingly"""
+        usage_pct, wait_seconds = parse_usage_headers(response.headers)
+        self.usage_pct = usage_pct
+        if wait_seconds > 0:
+            delay = wait_seconds
+        elif usage_pct >= self.stop_pct:
+            delay = self.reset_delay
+        elif usage_pct >= self.slow_down_pct:
+            delay = self.max_delay * (usage_pct - self.slow_down_pct) / (self.stop_pct - self.slow_down_pct)
+        else:
+            return
+        if delay >= 1:
+            logger.info(f"Graph usage {usage_pct:.0f}% for {self.name or 'token'}, delaying next call {delay:.1f}s")
+        self._delay_for(delay)
+
+    def backoff(self, attempt: int) -> None:
+        """Back off exponentially after a throttling error"""
+        delay = min(self.max_wait, self.reset_delay * (2 ** attempt))
+        logger.warning(f"Graph throttled {self.name or 'token'}, backing off {delay:.0f}s")
+        self._delay_for(delay)
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, max_retries: int = 3,
+            **kwargs) -> requests.Response:
+        """GET through the throttle, retrying with backoff when Graph answers with a throttling error"""
+        for attempt in range(max_retries + 1):
+            self.wait()
+            response = http_session.get(url, params=params, graph_retries=0, **kwargs)
+            self.update(response)
+            if response.status_code == 200 or attempt == max_retries:
+                return response
+            try:
+                body = response.json()
+            except ValueError:
+                return response
+            if not is_throttle_error(body):
+                return response
+            self.backoff(attempt)
+        return response
+
+
+_throttles: Dict[str, UsageThrottle] = {}
+_throttles_lock = threading.Lock()
+
+
+def get_throttle(name: str) -> UsageThrottle:
+    """Get the throttle shared by every caller pacing the same rate-limit budget (e.g. an ad account)"""
+    with _throttles_lock:
+        throttle = _throttles.get(name)
+        if throttle is None:
+            throttle = UsageThrottle(name=name)
+            _throttles[name] = throttle
+        return throttle
+
+
+def iter_objects(ids: Iterable[str], token: str, fields: str, throttle: Optional[UsageThrottle] = None,
+                 timeout: int = 60) -> Iterator[Tuple[List[str], Dict[str, Any]]]:
+    """Read many nodes with ?ids= multi-ID requests of up to MAX_BATCH_SIZE ids.
+
+    Yields (chunk_ids, nodes_by_id) per request; ids missing from nodes_by_id failed.
+    """
+    ids = list(ids)
+    throttle = throttle or get_throttle('token')
+    for i in range(0, len(ids), MAX_BATCH_SIZE):
+        chunk = ids[i:i + MAX_BATCH_SIZE]
+        nodes: Dict[str, Any] = {}
+        try:
+            response = throttle.get(
+                f"{GRAPH_BASE_URL}/",
+                params={'access_token': token, 'ids': ','.join(chunk), 'fields': fields},
+                timeout=timeout
+            )
+            if response.status_code == 200:
+                nodes = response.json()
+            else:
+                logger.warning(f"Multi-ID read of {len(chunk)} objects failed: {response.text[:200]}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"Multi-ID read of {len(chunk)} objects failed: {e}")
+        yield chunk, nodes
+
+
+def get_objects(ids: Iterable[str], token: str, fields: str,
+                throttle: Optional[UsageThrottle] = None) -> Dict[str, Any]:
+    """Read many nodes with ?ids= multi-ID requests and return them keyed by id"""
+    nodes: Dict[str, Any] = {}
+    for _, chunk_nodes in iter_objects(ids, token, fields, throttle):
+        nodes.update(chunk_nodes)
+    return nodes
+
+
+def fan_out(items: Iterable[Any], fetch_fn: Callable[[Any], Any], token: str,
+            max_workers: Optional[int] = None) -> Iterator[Tuple[Any, Any]]:
+    """Run fetch_fn for every item concurrently and yield (item, result) as each one finishes.
+
+    The number of requests in flight for a token never exceeds MAX_CONCURRENCY_PER_TOKEN,
+    even when several dashboard requests fan out at the same time. If fetch_fn raises,
+    the error is logged and the result is None. fetch_fn must not fan out again with
+    the same token, or it can wait on permits held by its own callers.
+    """
+    items = list(items)
+    if not items:
+        return
+    limit = _token_limit(token)
+
+    def run(item):
+        with limit:
+            return fetch_fn(item)
+
+    workers = max(1, min(max_workers or MAX_CONCURRENCY_PER_TOKEN, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.warning(f"Fan-out fetch failed for {item!r}: {e}")
+                result = None
+            yield item, result
+
+
+def batch_get(sub_requests: List[Tuple[str, Dict[str, Any]]], token: str,
+              timeout: int = 60) -> List[Tuple[int, Dict[str, Any]]]:
+    """Send GET sub-requests through Graph batch POSTs of up to MAX_BATCH_SIZE items.
+
+    Each sub-request is a (relative_path, params) pair. Returns one (status_code, body)
+    pair per sub-request, in order. Items that failed as a whole batch or timed out
+    inside Graph come back with status 0 and an 'error' body.
+    """
+    chunks = [list(range(i, min(i + MAX_BATCH_SIZE, len(sub_requests))))
+              for i in range(0, len(sub_requests), MAX_BATCH_SIZE)]
+    results: List[Tuple[int, Dict[str, Any]]] = [(0, {'error': {'message': 'Not fetched'}})] * len(sub_requests)
+
+    def send_chunk(indexes):
+        batch = []
+        for i in indexes:
+            path, params = sub_requests[i]
+            batch.append({'method': 'GET', 'relative_url': f"{path}?{urlencode(params)}"})
+        response = http_session.post(
+            f"{GRAPH_BASE_URL}/",
+            data={'access_token': token, 'batch': json.dumps(batch), 'include_headers': 'false'},
+            timeout=timeout,
+            coalesce=True  # read-only: identical concurrent batches share one call
+        )
+        if response.status_code != 200:
+            try:
+                error = response.json().get('error', {})
+            except ValueError:
+                error = {'message': response.text}
+            logger.warning(f"Graph batch request failed: {response.status_code} {error}")
+            return [(response.status_code, {'error': error})] * len(indexes)
+
+        items = []
+        for item in response.json():
+            # Graph returns null for sub-requests that did not finish in time
+            if not item:
+                items.append((0, {'error': {'message': 'Batch item timed out'}}))
+                continue
+            try:
+                body = json.loads(item.get('body') or '{}')
+            except ValueError:
+                body = {'error': {'message': item.get('body')}}
+            items.append((item.get('code', 0), body))
+        return items
+
+    for indexes, chunk_results in fan_out(chunks, send_chunk, token):
+        if chunk_results is None:
+            continue
+        for i, result in zip(indexes, chunk_results):
+            results[i] = result
+    return results
+
+
+def fetch_insights_batch(object_ids: Iterable[str], token: str, params: Dict[str, Any],
+                         fallback_presets: Optional[Dict[str, List[Fallback]]] = None,
+                         include_primary: bool = True) -> Dict[str, List[Dict[str, Any]]]:
+    """Fetch /{object_id}/insights rows for many objects through batch requests.
+
+    Objects whose rows come back empty or failed are retried, in batches, with each
+    of their fallbacks in turn (a date preset, or a dict of query overrides). With include_primary=False only the
+    fallback presets are requested. Returns rows per object id; objects that never
+    returned rows map to an empty list.
+    """
+    rows_by_id: Dict[str, List[Dict[str, Any]]] = {oid: [] for oid in object_ids}
+    fallback_presets = fallback_presets or {}
+
+    attempt = 0 if include_primary else 1
+    pending = [oid for oid in rows_by_id if len(fallback_presets.get(oid, [])) >= attempt]
+    while pending:
+        sub_requests = []
+        for oid in pending:
+            query = dict(params)
+            if attempt > 0:
+                for key in ('since', 'until', 'time_range'):
+                    query.pop(key, None)
+                fallback = fallback_presets[oid][attempt - 1]
+                query.update(fallback if isinstance(fallback, dict) else {'date_preset': fallback})
+            sub_requests.append((f"{oid}/insights", query))
+
+        still_empty = []
+        for oid, (status_code, body) in zip(pending, batch_get(sub_requests, token)):
+            rows = body.get('data', []) if status_code == 200 else []
+            if rows:
+                rows_by_id[oid] = rows
+                if attempt > 0:
+                    logger.info(f"Got fallback insights for {oid} with {fallback_presets[oid][attempt - 1]}")
+                continue
+            if status_code != 200:
+                logger.warning(f"Insights request for {oid} failed: {status_code} {body.get('error')}")
+            still_empty.append(oid)
+
+        attempt += 1
+        pending = [oid for oid in still_empty if len(fallback_presets.get(oid, [])) >= attempt]
+    return rows_by_id
+
+
+def iter_edge(path: str, token: str, params: Dict[str, Any], timeout: int = 60,
+              max_items: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Stream the items of an edge (e.g. {page_id}/feed) page by page, following paging.next cursors.
+
+    Stops after max_items items when given. Raises requests.HTTPError if any page fails.
+    """
+    url = f"{GRAPH_BASE_URL}/{path}"
+    query: Optional[Dict[str, Any]] = dict(params, access_token=token)
+    count = 0
+    while url:
+        response = http_session.get(url, params=query, timeout=timeout)
+        response.raise_for_status()
+        payload = response.json()
+        for item in payload.get('data', []):
+            yield item
+            count += 1
+            if max_items is not None and count >= max_items:
+                return
+        # The next cursor URL already carries every query parameter
+        url = (payload.get('paging') or {}).get('next')
+        query = None
+
+
+def iter_account_insights(account_id: str, token: str, params: Dict[str, Any],
+                          timeout: int = 60) -> Iterator[Dict[str, Any]]:
+    """Stream /{account_id}/insights rows page by page, following paging.next cursors.
+
+    Raises requests.HTTPError if any page fails.
+    """
+    return iter_edge(f"{account_id}/insights", token, params, timeout)
+
+
+def fetch_campaign_insights(campaigns: List[Dict[str, Any]], token: str, params: Dict[str, Any],
+                            fallback_presets: Optional[Dict[str, List[Fallback]]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Fetch daily insight rows for the given campaigns with as few Graph requests as possible.
+
+    Each ad account is queried once at level=campaign and its paged rows are filtered
+    locally to the wanted campaign ids. Campaigns whose account could not be streamed,
+    or that have no account_id, go through batched per-campaign requests; campaigns
+    with no rows in the account stream are retried with their fallback presets.
+    """
+    fallback_presets = fallback_presets or {}
+    rows_by_id: Dict[str, List[Dict[str, Any]]] = {}
+    by_account: Dict[str, set] = {}
+    per_campaign_ids = []
+    for campaign in campaigns:
+        cid = campaign.get('campaign_id')
+        if not cid:
+            continue
+        rows_by_id[cid] = []
+        if campaign.get('account_id'):
+            by_account.setdefault(campaign['account_id'], set()).add(cid)
+        else:
+            per_campaign_ids.append(cid)
+
+    account_params = dict(params, level='campaign', time_increment=1, limit=500)
+    fields = [f for f in account_params.get('fields', '').split(',') if f]
+    if 'campaign_id' not in fields:
+        account_params['fields'] = ','.join(['campaign_id'] + fields)
+
+    def stream_account(account_id):
+        wanted = by_account[account_id]
+        account_rows: Dict[str, List[Dict[str, Any]]] = {}
+        for row in iter_account_insights(account_id, token, account_params):
+            cid = row.get('campaign_id')
+            if cid in wanted:
+                account_rows.setdefault(cid, []).append(row)
+        return account_rows
+
+    streamed_ids = []
+    for account_id, account_rows in fan_out(list(by_account), stream_account, token):
+        if account_rows is None:
+            per_campaign_ids.extend(by_account[account_id])
+            continue
+        rows_by_id.update(account_rows)
+        streamed_ids.extend(by_account[account_id])
+
+    if per_campaign_ids:
+        rows_by_id.update(fetch_insights_batch(per_campaign_ids, token, params, fallback_presets))
+
+    missing_ids = [cid for cid in streamed_ids if not rows_by_id[cid] and fallback_presets.get(cid)]
+    if missing_ids:
+        rows_by_id.update(fetch_insights_batch(missing_ids, token, params, fallback_presets, include_primary=False))
+
+    return rows_by_id
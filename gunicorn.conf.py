@@ -0,0 +1,23 @@
+"""
+Gunicorn config for production: gunicorn app:app (picked up automatically from this file).
+
+Dashboard routes spend most of their time waiting on Graph/OpenAI, so each worker serves
+many requests at once with threads (gthread) instead of one blocking request per process.
+Background jobs, the response cache and request coalescing live in process memory, so a
+single worker is the default: /api/jobs/<id> must be polled on the worker that started
+the job. Set GUNICORN_WORKER_CLASS=gevent (with gevent installed) for green threads.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5002')}"
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+# gevent workers: concurrent greenlets per worker
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '500'))
+# Page insights and meta report requests can take over a minute on large accounts
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '180'))
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
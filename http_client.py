@@ -0,0 +1,180 @@
+"""
+HTTP Client
+One pooled requests session per process for Graph API and OpenAI calls, so requests reuse
+keep-alive connections instead of paying a TCP+TLS handshake each time. The session adds
+default timeouts, gzip, retries with backoff on 5xx/connection errors and short retries
+when Graph answers with a throttling error code. Identical requests in flight at the same
+time from different threads are coalesced into one upstream call (single-flight).
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Connections kept open per host; should cover the concurrent requests of a worker
+POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '32'))
+
+# (connect, read) timeout used when a call does not pass one
+DEFAULT_TIMEOUT: Tuple[float, float] = (10.0, 60.0)
+
+# Graph error codes retried by the session (app, user, account and page rate limits)
+GRAPH_RETRY_CODES = {4, 17, 32, 613}
+GRAPH_RETRIES = int(os.getenv('GRAPH_THROTTLE_RETRIES', '3'))
+# Gateway/server errors retried for idempotent methods, and for POSTs that opt in as read-only
+RETRY_STATUSES = (500, 502, 503, 504)
+STATUS_RETRIES = 3
+BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+
+
+def _graph_error_code(url: str, response: requests.Response) -> Optional[int]:
+    if response.status_code < 400 or not (urlparse(url).hostname or '').endswith('facebook.com'):
+        return None
+    try:
+        error = response.json().get('error')
+    except (ValueError, AttributeError):
+        return None
+    return error.get('code') if isinstance(error, dict) else None
+
+
+def _items(values: Any) -> list:
+    if not values:
+        return []
+    if isinstance(values, (bytes, str)):
+        return [('', values)]
+    return list(values.items() if isinstance(values, dict) else values)
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(value.encode()).hexdigest()[:12] if value else ''
+
+
+def request_key(method: str, url: str, params: Any = None, data: Any = None, json_body: Any = None,
+                headers: Optional[Mapping[str, str]] = None, graph_retries: Optional[int] = None) -> Tuple:
+    """Single-flight key: everything that can change the response of a call.
+
+    Method, URL, sorted query/form fields, a digest of the JSON body, the per-call headers and
+    the Graph retry setting. The access token and Authorization header are replaced by digests
+    so callers with different credentials never share a result.
+    """
+    parsed = urlparse(url)
+    fields = parse_qsl(parsed.query) + _items(params) + _items(data)
+    token = ''
+    key_fields = []
+    for name, value in fields:
+        if name == 'access_token':
+            token = str(value)
+        else:
+            key_fields.append((str(name), str(value)))
+    json_digest = _digest(json.dumps(json_body, sort_keys=True, default=str)) if json_body is not None else ''
+    key_headers = tuple(sorted(
+        (name.lower(), _digest(str(value)) if name.lower() == 'authorization' else str(value))
+        for name, value in (headers or {}).items()
+    ))
+    return (method.upper(), parsed._replace(query='').geturl(), tuple(sorted(key_fields)), _digest(token),
+            json_digest, key_headers, graph_retries)
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key wait and share its outcome"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+            else:
+                self.shared += 1
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call['done'].set()
+
+
+class HttpSession(requests.Session):
+    def __init__(self, pool_size: int = POOL_SIZE, timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+                 graph_retries: int = GRAPH_RETRIES):
+        super().__init__()
+        self.timeout = timeout
+        self.graph_retries = graph_retries
+        self.single_flight = SingleFlight()
+        # Read timeouts are not retried, and status retries only cover idempotent methods (urllib3's
+        # default set): the server may already have acted on the request, e.g. a billed OpenAI call
+        retry = Retry(total=STATUS_RETRIES, connect=STATUS_RETRIES, read=0, status=STATUS_RETRIES,
+                      backoff_factor=BACKOFF_SECONDS, status_forcelist=RETRY_STATUSES,
+                      raise_on_status=False, respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+
+    def request(self, method: str, url: str, *args: Any, graph_retries: Optional[int] = None,
+                coalesce: Optional[bool] = None, **kwargs: Any) -> requests.Response:
+        """Send a request; graph_retries=0 disables the Graph throttling retries for this call.
+
+        GETs are coalesced with identical in-flight GETs unless coalesce=False; other methods
+        only when coalesce=True (read-only POSTs such as Graph batch requests), which also
+        retries them on 5xx like GETs. Coalesced callers share the same Response object and
+        must not modify it.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        read_only = coalesce is True and method.upper() not in Retry.DEFAULT_ALLOWED_METHODS
+        if coalesce is None:
+            coalesce = method.upper() == 'GET'
+        if coalesce and not args and not kwargs.get('stream') and not kwargs.get('files'):
+            retries = self.graph_retries if graph_retries is None else graph_retries
+            key = request_key(method, url, kwargs.get('params'), kwargs.get('data'), kwargs.get('json'),
+                              kwargs.get('headers'), retries)
+            return self.single_flight.do(key, lambda: self._send(method, url, graph_retries, read_only, **kwargs))
+        return self._send(method, url, graph_retries, read_only, *args, **kwargs)
+
+    def _send(self, method: str, url: str, graph_retries: Optional[int], read_only: bool, *args: Any,
+              **kwargs: Any) -> requests.Response:
+        retries = self.graph_retries if graph_retries is None else graph_retries
+        attempt = status_attempt = 0
+        while True:
+            response = super().request(method, url, *args, **kwargs)
+            if read_only and response.status_code in RETRY_STATUSES and status_attempt < STATUS_RETRIES:
+                delay = min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * (2 ** status_attempt))
+                logger.warning(f"HTTP {response.status_code} on read-only {method}, retrying in {delay:.0f}s")
+                time.sleep(delay)
+                status_attempt += 1
+                continue
+            code = _graph_error_code(url, response)
+            if code not in GRAPH_RETRY_CODES or attempt >= retries:
+                return response
+            delay = min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * (2 ** attempt))
+            logger.warning(f"Graph throttling error {code}, retrying in {delay:.0f}s")
+            time.sleep(delay)
+            attempt += 1
+
+
+# Global session shared by every module
+http_session = HttpSession()
@@ -0,0 +1,271 @@
+"""
+Insight Frame
+Columnar representation of daily insight rows: one float column per metric plus integer
+category codes per dimension (date, month, campaign, brand, ...). Every row is parsed once
+when the frame is built; group-by sums then run over the columns in a tight pure-Python
+loop. NumPy is an optional speed-up, not a requirement: it is not in requirements.txt,
+but when it happens to be installed the sums use NumPy bincount instead.
+"""
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from action_taxonomy import (
+    LINK_CLICK, MESSAGING, MESSAGING_NEW, PHOTO_VIEW, POST_ENGAGEMENT, PURCHASE, tracked_actions
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Metrics parsed from every row. Action buckets come from 'actions', cv_* from 'conversion_values'.
+METRICS = (
+    'impressions', 'clicks', 'spend', 'reach', 'inline_link_clicks',
+    'video_views', 'video_2_sec_watched_actions',
+    'post_engagement', 'photo_view', 'link_click_actions',
+    'messaging', 'messaging_new', 'purchases',
+    'cv_messaging', 'cv_messaging_new', 'purchase_value',
+)
+
+# Metrics kept as floats; the others are counts reported as whole numbers
+FLOAT_METRICS = {'spend', 'purchase_value'}
+
+# Row-level dimensions every frame has
+ROW_DIMS = ('date', 'month', 'campaign_id')
+
+# Reported metrics and the frame columns summed into each of them. Rows are daily, so 'reach'
+# is the sum of daily reach: it counts a person once per day (and campaign) reached, not unique reach.
+SUM_METRICS = {
+    'impressions': ('impressions',),
+    'clicks': ('clicks',),
+    'spend': ('spend',),
+    'reach': ('reach',),
+    'inline_link_clicks': ('inline_link_clicks', 'link_click_actions'),
+    'post_engagement': ('post_engagement',),
+    'photo_view': ('photo_view',),
+    'video_views': ('video_views',),
+    'messaging_starts': ('messaging', 'cv_messaging'),
+    'messaging_new_contacts': ('messaging_new', 'cv_messaging_new'),
+    'purchases': ('purchases',),
+    'purchase_value': ('purchase_value',),
+}
+
+# Ratios computed from summed numerators and denominators: (numerator, denominator, scale)
+DERIVED_METRICS = {
+    'ctr': ('clicks', 'impressions', 100.0),
+    'cpc': ('spend', 'clicks', 1.0),
+    'cpm': ('spend', 'impressions', 1000.0),
+    'frequency': ('impressions', 'reach', 1.0),
+    'roas': ('purchase_value', 'spend', 1.0),
+    'engagement_rate': ('post_engagement', 'impressions', 100.0),
+    'cost_per_new_message': ('spend', 'messaging_new_contacts', 1.0),
+}
+
+# Derived metrics divided by reach. Reach is not additive across days, so these are only
+# reported when rows are grouped by date; over several days they are None.
+REACH_METRICS = {'frequency'}
+
+
+def _num(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _sum_values(actions: Optional[Iterable[Dict[str, Any]]]) -> float:
+    total = 0
+    for action in actions or []:
+        total += int(_num(action.get('value')))
+    return total
+
+
+class InsightFrame:
+    def __init__(self, dims: Iterable[str] = ROW_DIMS, metrics: Iterable[str] = METRICS):
+        self.size = 0
+        self.columns: Dict[str, array] = {m: array('d') for m in metrics}
+        self.codes: Dict[str, array] = {d: array('l') for d in dims}
+        self.labels: Dict[str, List[Any]] = {d: [] for d in dims}
+        self._label_codes: Dict[str, Dict[Any, int]] = {d: {} for d in dims}
+        self.float_metrics = set(FLOAT_METRICS)
+
+    def _code(self, dim: str, label: Any) -> int:
+        codes = self._label_codes[dim]
+        code = codes.get(label)
+        if code is None:
+            code = codes[label] = len(self.labels[dim])
+            self.labels[dim].append(label)
+        return code
+
+    @staticmethod
+    def parse_row(row: Dict[str, Any]) -> Dict[str, float]:
+        """Parse one Graph insight row into metric values"""
+        actions = dict.fromkeys((POST_ENGAGEMENT, PHOTO_VIEW, LINK_CLICK, MESSAGING, MESSAGING_NEW, PURCHASE), 0)
+        for action, buckets in tracked_actions(row.get('actions')):
+            value = int(_num(action.get('value')))
+            for bucket in buckets:
+                actions[bucket] += value
+        cv_messaging = cv_messaging_new = 0
+        purchase_value = 0.0
+        for cv, buckets in tracked_actions(row.get('conversion_values')):
+            value = _num(cv.get('value'))
+            if PURCHASE in buckets:
+                purchase_value += value
+            if MESSAGING in buckets:
+                cv_messaging += int(value)
+            if MESSAGING_NEW in buckets:
+                cv_messaging_new += int(value)
+        return {
+            'impressions': int(_num(row.get('impressions'))),
+            'clicks': int(_num(row.get('clicks'))),
+            'spend': _num(row.get('spend')),
+            'reach': int(_num(row.get('reach'))),
+            'inline_link_clicks': int(_num(row.get('inline_link_clicks'))),
+            'video_views': _sum_values(row.get('video_play_actions')),
+            'video_2_sec_watched_actions': _sum_values(row.get('video_2_sec_watched_actions')),
+            'post_engagement': actions[POST_ENGAGEMENT],
+            'photo_view': actions[PHOTO_VIEW],
+            'link_click_actions': actions[LINK_CLICK],
+            'messaging': actions[MESSAGING],
+            'messaging_new': actions[MESSAGING_NEW],
+            'purchases': actions[PURCHASE],
+            'cv_messaging': cv_messaging,
+            'cv_messaging_new': cv_messaging_new,
+            'purchase_value': purchase_value,
+        }
+
+    @classmethod
+    def from_campaign_rows(cls, rows_by_campaign: Dict[str, List[Dict[str, Any]]],
+                           campaign_dims: Optional[Dict[str, Dict[str, Any]]] = None,
+                           campaign_values: Optional[Dict[str, Dict[str, float]]] = None) -> 'InsightFrame':
+        """Build a frame from daily rows per campaign.
+
+        campaign_dims adds per-campaign dimensions (e.g. brand, content_format) and
+        campaign_values per-campaign metrics repeated on each of its rows (e.g. budgets).
+        """
+        campaign_dims = campaign_dims or {}
+        campaign_values = campaign_values or {}
+        extra_dims = sorted({d for dims in campaign_dims.values() for d in dims})
+        extra_metrics = sorted({m for values in campaign_values.values() for m in values})
+        frame = cls(ROW_DIMS + tuple(extra_dims), METRICS + tuple(extra_metrics))
+        frame.float_metrics.update(extra_metrics)
+
+        date_codes = frame.codes['date']
+        month_codes = frame.codes['month']
+        campaign_codes = frame.codes['campaign_id']
+        columns = [(m, frame.columns[m]) for m in METRICS]
+        date_cache: Dict[str, Tuple[int, int]] = {}
+        for campaign_id, rows in rows_by_campaign.items():
+            if not rows:
+                continue
+            # Per-campaign codes and values are resolved once, not per row
+            campaign_code = frame._code('campaign_id', campaign_id)
+            dims = campaign_dims.get(campaign_id, {})
+            extra_codes = [(frame.codes[d], frame._code(d, dims.get(d, 'Unknown'))) for d in extra_dims]
+            values = campaign_values.get(campaign_id, {})
+            extra_values = [(frame.columns[m], _num(values.get(m))) for m in extra_metrics]
+
+            for row in rows:
+                date_key = row.get('date_start') or row.get('date') or row.get('date_stop') or 'unknown'
+                day_codes = date_cache.get(date_key)
+                if day_codes is None:
+                    day_codes = date_cache[date_key] = (frame._code('date', date_key), frame._code('month', date_key[:7]))
+                date_codes.append(day_codes[0])
+                month_codes.append(day_codes[1])
+                campaign_codes.append(campaign_code)
+                for codes, code in extra_codes:
+                    codes.append(code)
+                parsed = cls.parse_row(row)
+                for metric, column in columns:
+                    column.append(parsed[metric])
+                for column, value in extra_values:
+                    column.append(value)
+                frame.size += 1
+        return frame
+
+    def _bincount(self, codes: array, column: Optional[array], groups: int) -> List[float]:
+        if np is not None:
+            code_array = np.frombuffer(codes, dtype=f'i{codes.itemsize}')
+            weights = np.frombuffer(column, dtype=np.float64) if column is not None else None
+            return np.bincount(code_array, weights=weights, minlength=groups).tolist()
+        totals = [0.0] * groups
+        if column is None:
+            for code in codes:
+                totals[code] += 1
+        else:
+            for code, value in zip(codes, column):
+                totals[code] += value
+        return totals
+
+    def _group_codes(self, dims: Union[str, Sequence[str]]) -> Tuple[array, List[Any]]:
+        """Codes and labels of a dimension, or of the combination of several (labels are tuples)"""
+        if isinstance(dims, str):
+            return self.codes[dims], self.labels[dims]
+        label_codes: Dict[Tuple[int, ...], int] = {}
+        codes = array('l')
+        keys = zip(*(self.codes[d] for d in dims)) if dims else ((),) * self.size
+        for key in keys:
+            code = label_codes.get(key)
+            if code is None:
+                code = label_codes[key] = len(label_codes)
+            codes.append(code)
+        labels = [tuple(self.labels[d][c] for d, c in zip(dims, key)) for key in label_codes]
+        return codes, labels
+
+    def group_sum(self, dims: Union[str, Sequence[str]],
+                  metrics: Optional[Iterable[str]] = None) -> List[Tuple[Any, Dict[str, Any]]]:
+        """Sum metrics (all by default) per label of dims; each group also gets 'rows' (its row count)"""
+        codes, labels = self._group_codes(dims)
+        columns = self.columns if metrics is None else {m: self.columns[m] for m in metrics}
+        sums = {m: self._bincount(codes, column, len(labels)) for m, column in columns.items()}
+        row_counts = self._bincount(codes, None, len(labels))
+        groups = []
+        for code, label in enumerate(labels):
+            group = {m: (sums[m][code] if m in self.float_metrics else int(round(sums[m][code]))) for m in sums}
+            group['rows'] = int(row_counts[code])
+            groups.append((label, group))
+        return groups
+
+    def rollups(self, *dims: str, metrics: Optional[Iterable[str]] = None) -> Dict[str, List[Tuple[Any, Dict[str, Any]]]]:
+        """Group-by sums for several dimensions over the same parsed columns"""
+        metrics = list(metrics) if metrics is not None else None
+        return {dim: self.group_sum(dim, metrics) for dim in dims}
+
+    def distinct(self, dim: str, of_dim: str) -> Dict[Any, List[Any]]:
+        """Distinct labels of of_dim seen with each label of dim (e.g. campaigns per month)"""
+        pairs = dict.fromkeys(zip(self.codes[dim], self.codes[of_dim]))
+        result: Dict[Any, List[Any]] = {label: [] for label in self.labels[dim]}
+        of_labels = self.labels[of_dim]
+        dim_labels = self.labels[dim]
+        for code, of_code in pairs:
+            result[dim_labels[code]].append(of_labels[of_code])
+        return result
+
+    def rollup(self, dims: Sequence[str], metrics: Sequence[str]) -> List[Dict[str, Any]]:
+        """Rows of the requested SUM_METRICS/DERIVED_METRICS per combination of dims, sorted by dims.
+
+        Ratios are computed from the group's summed numerator and denominator, never averaged.
+        REACH_METRICS are None unless 'date' is one of dims (summed daily reach would inflate them).
+        """
+        needed = set()
+        for metric in metrics:
+            if metric in DERIVED_METRICS:
+                needed.update(DERIVED_METRICS[metric][:2])
+            else:
+                needed.add(metric)
+        columns = sorted({column for name in needed for column in SUM_METRICS[name]})
+        rows = []
+        for labels, sums in self.group_sum(tuple(dims), columns):
+            totals = {name: sum(sums[column] for column in SUM_METRICS[name]) for name in needed}
+            row = dict(zip(dims, labels))
+            for metric in metrics:
+                if metric in REACH_METRICS and 'date' not in dims:
+                    row[metric] = None
+                elif metric in DERIVED_METRICS:
+                    numerator, denominator, scale = DERIVED_METRICS[metric]
+                    row[metric] = totals[numerator] / totals[denominator] * scale if totals[denominator] else 0.0
+                else:
+                    row[metric] = totals[metric]
+            rows.append(row)
+        rows.sort(key=lambda r: tuple(str(r[d]) for d in dims))
+        return rows
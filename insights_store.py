@@ -0,0 +1,333 @@
+"""
+Insights Store
+Local SQLite warehouse of daily campaign insight rows keyed by (campaign_id, date, breakdown).
+A sync job fills it incrementally; dashboard routes read closed days from it and only
+re-fetch the still-mutable attribution window from the Graph API.
+"""
+import os
+import re
+import json
+import logging
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from facebook_ads_extractor import INSIGHT_FIELDS
+from graph_client import Fallback, fan_out, fetch_campaign_insights, fetch_insights_batch, get_objects
+
+logger = logging.getLogger(__name__)
+
+# Days before the last sync whose numbers Facebook may still revise (attribution window)
+ATTRIBUTION_WINDOW_DAYS = int(os.getenv('INSIGHTS_ATTRIBUTION_DAYS', '7'))
+
+
+def resolve_date_range(date_preset: str, since: Optional[str] = None, until: Optional[str] = None,
+                       today: Optional[date] = None) -> Optional[Tuple[str, str]]:
+    """Turn a Graph date_preset (or custom since/until) into concrete ISO dates.
+
+    Returns None for presets without a fixed range (lifetime, maximum, ...).
+    """
+    if since and until:
+        return (since, until) if since <= until else None
+
+    today = today or date.today()
+    preset = (date_preset or '').strip()
+    if preset == 'today':
+        return today.isoformat(), today.isoformat()
+    if preset == 'yesterday':
+        yesterday = today - timedelta(days=1)
+        return yesterday.isoformat(), yesterday.isoformat()
+    match = re.fullmatch(r'last_(\d+)d', preset)
+    if match:
+        # Graph's last_Nd presets end yesterday
+        days = int(match.group(1))
+        return (today - timedelta(days=days)).isoformat(), (today - timedelta(days=1)).isoformat()
+    if preset == 'this_month':
+        return today.replace(day=1).isoformat(), today.isoformat()
+    if preset == 'last_month':
+        last_day = today.replace(day=1) - timedelta(days=1)
+        return last_day.replace(day=1).isoformat(), last_day.isoformat()
+    return None
+
+
+# Ad account timezone names, read once per process (Graph days and date presets follow them)
+_account_timezones: Dict[str, str] = {}
+_account_timezones_lock = threading.Lock()
+
+
+def account_todays(account_ids: Iterable[str], token: str) -> Dict[str, date]:
+    """Get today's date in each ad account's timezone.
+
+    Accounts whose timezone cannot be read use the server date (and are retried next time).
+    """
+    account_ids = {a for a in account_ids if a}
+    with _account_timezones_lock:
+        missing = [a for a in account_ids if a not in _account_timezones]
+    if missing:
+        nodes = get_objects(missing, token, 'timezone_name')
+        with _account_timezones_lock:
+            for account_id in missing:
+                timezone_name = (nodes.get(account_id) or {}).get('timezone_name')
+                if timezone_name:
+                    _account_timezones[account_id] = timezone_name
+
+    todays = {}
+    for account_id in account_ids:
+        try:
+            todays[account_id] = datetime.now(ZoneInfo(_account_timezones[account_id])).date()
+        except (KeyError, ValueError, ZoneInfoNotFoundError):
+            todays[account_id] = date.today()
+    return todays
+
+
+def _field_set(fields: Optional[str]) -> set:
+    return {f.strip() for f in (fields or '').split(',') if f.strip()}
+
+
+class InsightsStore:
+    def __init__(self, db_file: str = "insights.db", attribution_window_days: int = ATTRIBUTION_WINDOW_DAYS):
+        self.db_file = db_file
+        self.attribution_window_days = attribution_window_days
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection, creating the schema on first use"""
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS insight_rows (
+                    campaign_id TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    breakdown TEXT NOT NULL DEFAULT '',
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (campaign_id, breakdown, date)
+                );
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    campaign_id TEXT NOT NULL,
+                    breakdown TEXT NOT NULL DEFAULT '',
+                    synced_since TEXT NOT NULL,
+                    synced_until TEXT NOT NULL,
+                    last_synced TEXT NOT NULL,
+                    fields TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (campaign_id, breakdown)
+                );
+            """)
+            # Stores created before the field list was recorded: their rows count as unknown fields
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(sync_state)")}
+            if 'fields' not in columns:
+                conn.execute("ALTER TABLE sync_state ADD COLUMN fields TEXT NOT NULL DEFAULT ''")
+            self._initialized = True
+        return conn
+
+    def replace_rows(self, campaign_id: str, since: str, until: str,
+                     rows: List[Dict[str, Any]], breakdown: str = '', fields: str = INSIGHT_FIELDS) -> None:
+        """Replace stored rows of a campaign for [since, until] and extend its synced range.
+
+        fields is the insights field list the rows were fetched with; if it differs from the
+        one stored for the campaign, its older rows and synced range are dropped first.
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "DELETE FROM insight_rows WHERE campaign_id = ? AND breakdown = ? AND EXISTS ("
+                    "SELECT 1 FROM sync_state s WHERE s.campaign_id = ? AND s.breakdown = ? AND s.fields != ?)",
+                    (campaign_id, breakdown, campaign_id, breakdown, fields)
+                )
+                conn.execute(
+                    "DELETE FROM sync_state WHERE campaign_id = ? AND breakdown = ? AND fields != ?",
+                    (campaign_id, breakdown, fields)
+                )
+                conn.execute(
+                    "DELETE FROM insight_rows WHERE campaign_id = ? AND breakdown = ? AND date BETWEEN ? AND ?",
+                    (campaign_id, breakdown, since, until)
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO insight_rows (campaign_id, date, breakdown, data) VALUES (?, ?, ?, ?)",
+                    [(campaign_id, row.get('date_start'), breakdown, json.dumps(row, ensure_ascii=False))
+                     for row in rows if row.get('date_start')]
+                )
+                conn.execute("""
+                    INSERT INTO sync_state (campaign_id, breakdown, synced_since, synced_until, last_synced, fields)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (campaign_id, breakdown) DO UPDATE SET
+                        synced_since = MIN(synced_since, excluded.synced_since),
+                        synced_until = MAX(synced_until, excluded.synced_until),
+                        last_synced = excluded.last_synced
+                """, (campaign_id, breakdown, since, until, datetime.now().isoformat(), fields))
+        finally:
+            conn.close()
+
+    def get_rows(self, campaign_ids: List[str], since: str, until: str,
+                 breakdown: str = '') -> Dict[str, List[Dict[str, Any]]]:
+        """Get stored rows per campaign for [since, until], ordered by date"""
+        rows_by_id: Dict[str, List[Dict[str, Any]]] = {cid: [] for cid in campaign_ids}
+        if not campaign_ids:
+            return rows_by_id
+        conn = self._connect()
+        try:
+            placeholders = ','.join('?' * len(campaign_ids))
+            cursor = conn.execute(
+                f"SELECT campaign_id, data FROM insight_rows WHERE breakdown = ? AND date BETWEEN ? AND ? "
+                f"AND campaign_id IN ({placeholders}) ORDER BY date",
+                [breakdown, since, until, *campaign_ids]
+            )
+            for campaign_id, data in cursor:
+                rows_by_id[campaign_id].append(json.loads(data))
+        finally:
+            conn.close()
+        return rows_by_id
+
+    def get_final_ranges(self, campaign_ids: List[str], breakdown: str = '',
+                         fields: Optional[str] = None) -> Dict[str, Tuple[str, str]]:
+        """Get (synced_since, final_until) per campaign: the range whose stored rows are closed.
+
+        With fields, only campaigns whose stored rows hold every requested field are returned.
+        """
+        if not campaign_ids:
+            return {}
+        requested = _field_set(fields)
+        conn = self._connect()
+        try:
+            placeholders = ','.join('?' * len(campaign_ids))
+            cursor = conn.execute(
+                f"SELECT campaign_id, synced_since, synced_until, fields FROM sync_state "
+                f"WHERE breakdown = ? AND campaign_id IN ({placeholders})",
+                [breakdown, *campaign_ids]
+            )
+            ranges = {}
+            for campaign_id, synced_since, synced_until, stored_fields in cursor:
+                if not requested <= _field_set(stored_fields):
+                    continue
+                final_until = date.fromisoformat(synced_until) - timedelta(days=self.attribution_window_days)
+                ranges[campaign_id] = (synced_since, final_until.isoformat())
+            return ranges
+        finally:
+            conn.close()
+
+    def sync_campaigns(self, extractor, campaigns: List[Dict[str, Any]], start_date: str = "2023-01-01") -> Dict[str, int]:
+        """Incrementally sync daily rows for campaigns using the extractor.
+
+        Campaigns seen before only re-fetch the attribution window before their last sync;
+        new campaigns are fetched from start_date. Days are counted in each ad account's timezone.
+        """
+        campaign_ids = [c['campaign_id'] for c in campaigns if c.get('campaign_id')]
+        account_ids = {c['campaign_id']: c.get('account_id') for c in campaigns if c.get('campaign_id')}
+        todays = account_todays(account_ids.values(), extractor.access_token)
+        final_ranges = self.get_final_ranges(campaign_ids, fields=INSIGHT_FIELDS)
+
+        def sync_one(campaign_id):
+            today = todays.get(account_ids.get(campaign_id), date.today()).isoformat()
+            since = start_date
+            if campaign_id in final_ranges and final_ranges[campaign_id][0] <= start_date:
+                since = max(start_date, (date.fromisoformat(final_ranges[campaign_id][1]) + timedelta(days=1)).isoformat())
+            if since > today:
+                return 0
+            rows = extractor.get_campaign_daily_insights(campaign_id, since, today, account_ids.get(campaign_id))
+            self.replace_rows(campaign_id, since, today, rows, fields=INSIGHT_FIELDS)
+            return len(rows)
+
+        stats = {'synced_campaigns': 0, 'failed_campaigns': 0, 'rows': 0}
+        for campaign_id, row_count in fan_out(campaign_ids, sync_one, extractor.access_token):
+            if row_count is None:
+                stats['failed_campaigns'] += 1
+                continue
+            stats['synced_campaigns'] += 1
+            stats['rows'] += row_count
+        logger.info(f"Insights sync: {stats}")
+        return stats
+
+    def load_campaign_insights(self, campaigns: List[Dict[str, Any]], token: str, params: Dict[str, Any],
+                               date_preset: str, since: Optional[str] = None, until: Optional[str] = None,
+                               fallback_presets: Optional[Dict[str, List[Fallback]]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Get daily insight rows per campaign, reading closed days from the store.
+
+        Days after a campaign's closed range are fetched live from Graph. Campaigns that
+        were never synced, or whose stored rows lack some of params['fields'] (and ranges
+        the store cannot resolve), are fetched live entirely. Presets are resolved in each
+        ad account's timezone.
+        """
+        if not resolve_date_range(date_preset, since, until):
+            return fetch_campaign_insights(campaigns, token, params, fallback_presets)
+
+        campaigns = [c for c in campaigns if c.get('campaign_id')]
+        todays = account_todays((c.get('account_id') for c in campaigns), token)
+        groups: Dict[date, List[Dict[str, Any]]] = {}
+        for campaign in campaigns:
+            groups.setdefault(todays.get(campaign.get('account_id'), date.today()), []).append(campaign)
+
+        rows_by_id: Dict[str, List[Dict[str, Any]]] = {}
+        for today, group in groups.items():
+            rows_by_id.update(self._load_for_day(group, token, params, resolve_date_range(date_preset, since, until, today),
+                                                 fallback_presets or {}))
+        return rows_by_id
+
+    def _load_for_day(self, campaigns: List[Dict[str, Any]], token: str, params: Dict[str, Any],
+                      date_range: Tuple[str, str],
+                      fallback_presets: Dict[str, List[Fallback]]) -> Dict[str, List[Dict[str, Any]]]:
+        """load_campaign_insights for campaigns whose accounts share the same current date"""
+        since, until = date_range
+        final_ranges = self.get_final_ranges([c['campaign_id'] for c in campaigns], fields=params.get('fields'))
+        stored = [c for c in campaigns if c['campaign_id'] in final_ranges and final_ranges[c['campaign_id']][0] <= since]
+        stored_ids = {c['campaign_id'] for c in stored}
+        live = [c for c in campaigns if c['campaign_id'] not in stored_ids]
+
+        rows_by_id = self.get_rows(list(stored_ids), since, until) if stored else {}
+
+        # Group stored campaigns by the first day that still has to come from Graph
+        live_since_groups: Dict[str, List[Dict[str, Any]]] = {}
+        for campaign in stored:
+            final_until = final_ranges[campaign['campaign_id']][1]
+            live_since = max(since, (date.fromisoformat(final_until) + timedelta(days=1)).isoformat())
+            rows_by_id[campaign['campaign_id']] = [
+                r for r in rows_by_id[campaign['campaign_id']] if r.get('date_start', '') < live_since
+            ]
+            if live_since <= until:
+                live_since_groups.setdefault(live_since, []).append(campaign)
+
+        for live_since, group in live_since_groups.items():
+            window_params = {k: v for k, v in params.items() if k not in ('time_range', 'since', 'until')}
+            window_params.update({'date_preset': 'custom', 'since': live_since, 'until': until})
+            for cid, rows in fetch_campaign_insights(group, token, window_params).items():
+                rows_by_id[cid] = rows_by_id.get(cid, []) + rows
+
+        if live:
+            rows_by_id.update(fetch_campaign_insights(live, token, params, fallback_presets))
+
+        empty_ids = [cid for cid in stored_ids if not rows_by_id.get(cid) and fallback_presets.get(cid)]
+        if empty_ids:
+            rows_by_id.update(fetch_insights_batch(empty_ids, token, params, fallback_presets, include_primary=False))
+
+        logger.info(f"Insights store: {len(stored)} campaigns from store, {len(live)} fetched live")
+        return rows_by_id
+
+
+# Global store instance
+insights_store = InsightsStore()
+
+
+def main():
+    from dotenv import load_dotenv
+    from facebook_ads_extractor import FacebookAdsExtractor
+
+    load_dotenv()
+    try:
+        with open('ads_data.json', 'r', encoding='utf-8') as f:
+            campaigns = json.load(f).get('campaigns', [])
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Không đọc được ads_data.json: {e}")
+        return
+
+    extractor = FacebookAdsExtractor()
+    start_date = os.getenv('INSIGHTS_START_DATE', '2023-01-01')
+    logger.info(f"Đồng bộ insights cho {len(campaigns)} chiến dịch từ {start_date}...")
+    stats = insights_store.sync_campaigns(extractor, campaigns, start_date)
+    logger.info(f"Đồng bộ hoàn tất: {stats}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,99 @@
+"""
+Background Jobs
+In-process job queue for long-running work (data extraction, budget refresh) so HTTP
+requests return a job ID immediately and clients poll for progress instead of holding
+a worker for minutes.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.done = 0
+        self.total: Optional[int] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ('queued', 'running')
+
+    def progress(self, done: int, total: Optional[int] = None) -> None:
+        """Report how many items are done (and the total, when known)"""
+        self.done = done
+        if total is not None:
+            self.total = total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobManager:
+    def __init__(self, max_workers: int = 2, keep_jobs: int = 50):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self.keep_jobs = keep_jobs
+
+    def submit(self, kind: str, fn: Callable[[Job], Any]) -> Job:
+        """Queue fn(job) in the background; its return value becomes the job result.
+
+        Only one job of a kind runs at a time: submitting while one is queued or running
+        returns the existing job.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job.kind == kind and job.active:
+                    return job
+            job = Job(kind)
+            self._jobs[job.id] = job
+            self._prune()
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]) -> None:
+        job.status = 'running'
+        try:
+            job.result = fn(job)
+            job.status = 'done'
+        except Exception as e:
+            logger.error(f"Job {job.kind} {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self) -> None:
+        finished = sorted((j for j in self._jobs.values() if not j.active), key=lambda j: j.created_at)
+        for job in finished[:max(0, len(self._jobs) - self.keep_jobs)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+# Global job manager instance
+job_manager = JobManager()
@@ -0,0 +1,188 @@
+"""
+Response Cache
+In-memory LRU cache of JSON responses for the insight endpoints, keyed by route and
+normalized query parameters (presets resolved to concrete dates). Ranges that reach into
+the attribution window expire quickly, older closed ranges are kept for hours. Expired entries are still served for a grace period while a
+background thread recomputes them (stale-while-revalidate).
+"""
+import os
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from flask import Response, current_app, request
+
+from insights_store import ATTRIBUTION_WINDOW_DAYS, resolve_date_range
+
+logger = logging.getLogger(__name__)
+
+OPEN_RANGE_TTL = int(os.getenv('RESPONSE_CACHE_OPEN_TTL', '300'))  # 5 minutes
+CLOSED_RANGE_TTL = int(os.getenv('RESPONSE_CACHE_CLOSED_TTL', '21600'))  # 6 hours
+STALE_GRACE = int(os.getenv('RESPONSE_CACHE_STALE_GRACE', '600'))  # 10 minutes
+MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_MB', '64')) * 1024 * 1024
+
+# Query parameters that never change the response, and filter values that mean "no filter"
+_IGNORED_PARAMS = {'access_token', '_'}
+_NO_FILTER = {'', 'all'}
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = MAX_BYTES, stale_grace: int = STALE_GRACE):
+        self.max_bytes = max_bytes
+        self.stale_grace = stale_grace
+        self._entries: 'OrderedDict[Tuple, Dict[str, Any]]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='revalidate')
+        self.hits = self.stale_hits = self.misses = 0
+
+    def get(self, key: Tuple) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Get (entry, is_stale); entries past their grace period count as missing"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now >= entry['expires_at'] + self.stale_grace:
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            stale = now >= entry['expires_at']
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            return entry, stale
+
+    def set(self, key: Tuple, body: bytes, ttl: int) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._size -= len(old['body'])
+            self._entries[key] = {'body': body, 'expires_at': time.time() + ttl}
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted['body'])
+
+    def revalidate(self, key: Tuple, compute: Callable[[], Optional[bytes]], ttl: int) -> None:
+        """Recompute an entry in the background (at most one refresh per key at a time)"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                body = compute()
+                if body is not None:
+                    self.set(key, body, ttl)
+            except Exception as e:
+                logger.warning(f"Làm mới cache {key[0]} thất bại: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._pool.submit(run)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'stale_hits': self.stale_hits, 'misses': self.misses}
+
+
+def normalize_params(args: Iterable[Tuple[str, str]], default_preset: str = '') -> Tuple[Tuple[str, str], ...]:
+    """Canonical, order-independent form of the query parameters.
+
+    Blank/'all' filters are dropped, and since/until replace date_preset when both are given.
+    Presets with a fixed range also carry their resolved since/until, so a rolling preset
+    such as last_7d gets a new key when the day changes.
+    """
+    params = {}
+    for name, value in args:
+        value = (value or '').strip()
+        if name in _IGNORED_PARAMS or value.lower() in _NO_FILTER:
+            continue
+        params[name] = value
+    if params.get('since') and params.get('until'):
+        params['date_preset'] = 'custom'
+    else:
+        params.pop('since', None)
+        params.pop('until', None)
+        params.setdefault('date_preset', default_preset)
+        date_range = resolve_date_range(params['date_preset'])
+        if date_range:
+            params['since'], params['until'] = date_range
+    return tuple(sorted(params.items()))
+
+
+def ttl_for_range(date_preset: str, since: Optional[str] = None, until: Optional[str] = None) -> int:
+    """Short TTL when the range is open-ended or ends inside the attribution window (Facebook
+    still revises those days), long for older closed ranges"""
+    date_range = resolve_date_range(date_preset, since, until)
+    mutable_from = (date.today() - timedelta(days=ATTRIBUTION_WINDOW_DAYS)).isoformat()
+    if date_range is None or date_range[1] >= mutable_from:
+        return OPEN_RANGE_TTL
+    return CLOSED_RANGE_TTL
+
+
+def _cacheable(response: Response) -> bool:
+    """Only successful JSON payloads are cached (several routes report upstream errors with HTTP 200)"""
+    if response.status_code != 200 or response.mimetype != 'application/json':
+        return False
+    payload = response.get_json(silent=True)
+    return not (isinstance(payload, dict) and payload.get('error'))
+
+
+def cached_response(default_preset: str = '', version: Optional[Callable[[], Any]] = None):
+    """Cache a JSON route's successful responses in response_cache.
+
+    default_preset is the date_preset the route uses when none is given; version() is
+    added to the key so a change (e.g. a new ads_data.json) bypasses old entries.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            params = normalize_params(request.args.items(), default_preset)
+            key = (request.path, params, version() if version else None)
+            query = dict(params)
+            ttl = ttl_for_range(query.get('date_preset', ''), query.get('since'), query.get('until'))
+
+            entry, stale = response_cache.get(key)
+            if entry is not None:
+                if stale:
+                    app = current_app._get_current_object()
+                    path, query_string = request.path, request.query_string.decode()
+
+                    def compute() -> Optional[bytes]:
+                        with app.test_request_context(path, query_string=query_string):
+                            response = app.make_response(view(*args, **kwargs))
+                            return response.get_data() if _cacheable(response) else None
+
+                    response_cache.revalidate(key, compute, ttl)
+                response = Response(entry['body'], mimetype='application/json')
+                response.headers['X-Cache'] = 'STALE' if stale else 'HIT'
+                return response
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if _cacheable(response):
+                response_cache.set(key, response.get_data(), ttl)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+# Global response cache instance
+response_cache = ResponseCache()
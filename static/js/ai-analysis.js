@@ -1,5 +1,70 @@
 // JavaScript for AI Analysis functionality
 
+// AI streaming helpers
+
+// POSTs/GETs an SSE endpoint (EventSource cannot send a body) and calls onEvent(event, data)
+// for each event as it arrives. Rejects when the endpoint does not answer with a stream.
+async function fetchEventStream(url, options, onEvent) {
+    const response = await fetch(url, options);
+    const contentType = response.headers.get('Content-Type') || '';
+    if (!response.ok || !response.body || !contentType.includes('text/event-stream')) {
+        let message = `HTTP ${response.status}`;
+        try {
+            const data = await response.json();
+            message = data.error || message;
+        } catch (e) {}
+        throw new Error(message);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let end;
+        while ((end = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, end);
+            buffer = buffer.slice(end + 2);
+            let event = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
+// Decoded value so far of a string field in a JSON answer that is still streaming in
+function partialJsonString(text, field) {
+    const match = new RegExp(`"${field}"\\s*:\\s*"`).exec(text);
+    if (!match) return '';
+    const escapes = { n: '\n', t: '\t', r: '', b: '', f: '' };
+    let out = '';
+    for (let i = match.index + match[0].length; i < text.length; i++) {
+        const ch = text[i];
+        if (ch === '"') break;
+        if (ch !== '\\') {
+            out += ch;
+            continue;
+        }
+        const next = text[i + 1];
+        if (next === undefined) break;
+        if (next === 'u') {
+            if (i + 5 >= text.length) break;
+            out += String.fromCharCode(parseInt(text.substr(i + 2, 4), 16));
+            i += 5;
+        } else {
+            out += next in escapes ? escapes[next] : next;
+            i++;
+        }
+    }
+    return out;
+}
+
 // AI Analysis Functions
 async function performAIAnalysis(campaignId) {
     const aiContent = document.getElementById('ai-analysis-content');
@@ -12,18 +77,49 @@ async function performAIAnalysis(campaignId) {
     aiError.classList.add('hidden');
     aiLoading.classList.remove('hidden');
     
+    const request = {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            campaign_id: campaignId
+        })
+    };
+    
     try {
-        const response = await fetch('/api/campaign-ai-insights', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                campaign_id: campaignId
-            })
-        });
-        
-        const data = await response.json();
+        // Stream the analysis token by token; fall back to the JSON endpoint if streaming is unavailable
+        let data = null;
+        let answer = '';
+        let received = false;
+        let frame = null;
+        try {
+            await fetchEventStream('/api/campaign-ai-insights/stream', request, (event, payload) => {
+                received = true;
+                if (event === 'token') {
+                    answer += payload.text;
+                    if (frame === null) {
+                        frame = requestAnimationFrame(() => {
+                            frame = null;
+                            showAIPreview(answer);
+                        });
+                    }
+                } else if (event === 'done') {
+                    data = payload;
+                } else if (event === 'error') {
+                    throw new Error(payload.error);
+                }
+            });
+        } catch (streamError) {
+            if (received) throw streamError;
+            console.warn('AI stream không khả dụng, dùng API thường:', streamError);
+            const response = await fetch('/api/campaign-ai-insights', request);
+            data = await response.json();
+        }
+        if (frame !== null) cancelAnimationFrame(frame);
+        if (!data) {
+            throw new Error('Mất kết nối trước khi phân tích AI hoàn tất');
+        }
         
         if (data.success) {
             // Display results với error handling
@@ -109,6 +205,19 @@ function formatAIResponse(text) {
         .join('');
 }
 
+// Renders the insights/recommendations received so far while the analysis streams in
+function showAIPreview(answer) {
+    // The model answers in JSON; anything else is shown as it comes
+    const isJson = /^\s*[{`]/.test(answer);
+    const insights = isJson ? partialJsonString(answer, 'insights') : answer;
+    document.getElementById('ai-insights').innerHTML = formatAIResponse(insights);
+    document.getElementById('ai-recommendations').innerHTML = formatAIResponse(partialJsonString(answer, 'recommendations'));
+    document.getElementById('ai-analysis-timestamp').textContent = 'Đang phân tích...';
+    document.getElementById('ai-cache-indicator').classList.add('hidden');
+    document.getElementById('ai-loading').classList.add('hidden');
+    document.getElementById('ai-analysis-content').classList.remove('hidden');
+}
+
 function resetAIState() {
     document.getElementById('ai-analysis-content').classList.add('hidden');
     document.getElementById('ai-loading').classList.add('hidden');
@@ -18,29 +18,51 @@ function initializeChatbot(){
         return ctx;
     }
     
-    function sendMessage(q){ 
+    async function sendMessage(q){ 
         if(!q){ q=input.value.trim(); } 
         if(!q) return; 
         addMessage(q,'user'); 
         input.value=''; 
         addMessage('Đang xử lý...','bot'); 
-        fetch('/api/ask',{
+        const request={
             method:'POST',
             headers:{'Content-Type':'application/json'},
             body:JSON.stringify({
                 question:q,
                 context:buildContext()
             })
-        })
-        .then(r=>r.json())
-        .then(d=>{ 
-            removeLastMessage(); 
-            addMessage(d.error?('Lỗi: '+d.error):d.answer,'bot');
-        })
-        .catch(()=>{ 
-            removeLastMessage(); 
-            addMessage('Lỗi kết nối.','bot');
-        }); 
+        };
+        // Hiện câu trả lời theo từng token; nếu không stream được thì gọi /api/ask như cũ
+        let answer='';
+        let received=false;
+        try{
+            await fetchEventStream('/api/ask/stream',request,(event,data)=>{ 
+                received=true;
+                if(event==='token'){ 
+                    answer+=data.text; 
+                    updateLastMessage(answer);
+                }else if(event==='done'){ 
+                    updateLastMessage(data.answer);
+                }else if(event==='error'){ 
+                    throw new Error(data.error);
+                }
+            });
+        }catch(err){ 
+            if(received){ 
+                updateLastMessage((answer?answer+'\n\n':'')+'Lỗi: '+err.message);
+                return;
+            }
+            fetch('/api/ask',request)
+            .then(r=>r.json())
+            .then(d=>{ 
+                removeLastMessage(); 
+                addMessage(d.error?('Lỗi: '+d.error):d.answer,'bot');
+            })
+            .catch(()=>{ 
+                removeLastMessage(); 
+                addMessage('Lỗi kết nối.','bot');
+            }); 
+        }
     }
     
     sendBtn.addEventListener('click',sendMessage); 
@@ -63,6 +85,13 @@ function addMessage(text,type){
     box.scrollTop=box.scrollHeight; 
 }
 
+function updateLastMessage(text){ 
+    const box=document.getElementById('chatbot-messages'); 
+    const msgs=box.querySelectorAll('.message'); 
+    if(msgs.length>0) msgs[msgs.length-1].textContent=text; 
+    box.scrollTop=box.scrollHeight; 
+}
+
 function removeLastMessage(){ 
     const box=document.getElementById('chatbot-messages'); 
     const msgs=box.querySelectorAll('.message'); 
@@ -25,17 +25,25 @@ function updateDailyTrackingWithFilters(filterParams) {
 }
 
 async function refreshBudgetCache() {
+    const button = event.target;
     try {
-        const button = event.target;
         const originalText = button.textContent;
         button.textContent = 'Đang cập nhật...';
         button.disabled = true;
         
-        const response = await fetch('/api/refresh-budgets');
-        const data = await response.json();
+        const response = await fetch('/api/refresh-budgets', { method: 'POST' });
+        let data = await response.json();
         
         if (data.success) {
-            alert(`✅ Cập nhật thành công!\n- ${data.updated_count} campaigns được cập nhật\n- ${data.failed_count} campaigns thất bại\n\nCache sẽ được sử dụng trong 1 giờ tới.`);
+            const job = await waitForJob(data.job_id, (done, total) => {
+                button.textContent = total ? `Đang cập nhật... ${done}/${total}` : 'Đang cập nhật...';
+            });
+            if (job.status !== 'done') {
+                alert(`❌ Lỗi: ${job.error || 'unknown'}`);
+                return;
+            }
+            data = job.result;
+            alert(`✅ Cập nhật thành công!\n- ${data.updated_count} campaigns được cập nhật\n- ${data.failed_count} campaigns thất bại\n- ${data.skipped_count} campaigns còn cache\n\nCache sẽ được sử dụng trong 1 giờ tới.`);
             // Reload daily tracking data to show updated budget info
             loadDailyTrackingData();
         } else {
@@ -52,8 +52,8 @@ function handleGlobalFilterChange(filterParams, filters) {
         // Apply brand filter
         if (filters.brand !== 'all') {
             filteredCampaigns = filteredCampaigns.filter(campaign => {
-                const campaignName = campaign.campaign_name || '';
-                return extractBrandFromCampaignName(campaignName) === filters.brand;
+                const brand = campaign.brand || extractBrandFromCampaignName(campaign.campaign_name || '');
+                return brand === filters.brand;
             });
         }
         
@@ -85,13 +85,9 @@ function handleGlobalFilterChange(filterParams, filters) {
     if (typeof updateMetaReportWithFilters === 'function') {
         updateMetaReportWithFilters(filterParams);
     }
-    
-    if (typeof updatePivotAdvancedWithFilters === 'function') {
-        updatePivotAdvancedWithFilters(filterParams);
-    }
 }
 
-// Helper function to extract brand from campaign name (same as backend)
+// Helper function to extract brand from campaign name (fallback when the backend did not classify it)
 function extractBrandFromCampaignName(campaignName) {
     if (!campaignName) return 'Unknown';
     
@@ -103,6 +99,18 @@ function extractBrandFromCampaignName(campaignName) {
     return 'Unknown';
 }
 
+// Poll a background job until it finishes
+async function waitForJob(jobId,onProgress){
+    while(true){
+        const res=await fetch(`/api/jobs/${jobId}`);
+        const job=await res.json();
+        if(job.error&&!job.status) return {status:'failed',error:job.error};
+        if(onProgress) onProgress(job.done,job.total);
+        if(job.status==='done'||job.status==='failed') return job;
+        await new Promise(r=>setTimeout(r,2000));
+    }
+}
+
 // Manual refresh
 document.addEventListener('DOMContentLoaded',()=>{
     const btn=document.getElementById('btn-refresh');
@@ -119,6 +127,13 @@ document.addEventListener('DOMContentLoaded',()=>{
                 const j=await res.json();
                 if(!j.ok){ 
                     alert('Không cập nhật được dữ liệu: '+(j.error||'unknown')); 
+                }else{
+                    const job=await waitForJob(j.job_id,(done,total)=>{
+                        btn.textContent=total?`Đang cập nhật... ${done}/${total}`:'Đang cập nhật...';
+                    });
+                    if(job.status!=='done'){
+                        alert('Không cập nhật được dữ liệu: '+(job.error||'unknown'));
+                    }
                 }
                 await loadAdsData();
             }catch(e){ 
@@ -117,7 +117,7 @@ class GlobalFilters {
         const brandSet = new Set();
         
         this.data.campaigns.forEach(campaign => {
-            const brand = this.extractBrandFromCampaignName(campaign.campaign_name);
+            const brand = campaign.brand || this.extractBrandFromCampaignName(campaign.campaign_name);
             if (brand && brand !== 'Unknown') {
                 brandSet.add(brand);
             }
@@ -199,7 +199,7 @@ class GlobalFilters {
         // Filter by brand if selected
         if (this.filters.brand !== 'all') {
             filteredCampaigns = filteredCampaigns.filter(campaign => 
-                this.extractBrandFromCampaignName(campaign.campaign_name) === this.filters.brand
+                (campaign.brand || this.extractBrandFromCampaignName(campaign.campaign_name)) === this.filters.brand
             );
         }
         
@@ -846,6 +846,29 @@ async function loadMetaContentInsights(){
         const qs = new URLSearchParams({ limit: '50' });
         if(s) qs.set('since', s);
         if(u) qs.set('until', u);
+        // Bài viết hiện ngay khi lấy xong, AI insights hiện dần theo từng token
+        let text = '';
+        let received = false;
+        try{
+            await fetchEventStream(`/api/meta-report-content-insights/stream?${qs.toString()}`, {}, (event, data) => {
+                received = true;
+                if(event === 'posts'){
+                    renderMetaPostsCards(data.posts||[]);
+                    target.textContent = 'Đang phân tích AI...';
+                }else if(event === 'token'){
+                    text += data.text;
+                    target.innerHTML = renderAITextAsHtml(sanitizeAIText(text));
+                }else if(event === 'done'){
+                    target.innerHTML = renderAITextAsHtml(sanitizeAIText(data.insights || 'Không có kết quả AI'));
+                }else if(event === 'error'){
+                    target.textContent = `Lỗi: ${typeof data.error==='object'?JSON.stringify(data.error):data.error}`;
+                }
+            });
+            return;
+        }catch(streamErr){
+            if(received) throw streamErr;
+            console.warn('AI stream không khả dụng, dùng API thường:', streamErr);
+        }
         const res = await fetch(`/api/meta-report-content-insights?${qs.toString()}`);
         const data = await res.json();
         if(data.error){
@@ -10,15 +10,9 @@ function updatePivotAdvanced(data){
     fetchPivotAdvancedBreakdowns();
 }
 
-// Global filter integration
-function updatePivotAdvancedWithFilters(filterParams) {
-    console.log('Updating Pivot Advanced with filters:', filterParams);
-    // This will be triggered by the global filter change
-    // The data will be updated through the daily tracking section
-    if (typeof loadDailyTrackingData === 'function') {
-        loadDailyTrackingData(filterParams);
-    }
-}
+// Global filter integration: updateDailyTrackingWithFilters reloads /api/daily-tracking, which
+// renders the pivot through updatePivotAdvanced, so the pivot has a single data source
+// (including the fallback presets for paused campaigns) and is not rendered twice.
 
 function renderPivotAdvancedTable(rows){
     const tbody=document.getElementById('pivot-adv-table');
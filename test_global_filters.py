@@ -127,6 +127,15 @@ def test_filter_logic():
     
     active_campaigns = [c for c in sample_campaigns if c["status"] == "ACTIVE"]
     print(f"   - Active campaigns: {len(active_campaigns)}")
+    
+    # Overlapping keywords: the first-listed rule wins even if a later keyword is longer
+    print("\nTesting overlapping rule keywords:")
+    from campaign_classifier import RuleMatcher
+    matcher = RuleMatcher([('EGO', ['ego']), ('EGO Pro', ['ego pro']), ('Pro', ['pro'])], 'Unknown')
+    for name, expected in [("EGO Pro Helmet", "EGO"), ("Pro Series", "Pro"), ("Other", "Unknown")]:
+        result = matcher.match(name)
+        status = "✅" if result == expected else "❌"
+        print(f"   {status} {name} → {result} (expected {expected})")
 
 def main():
     """Main test function"""